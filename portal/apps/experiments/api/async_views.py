@@ -0,0 +1,71 @@
+from django.http import Http404
+from rest_framework.exceptions import PermissionDenied
+
+from portal.apps.experiments import services
+from portal.apps.experiments.api.serializers import EXPERIMENT_LIST_PROJECTION
+from portal.apps.experiments.membership import get_membership_index
+from portal.apps.experiments.models import AerpawExperiment, UserExperiment
+from portal.apps.mixins.async_views import async_api_view, cursor_page_data, gather
+from portal.apps.mixins.projection import format_datetime
+from portal.apps.resources.models import AerpawResource
+
+
+@async_api_view
+async def experiment_list(request):
+    """
+    GET: list experiments as a cursor page (same rows as GET /experiments)
+    - count: approximate (default) | exact, read concurrently with the page
+
+    Permission:
+    - user is_active
+    """
+    if not request.user.is_active:
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to GET /experiments list")
+    return await cursor_page_data(
+        request, services.experiment_list_queryset(request.user, request.query_params.get('search', None)),
+        services.EXPERIMENT_ORDERING, EXPERIMENT_LIST_PROJECTION)
+
+
+@async_api_view
+async def experiment_retrieve(request, pk):
+    """
+    GET: experiment as single result (same result as GET /experiments/{pk})
+    - the experiment, its members, its resources and the user's memberships are read concurrently
+
+    Permission:
+    - user is_creator OR
+    - user is_project_member OR
+    - user is_project_owner OR
+    - user is_operator
+    """
+    membership_index = get_membership_index(request.user)
+    experiment, members, resources, _ = await gather(
+        lambda: AerpawExperiment.objects.select_related('canonical_number', 'project').filter(pk=pk).first(),
+        lambda: list(UserExperiment.objects.filter(experiment_id=pk).values('granted_by', 'granted_date', 'user_id')),
+        lambda: list(AerpawResource.objects.filter(experiment_resources=pk).values_list('id', flat=True)),
+        lambda: (membership_index.project_roles, membership_index.experiment_ids))
+    if experiment is None:
+        raise Http404('No AerpawExperiment matches the given query.')
+    if not membership_index.can_view_project(experiment.project):
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to GET /experiments/{0} details".format(pk))
+    du = {
+        'canonical_number': experiment.canonical_number.canonical_number,
+        'created_date': format_datetime(experiment.created),
+        'description': experiment.description,
+        'experiment_creator': experiment.experiment_creator_id,
+        'experiment_id': experiment.id,
+        'experiment_membership': [
+            dict(member, granted_date=format_datetime(member['granted_date'])) for member in members],
+        'experiment_state': experiment.experiment_state,
+        'experiment_uuid': experiment.uuid,
+        'is_canonical': experiment.is_canonical,
+        'is_retired': experiment.is_retired,
+        'last_modified_by': experiment.modified_by_id,
+        'modified_date': format_datetime(experiment.modified),
+        'name': experiment.name,
+        'project_id': experiment.project_id,
+        'resources': resources
+    }
+    return services.experiment_detail_data(experiment, du, membership_index)
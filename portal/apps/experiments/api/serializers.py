@@ -2,11 +2,12 @@ from rest_framework import serializers
 
 from portal.apps.experiments.models import AerpawExperiment, CanonicalExperimentResource, ExperimentSession, \
     UserExperiment
+from portal.apps.mixins.projection import Projection
 
 
 class UserExperimentSerializer(serializers.ModelSerializer):
-    experiment_id = serializers.IntegerField(source='experiment.id')
-    user_id = serializers.IntegerField(source='user.id')
+    experiment_id = serializers.IntegerField()
+    user_id = serializers.IntegerField()
 
     class Meta:
         model = UserExperiment
@@ -29,9 +30,9 @@ class ExperimentSerializerDetail(serializers.ModelSerializer):
     created_date = serializers.DateTimeField(source='created')
     experiment_id = serializers.IntegerField(source='id', read_only=True)
     experiment_uuid = serializers.CharField(source='uuid')
-    last_modified_by = serializers.CharField(source='modified_by')
+    last_modified_by = serializers.PrimaryKeyRelatedField(source='modified_by', read_only=True)
     modified_date = serializers.DateTimeField(source='modified')
-    project_id = serializers.IntegerField(source='project.id')
+    project_id = serializers.IntegerField()
     experiment_membership = UserExperimentSerializer(source='userexperiment_set', many=True)
 
     class Meta:
@@ -42,11 +43,11 @@ class ExperimentSerializerDetail(serializers.ModelSerializer):
 
 
 class ExperimentSessionSerializer(serializers.ModelSerializer):
-    ended_by = serializers.IntegerField(source='ended_by.id')
-    experiment_id = serializers.IntegerField(source='experiment.id')
+    ended_by = serializers.IntegerField(source='ended_by_id')
+    experiment_id = serializers.IntegerField()
     session_id = serializers.IntegerField(source='id')
     start_date_time = serializers.DateTimeField(source='created')
-    started_by = serializers.IntegerField(source='started_by.id')
+    started_by = serializers.IntegerField(source='started_by_id')
 
     class Meta:
         model = ExperimentSession
@@ -56,10 +57,41 @@ class ExperimentSessionSerializer(serializers.ModelSerializer):
 
 class CanonicalExperimentResourceSerializer(serializers.ModelSerializer):
     canonical_experiment_resource_id = serializers.IntegerField(source='id')
-    experiment_id = serializers.IntegerField(source='experiment.id')
-    resource_id = serializers.IntegerField(source='resource.id')
+    experiment_id = serializers.IntegerField()
+    resource_id = serializers.IntegerField()
 
     class Meta:
         model = CanonicalExperimentResource
         fields = ['canonical_experiment_resource_id', 'experiment_id', 'experiment_node_number', 'node_type',
                   'node_uhd', 'node_vehicle', 'resource_id']
+
+
+# list endpoint projections: response field -> model field (values() rows are the response rows)
+USER_EXPERIMENT_LIST_PROJECTION = Projection(
+    fields={'experiment_id': 'experiment_id', 'granted_by': 'granted_by', 'granted_date': 'granted_date',
+            'id': 'id', 'user_id': 'user_id'},
+    datetime_fields=('granted_date',)
+)
+
+EXPERIMENT_LIST_PROJECTION = Projection(
+    fields={'canonical_number': 'canonical_number', 'created_date': 'created', 'description': 'description',
+            'experiment_creator': 'experiment_creator', 'experiment_id': 'id', 'experiment_uuid': 'uuid',
+            'is_canonical': 'is_canonical', 'is_retired': 'is_retired',
+            'is_experiment_creator': 'is_experiment_creator', 'is_experiment_member': 'is_experiment_member',
+            'name': 'name', 'project_id': 'project_id'},
+    datetime_fields=('created_date',),
+    nested={'membership': ('is_experiment_creator', 'is_experiment_member')}
+)
+
+EXPERIMENT_SESSION_LIST_PROJECTION = Projection(
+    fields={'end_date_time': 'end_date_time', 'ended_by': 'ended_by', 'experiment_id': 'experiment_id',
+            'session_id': 'id', 'session_type': 'session_type', 'start_date_time': 'created',
+            'started_by': 'started_by'},
+    datetime_fields=('end_date_time', 'start_date_time')
+)
+
+CANONICAL_EXPERIMENT_RESOURCE_LIST_PROJECTION = Projection(
+    fields={'canonical_experiment_resource_id': 'id', 'experiment_id': 'experiment_id',
+            'experiment_node_number': 'experiment_node_number', 'node_type': 'node_type', 'node_uhd': 'node_uhd',
+            'node_vehicle': 'node_vehicle', 'resource_id': 'resource_id'}
+)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ExperimentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'portal.apps.experiments'
+
+    def ready(self):
+        # experiment state transition log
+        from portal.apps.experiments import signals  # noqa: F401
@@ -0,0 +1,147 @@
+from django.db import transaction
+from django.utils.functional import cached_property
+
+from portal.apps.experiments.models import AerpawExperiment, UserExperiment
+from portal.apps.projects.models import AerpawProject, UserProject
+from portal.apps.projects.signals import invalidate_projects
+from portal.apps.users.models import AerpawRolesEnum, AerpawUser
+
+
+class MembershipIndex:
+    """
+    Project and experiment membership of a single user
+    - all UserProject rows for the user are loaded in one query (on first project lookup)
+    - all UserExperiment rows for the user are loaded in one query (on first experiment lookup)
+    - every other lookup for the rest of the request is answered from memory
+    """
+
+    def __init__(self, user: AerpawUser):
+        self.user = user
+
+    @cached_property
+    def project_roles(self) -> dict:
+        roles = {}
+        for project_id, project_role in UserProject.objects.filter(
+                user_id=self.user.id).values_list('project_id', 'project_role'):
+            roles.setdefault(project_id, set()).add(project_role)
+        return roles
+
+    @cached_property
+    def experiment_ids(self) -> frozenset:
+        return frozenset(UserExperiment.objects.filter(user_id=self.user.id).values_list('experiment_id', flat=True))
+
+    def project_role(self, project_id: int) -> frozenset:
+        return frozenset(self.project_roles.get(int(project_id), ()))
+
+    def is_project_creator(self, project: AerpawProject) -> bool:
+        return project.project_creator_id == self.user.id
+
+    def is_project_member(self, project: AerpawProject) -> bool:
+        return UserProject.RoleType.PROJECT_MEMBER in self.project_role(project.id)
+
+    def is_project_owner(self, project: AerpawProject) -> bool:
+        return UserProject.RoleType.PROJECT_OWNER in self.project_role(project.id)
+
+    def is_project_participant(self, project: AerpawProject) -> bool:
+        return self.is_project_creator(project) or bool(self.project_role(project.id))
+
+    def can_view_project(self, project: AerpawProject) -> bool:
+        return self.is_project_participant(project) or self.user.is_operator()
+
+    def is_experiment_creator(self, experiment: AerpawExperiment) -> bool:
+        return experiment.experiment_creator_id == self.user.id
+
+    def is_experiment_member(self, experiment: AerpawExperiment) -> bool:
+        return experiment.id in self.experiment_ids
+
+    def is_experiment_participant(self, experiment: AerpawExperiment) -> bool:
+        return self.is_experiment_creator(experiment) or self.is_experiment_member(experiment)
+
+
+def get_membership_index(user: AerpawUser) -> MembershipIndex:
+    """
+    Membership index bound to the user instance (one instance per request)
+    """
+    index = getattr(user, '_membership_index', None)
+    if index is None:
+        index = MembershipIndex(user)
+        user._membership_index = index
+    return index
+
+
+def reset_membership_index(user: AerpawUser) -> None:
+    """
+    Drop the cached index after the user's own membership has been written
+    """
+    user.__dict__.pop('_membership_index', None)
+
+
+def update_project_memberships(changes: list, granted_by: AerpawUser) -> dict:
+    """
+    Set based membership update across many projects (one atomic block, a fixed number of queries)
+    - changes: [(project, project_role, [user_id, ...]), ...] where the user ids replace the current role members
+    - added users must exist and hold the experimenter or pi role, other ids are ignored
+    - returns {(project_id, project_role): [user_id, ...]} with the resulting members
+    """
+    targets = {(project.id, project_role): set(user_ids) for project, project_role, user_ids in changes}
+    if not targets:
+        return {}
+    with transaction.atomic():
+        current = {target: {} for target in targets}
+        for membership_id, project_id, project_role, user_id in UserProject.objects.filter(
+                project_id__in={project_id for project_id, project_role in targets},
+                project_role__in={project_role for project_id, project_role in targets}
+        ).values_list('id', 'project_id', 'project_role', 'user_id'):
+            if (project_id, project_role) in current:
+                current[(project_id, project_role)][user_id] = membership_id
+        added_ids = set()
+        for target, user_ids in targets.items():
+            added_ids.update(user_ids.difference(current[target]))
+        users = AerpawUser.objects.filter(
+            groups__name__in=[AerpawRolesEnum.EXPERIMENTER.value, AerpawRolesEnum.PI.value]
+        ).only('id').in_bulk(added_ids) if added_ids else {}
+        memberships = []
+        removed_ids = []
+        results = {}
+        for (project_id, project_role), user_ids in targets.items():
+            added = [pk for pk in user_ids.difference(current[(project_id, project_role)]) if pk in users]
+            removed = [pk for pk in current[(project_id, project_role)] if pk not in user_ids]
+            memberships.extend(
+                UserProject(granted_by=granted_by, project_id=project_id, project_role=project_role, user_id=pk)
+                for pk in added)
+            removed_ids.extend(current[(project_id, project_role)][pk] for pk in removed)
+            results[(project_id, project_role)] = sorted(
+                set(current[(project_id, project_role)]).difference(removed).union(added))
+        if memberships:
+            UserProject.objects.bulk_create(memberships, ignore_conflicts=True)
+        if removed_ids:
+            UserProject.objects.filter(id__in=removed_ids).delete()
+        # bulk writes send no model signals
+        invalidate_projects({project_id for project_id, project_role in targets})
+    return results
+
+
+def update_experiment_membership(experiment: AerpawExperiment, user_ids: list, granted_by: AerpawUser) -> list:
+    """
+    Set based experiment membership update (one atomic block, a fixed number of queries)
+    - user_ids replace the current experiment members
+    - added users must be project members or project owners of the experiment's project, other ids are ignored
+    - returns the resulting member user ids
+    """
+    user_ids = set(user_ids)
+    with transaction.atomic():
+        current = set(UserExperiment.objects.filter(experiment_id=experiment.id).values_list('user_id', flat=True))
+        added_ids = user_ids.difference(current)
+        users = AerpawUser.objects.filter(
+            project_user__project_id=experiment.project_id,
+            project_user__project_role__in=[UserProject.RoleType.PROJECT_MEMBER, UserProject.RoleType.PROJECT_OWNER]
+        ).only('id').in_bulk(added_ids) if added_ids else {}
+        added = [pk for pk in added_ids if pk in users]
+        removed = current.difference(user_ids)
+        if added:
+            UserExperiment.objects.bulk_create(
+                [UserExperiment(experiment_id=experiment.id, granted_by=granted_by, user_id=pk) for pk in added],
+                ignore_conflicts=True)
+        if removed:
+            UserExperiment.objects.filter(experiment_id=experiment.id, user_id__in=removed).delete()
+    return sorted(current.difference(removed).union(added))
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:02
+
+from django.db import migrations, models
+
+
+def delete_duplicate_memberships(apps, schema_editor):
+    # keep the earliest grant of each (user, experiment)
+    UserExperiment = apps.get_model('experiments', 'UserExperiment')
+    seen = set()
+    duplicates = []
+    for membership in UserExperiment.objects.order_by('id').values('id', 'user_id', 'experiment_id'):
+        key = (membership['user_id'], membership['experiment_id'])
+        if key in seen:
+            duplicates.append(membership['id'])
+        seen.add(key)
+    UserExperiment.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('experiments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_memberships, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='userexperiment',
+            constraint=models.UniqueConstraint(fields=('user', 'experiment'), name='unique_user_experiment'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:40
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('experiments', '0002_userexperiment_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aerpawexperiment',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('name', 'description', config='simple'), name='experiment_search_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from portal.apps.mixins.audit import backfill_audit_users, restore_audit_emails
+
+
+def backfill(apps, schema_editor):
+    """
+    created_by / modified_by strings (username or email) -> user foreign keys, in batches
+    """
+    AerpawUser = apps.get_model('users', 'AerpawUser')
+    backfill_audit_users(apps.get_model('experiments', 'AerpawExperiment'), AerpawUser)
+
+
+def restore(apps, schema_editor):
+    restore_audit_emails(apps.get_model('experiments', 'AerpawExperiment'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('experiments', '0003_aerpawexperiment_experiment_search_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='aerpawexperiment',
+            name='created_by',
+            field=models.EmailField(blank=True, default='', max_length=254),
+        ),
+        migrations.AlterField(
+            model_name='aerpawexperiment',
+            name='modified_by',
+            field=models.EmailField(blank=True, default='', max_length=254),
+        ),
+        migrations.AddField(
+            model_name='aerpawexperiment',
+            name='created_by_user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='aerpawexperiment',
+            name='modified_by_user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill, restore),
+    ]
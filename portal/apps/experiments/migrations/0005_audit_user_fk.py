@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:30
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # separate from the back-fill: PostgreSQL cannot ALTER a table with pending deferred foreign key checks
+
+    dependencies = [
+        ('experiments', '0004_audit_user_backfill'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='aerpawexperiment',
+            name='created_by',
+        ),
+        migrations.RemoveField(
+            model_name='aerpawexperiment',
+            name='modified_by',
+        ),
+        migrations.RenameField(
+            model_name='aerpawexperiment',
+            old_name='created_by_user',
+            new_name='created_by',
+        ),
+        migrations.RenameField(
+            model_name='aerpawexperiment',
+            old_name='modified_by_user',
+            new_name='modified_by',
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:10
+
+import django.db.models.deletion
+import django.utils.timezone
+import django_fsm
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('experiments', '0005_audit_user_fk'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExperimentStateTransition',
+            fields=[
+                ('id', models.AutoField(editable=False, primary_key=True, serialize=False, unique=True)),
+                ('from_state', models.CharField(choices=[('active_development', 'Active Development'), ('active_emulation', 'Active Emulation'), ('active_sandbox', 'Active Sandbox'), ('active_testbed', 'Active Testbed'), ('saved', 'Saved'), ('wait_development_deploy', 'Wait Development Deploy'), ('wait_emulation_deploy', 'Wait Emulation Deploy'), ('wait_sandbox_deploy', 'Wait Sandbox Deploy'), ('wait_testbed_deploy', 'Wait Testbed Deploy')], max_length=255)),
+                ('to_state', models.CharField(choices=[('active_development', 'Active Development'), ('active_emulation', 'Active Emulation'), ('active_sandbox', 'Active Sandbox'), ('active_testbed', 'Active Testbed'), ('saved', 'Saved'), ('wait_development_deploy', 'Wait Development Deploy'), ('wait_emulation_deploy', 'Wait Emulation Deploy'), ('wait_sandbox_deploy', 'Wait Sandbox Deploy'), ('wait_testbed_deploy', 'Wait Testbed Deploy')], max_length=255)),
+                ('transition', models.CharField(max_length=32)),
+                ('transitioned_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='aerpawexperiment',
+            name='experiment_state',
+            field=django_fsm.FSMField(choices=[('active_development', 'Active Development'), ('active_emulation', 'Active Emulation'), ('active_sandbox', 'Active Sandbox'), ('active_testbed', 'Active Testbed'), ('saved', 'Saved'), ('wait_development_deploy', 'Wait Development Deploy'), ('wait_emulation_deploy', 'Wait Emulation Deploy'), ('wait_sandbox_deploy', 'Wait Sandbox Deploy'), ('wait_testbed_deploy', 'Wait Testbed Deploy')], default='saved', max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='aerpawexperiment',
+            index=models.Index(condition=models.Q(('experiment_state', 'saved'), _negated=True), fields=['experiment_state', 'modified'], name='experiment_not_saved_idx'),
+        ),
+        migrations.AddField(
+            model_name='experimentstatetransition',
+            name='experiment',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='state_transitions', to='experiments.aerpawexperiment'),
+        ),
+        migrations.AddField(
+            model_name='experimentstatetransition',
+            name='transitioned_by',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='experiment_state_transitions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='experimentstatetransition',
+            index=models.Index(fields=['experiment', 'transitioned_at'], name='experiment_transition_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='experimentstatetransition',
+            index=models.Index(fields=['transitioned_at'], name='experiment_transition_at_idx'),
+        ),
+    ]
@@ -1,13 +1,20 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from django_fsm import FSMField, RETURN_VALUE, transition
 
 from portal.apps.mixins.models import AuditModelMixin, BaseModel, BaseTimestampModel
+from portal.apps.mixins.search import search_index
 from portal.apps.operations.models import CanonicalNumber
 from portal.apps.projects.models import AerpawProject
 from portal.apps.resources.models import AerpawResource
 from portal.apps.users.models import AerpawUser
 
+# full-text search document
+EXPERIMENT_SEARCH_FIELDS = ['name', 'description']
+
 
 class AerpawExperiment(BaseModel, AuditModelMixin, models.Model):
     """
@@ -41,6 +48,20 @@ class AerpawExperiment(BaseModel, AuditModelMixin, models.Model):
         WAIT_SANDBOX_DEPLOY = 'wait_sandbox_deploy', _('Wait Sandbox Deploy')
         WAIT_TESTBED_DEPLOY = 'wait_testbed_deploy', _('Wait Testbed Deploy')
 
+    # state machine: saved -> wait_*_deploy (deploy) -> active_* (activate) -> saved (stop, also cancels a deploy)
+    WAIT_DEPLOY_STATES = {
+        'development': ExperimentState.WAIT_DEVELOPMENT_DEPLOY,
+        'emulation': ExperimentState.WAIT_EMULATION_DEPLOY,
+        'sandbox': ExperimentState.WAIT_SANDBOX_DEPLOY,
+        'testbed': ExperimentState.WAIT_TESTBED_DEPLOY
+    }
+    ACTIVE_STATES = {
+        ExperimentState.WAIT_DEVELOPMENT_DEPLOY: ExperimentState.ACTIVE_DEVELOPMENT,
+        ExperimentState.WAIT_EMULATION_DEPLOY: ExperimentState.ACTIVE_EMULATION,
+        ExperimentState.WAIT_SANDBOX_DEPLOY: ExperimentState.ACTIVE_SANDBOX,
+        ExperimentState.WAIT_TESTBED_DEPLOY: ExperimentState.ACTIVE_TESTBED
+    }
+
     canonical_number = models.ForeignKey(
         CanonicalNumber,
         related_name='canonical_experiment_number',
@@ -58,7 +79,7 @@ class AerpawExperiment(BaseModel, AuditModelMixin, models.Model):
         through='UserExperiment',
         through_fields=('experiment', 'user')
     )
-    experiment_state = models.CharField(
+    experiment_state = FSMField(
         max_length=255,
         choices=ExperimentState.choices,
         default=ExperimentState.SAVED
@@ -80,12 +101,31 @@ class AerpawExperiment(BaseModel, AuditModelMixin, models.Model):
 
     class Meta:
         verbose_name = 'AERPAW Experiment'
+        indexes = [
+            search_index('experiment_search_idx', *EXPERIMENT_SEARCH_FIELDS),
+            # most experiments are saved: deployed / active ones are found without scanning them
+            models.Index(fields=['experiment_state', 'modified'], name='experiment_not_saved_idx',
+                         condition=~Q(experiment_state='saved'))
+        ]
 
     def __str__(self):
         return self.name
 
+    @transition(field=experiment_state, source=ExperimentState.SAVED, target=RETURN_VALUE(*WAIT_DEPLOY_STATES.values()))
+    def deploy(self, session_type: str, by: AerpawUser = None) -> str:
+        return self.WAIT_DEPLOY_STATES[session_type]
+
+    @transition(field=experiment_state, source=list(ACTIVE_STATES), target=RETURN_VALUE(*ACTIVE_STATES.values()))
+    def activate(self, by: AerpawUser = None) -> str:
+        return self.ACTIVE_STATES[self.experiment_state]
+
+    @transition(field=experiment_state, source=list(ACTIVE_STATES) + list(ACTIVE_STATES.values()),
+                target=ExperimentState.SAVED)
+    def stop(self, by: AerpawUser = None) -> None:
+        pass
+
     def is_creator(self, user: AerpawUser) -> bool:
-        return user == self.experiment_creator
+        return user.id == self.experiment_creator_id
 
     def is_member(self, user: AerpawUser) -> bool:
         return UserExperiment.objects.filter(
@@ -115,6 +155,51 @@ class UserExperiment(BaseModel, models.Model):
     granted_date = models.DateTimeField(auto_now_add=True)
     user = models.ForeignKey(AerpawUser, related_name='experiment_user', on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'experiment'], name='unique_user_experiment')
+        ]
+
+
+class ExperimentStateTransition(BaseModel, models.Model):
+    """
+    Experiment state transition (append-only log, written by the state machine: see experiments.signals)
+    - experiment_id
+    - from_state
+    - id (from Basemodel)
+    - to_state
+    - transition
+    - transitioned_at
+    - transitioned_by
+    """
+
+    experiment = models.ForeignKey(AerpawExperiment, related_name='state_transitions', on_delete=models.CASCADE)
+    from_state = models.CharField(max_length=255, choices=AerpawExperiment.ExperimentState.choices)
+    to_state = models.CharField(max_length=255, choices=AerpawExperiment.ExperimentState.choices)
+    transition = models.CharField(max_length=32)
+    transitioned_at = models.DateTimeField(default=timezone.now)
+    transitioned_by = models.ForeignKey(
+        AerpawUser,
+        related_name='experiment_state_transitions',
+        on_delete=models.SET_NULL,
+        null=True
+    )
+
+    class Meta:
+        indexes = [
+            # history of one experiment, time-in-state metrics over a period
+            models.Index(fields=['experiment', 'transitioned_at'], name='experiment_transition_idx'),
+            models.Index(fields=['transitioned_at'], name='experiment_transition_at_idx')
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('ExperimentStateTransition is append-only')
+        super(ExperimentStateTransition, self).save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError('ExperimentStateTransition is append-only')
+
 
 class ExperimentSession(BaseModel, BaseTimestampModel, models.Model):
     """
@@ -0,0 +1,578 @@
+import logging
+from uuid import uuid4
+
+from django.db import transaction
+from django.db.models import BooleanField, Exists, ExpressionWrapper, F, OuterRef, Q
+from django.shortcuts import get_object_or_404
+from django_fsm import can_proceed
+from rest_framework.exceptions import PermissionDenied, ValidationError
+
+from portal.apps.experiments.api.serializers import CANONICAL_EXPERIMENT_RESOURCE_LIST_PROJECTION, \
+    CanonicalExperimentResourceSerializer, EXPERIMENT_LIST_PROJECTION, ExperimentSerializerDetail
+from portal.apps.experiments.membership import MembershipIndex, get_membership_index, reset_membership_index, \
+    update_experiment_membership
+from portal.apps.experiments.models import AerpawExperiment, CanonicalExperimentResource, \
+    EXPERIMENT_SEARCH_FIELDS, UserExperiment
+from portal.apps.experiments.targeting import update_experiment_resources
+from portal.apps.mixins.search import search_filter, search_vector
+from portal.apps.mixins.services import Page, cursor_page
+from portal.apps.operations.models import allocate_canonical_number, release_canonical_number
+from portal.apps.projects.models import AerpawProject
+from portal.apps.resources.api.serializers import ResourceSerializerDetail
+from portal.apps.resources.models import AerpawResource
+from portal.apps.users.models import AerpawUser
+
+logger = logging.getLogger(__name__)
+
+# constants
+EXPERIMENT_MIN_NAME_LEN = 5
+EXPERIMENT_MIN_DESC_LEN = 5
+EXPERIMENT_ORDERING = ('name', 'id')
+CANONICAL_EXPERIMENT_RESOURCE_ORDERING = ('created', 'id')
+# state machine transitions of AerpawExperiment (activate: the operators deploy experiments)
+EXPERIMENT_STATE_TRANSITIONS = ['activate', 'deploy', 'stop']
+EXPERIMENT_OPERATOR_TRANSITIONS = ['activate']
+
+
+def experiment_queryset(user: AerpawUser, search: str = None):
+    """
+    Experiments the user can list: all for operators, otherwise those of joined projects (optional search)
+    """
+    if user.is_operator():
+        queryset = AerpawExperiment.objects.filter(is_deleted=False)
+    else:
+        queryset = AerpawExperiment.objects.filter(
+            Q(is_deleted=False) &
+            (Q(project__project_membership__email__in=[user.email]) | Q(project__project_creator=user))
+        )
+    if search:
+        queryset = search_filter(queryset, search_vector(*EXPERIMENT_SEARCH_FIELDS), search)
+    return queryset.order_by('name').distinct()
+
+
+def experiment_list_queryset(user: AerpawUser, search: str = None):
+    """
+    experiment_queryset() with the user's membership flags as computed columns (see EXPERIMENT_LIST_PROJECTION)
+    """
+    return experiment_queryset(user, search).annotate(
+        is_experiment_creator=ExpressionWrapper(Q(experiment_creator_id=user.id), output_field=BooleanField()),
+        is_experiment_member=Exists(
+            UserExperiment.objects.filter(experiment_id=OuterRef('pk'), user_id=user.id))
+    )
+
+
+def list_experiments(user: AerpawUser, search: str = None, cursor: str = None) -> Page:
+    """
+    Cursor page of experiment rows (see EXPERIMENT_LIST_PROJECTION) with an approximate count
+
+    Permission:
+    - user is_active
+    """
+    if not user.is_active:
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to GET /experiments list")
+    return cursor_page(
+        experiment_list_queryset(user, search), EXPERIMENT_ORDERING, cursor, EXPERIMENT_LIST_PROJECTION)
+
+
+def create_experiment(user: AerpawUser, data) -> AerpawExperiment:
+    """
+    Create an experiment with the next canonical number, the creator becomes its first member
+    - description, name, project_id
+
+    Permission:
+    - user is_experimenter AND
+        - user is_project_creator OR
+        - user is_project_member OR
+        - user is_project_owner
+    """
+    try:
+        project_id = data.get('project_id', None)
+        if not project_id:
+            raise ValidationError(
+                detail="project_id: must provide project_id")
+        project = get_object_or_404(AerpawProject.objects.all(), pk=int(project_id))
+    except Exception as exc:
+        raise ValidationError(
+            detail="ValidationError: {0}".format(exc))
+    if not (user.is_experimenter() and get_membership_index(user).is_project_participant(project)):
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to POST /experiments")
+    # validate description
+    description = data.get('description', None)
+    if not description or len(description) < EXPERIMENT_MIN_DESC_LEN:
+        raise ValidationError(
+            detail="description:  must be at least {0} chars long".format(EXPERIMENT_MIN_DESC_LEN))
+    # validate name
+    name = data.get('name', None)
+    if not name or len(name) < EXPERIMENT_MIN_NAME_LEN:
+        raise ValidationError(
+            detail="name: must be at least {0} chars long".format(EXPERIMENT_MIN_NAME_LEN))
+    # create project
+    experiment = AerpawExperiment()
+    experiment.created_by = user
+    experiment.experiment_creator = user
+    experiment.description = description
+    experiment.modified_by = user
+    experiment.name = name
+    experiment.project = project
+    experiment.uuid = uuid4()
+    with transaction.atomic():
+        # set canonical_number
+        try:
+            experiment.canonical_number = allocate_canonical_number()
+        except ValueError as exc:
+            raise ValidationError(
+                detail="ValidationError: {0}".format(exc))
+        experiment.save()
+        # set creator as experiment member
+        membership = UserExperiment()
+        membership.granted_by = user
+        membership.experiment = experiment
+        membership.user = user
+        membership.save()
+    reset_membership_index(user)
+    return experiment
+
+
+def experiment_member_rows(du: dict) -> list:
+    """
+    experiment_members as {granted_by, granted_date, user_id} rows of a serialized ExperimentSerializerDetail
+    """
+    return [
+        {
+            'granted_by': p.get('granted_by'),
+            'granted_date': str(p.get('granted_date')),
+            'user_id': p.get('user_id')
+        } for p in du.get('experiment_membership')
+    ]
+
+
+def get_experiment(user: AerpawUser, pk) -> dict:
+    """
+    Experiment as single result
+    - canonical_number       - int
+    - created_date           - string
+    - description            - string
+    - experiment_creator     - int
+    - experiment_id          - int
+    - experiment_uuid        - string
+    - experiment_members     - array of user-experiment
+    - experiment_state       - string
+    - is_canonical           - boolean
+    - is_retired             - boolean
+    - membership             - {is_experiment_creator, is_experiment_member}
+    - name                   - string
+    - project_id             - int
+    - resources              - array of int
+
+    Permission:
+    - user is_creator OR
+    - user is_project_member OR
+    - user is_project_owner OR
+    - user is_operator
+    """
+    experiment = get_object_or_404(AerpawExperiment.objects.select_related('project'), pk=pk)
+    membership_index = get_membership_index(user)
+    if not membership_index.can_view_project(experiment.project):
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to GET /experiments/{0} details".format(pk))
+    return experiment_detail_data(experiment, dict(ExperimentSerializerDetail(experiment).data), membership_index)
+
+
+def experiment_detail_data(experiment: AerpawExperiment, du: dict, membership_index: MembershipIndex) -> dict:
+    """
+    get_experiment() result of experiment from its ExperimentSerializerDetail fields du
+    """
+    experiment_data = {
+        'canonical_number': du.get('canonical_number'),
+        'created_date': du.get('created_date'),
+        'description': du.get('description'),
+        'experiment_creator': du.get('experiment_creator'),
+        'experiment_id': du.get('experiment_id'),
+        'experiment_uuid': du.get('experiment_uuid'),
+        'experiment_members': experiment_member_rows(du),
+        'experiment_state': du.get('experiment_state'),
+        'is_canonical': du.get('is_canonical'),
+        'is_retired': du.get('is_retired'),
+        'last_modified_by': du.get('last_modified_by'),
+        'membership': {
+            'is_experiment_creator': membership_index.is_experiment_creator(experiment),
+            'is_experiment_member': membership_index.is_experiment_member(experiment)
+        },
+        'modified_date': str(du.get('modified_date')),
+        'name': du.get('name'),
+        'project_id': du.get('project_id'),
+        'resources': du.get('resources')
+    }
+    if experiment.is_deleted:
+        experiment_data['is_deleted'] = du.get('is_deleted')
+    return experiment_data
+
+
+def update_experiment(user: AerpawUser, pk, data) -> AerpawExperiment:
+    """
+    Update an existing experiment (only the fields present in data)
+    - description, is_retired, name
+
+    Permission:
+    - user is_experiment_creator OR
+    - user is_experiment_member
+    """
+    experiment = get_object_or_404(AerpawExperiment.objects.all(), pk=pk)
+    if experiment.is_deleted or not get_membership_index(user).is_experiment_participant(experiment):
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to PUT/PATCH /experiments/{0} details".format(pk))
+    if experiment.is_retired:
+        raise PermissionDenied(
+            detail="PermissionDenied: IS_RETIRED - unable to PUT/PATCH /experiments/{0} details".format(pk))
+    modified = False
+    # check for description
+    if data.get('description', None):
+        if len(data.get('description')) < EXPERIMENT_MIN_DESC_LEN:
+            raise ValidationError(
+                detail="description:  must be at least {0} chars long".format(EXPERIMENT_MIN_DESC_LEN))
+        experiment.description = data.get('description')
+        modified = True
+    # check for is_retired
+    if str(data.get('is_retired')).casefold() in ['true', 'false']:
+        is_retired = str(data.get('is_retired')).casefold() == 'true'
+        experiment.is_retired = is_retired
+        modified = True
+    # check for name
+    if data.get('name', None):
+        if len(data.get('name')) < EXPERIMENT_MIN_NAME_LEN:
+            raise ValidationError(
+                detail="name: must be at least {0} chars long".format(EXPERIMENT_MIN_NAME_LEN))
+        experiment.name = data.get('name')
+        modified = True
+    # save if modified
+    if modified:
+        experiment.modified_by = user
+        experiment.save()
+    return experiment
+
+
+def delete_experiment(user: AerpawUser, pk) -> None:
+    """
+    Soft delete (and retire) an existing experiment, its canonical number is released
+
+    Permission:
+    - user is_experiment_creator OR
+    - user is_experiment_member
+    """
+    experiment = get_object_or_404(AerpawExperiment.objects.all(), pk=pk)
+    if not get_membership_index(user).is_experiment_participant(experiment):
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to DELETE /experiments/{0}".format(pk))
+    if experiment.is_retired:
+        raise PermissionDenied(
+            detail="PermissionDenied: IS_RETIRED - unable to DELETE /experiments/{0}".format(pk))
+    with transaction.atomic():
+        experiment.is_deleted = True
+        experiment.is_retired = True
+        experiment.modified_by = user
+        experiment.save()
+        release_canonical_number(experiment.canonical_number)
+
+
+def experiment_resources(user: AerpawUser, pk, data=None) -> dict:
+    """
+    Resources targeted by the experiment, data (when given) replaces them first
+    - experiment_resources   - array of resource ids
+
+    Permission:
+    - user is_experiment_creator OR
+    - user is_experiment_member
+    """
+    experiment = get_object_or_404(experiment_queryset(user), pk=pk)
+    if not get_membership_index(user).is_experiment_participant(experiment):
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to GET,PUT,PATCH /experiments/{0}/resources".format(pk))
+    if data is not None:
+        if data.get('experiment_resources') or isinstance(data.get('experiment_resources'), list):
+            if experiment.is_retired:
+                raise PermissionDenied(
+                    detail="PermissionDenied: IS_RETIRED - unable to GET,PUT,PATCH /experiments/{0}/resources".format(
+                        pk))
+            resource_ids = data.get('experiment_resources')
+            if isinstance(resource_ids, list) and all([isinstance(item, int) for item in resource_ids]):
+                try:
+                    update_experiment_resources(experiment, resource_ids)
+                except ValueError:
+                    raise ValidationError(
+                        detail="ValidationError: ALLOW_CANONICAL /experiments/{0}/resources".format(pk))
+        else:
+            raise ValidationError(
+                detail="ValidationError: invalid resource_id or node_uhd /experiments/{0}/resources".format(pk))
+        experiment.save()
+    resources = []
+    for u in ResourceSerializerDetail(experiment.resources, many=True).data:
+        du = dict(u)
+        resources.append(
+            {
+                'description': du.get('description'),
+                'is_active': du.get('is_active'),
+                'location': du.get('location'),
+                'name': du.get('name'),
+                'resource_class': du.get('resource_class'),
+                'resource_id': du.get('resource_id'),
+                'resource_mode': du.get('resource_mode'),
+                'resource_type': du.get('resource_type')
+            }
+        )
+    return {'experiment_resources': resources}
+
+
+def experiment_membership(user: AerpawUser, pk, data=None) -> dict:
+    """
+    Members of the experiment, data (when given) replaces them first
+    - experiment_members     - array of user ids
+
+    Permission:
+    - user is_experiment_creator OR
+    - user is_experiment_member
+    """
+    experiment = get_object_or_404(experiment_queryset(user), pk=pk)
+    if not get_membership_index(user).is_experiment_participant(experiment):
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to GET,PUT,PATCH /experiments/{0}/membership".format(pk))
+    if data is not None:
+        if data.get('experiment_members') or isinstance(data.get('experiment_members'), list):
+            if experiment.is_retired:
+                raise PermissionDenied(
+                    detail="PermissionDenied: IS_RETIRED - unable to GET,PUT,PATCH /experiments/{0}/membership".format(
+                        pk))
+            experiment_members = data.get('experiment_members')
+            if isinstance(experiment_members, list) and all([isinstance(item, int) for item in experiment_members]):
+                update_experiment_membership(experiment, experiment_members, granted_by=user)
+                reset_membership_index(user)
+    return {'experiment_members': experiment_member_rows(dict(ExperimentSerializerDetail(experiment).data))}
+
+
+def experiment_state(user: AerpawUser, pk, data=None) -> dict:
+    """
+    State of the experiment, data (when given) changes it first
+    - session_type           - string (deploy: development, emulation, sandbox, testbed)
+    - transition             - string (activate, deploy, stop)
+
+    Permission:
+    - user is_experiment_creator OR
+    - user is_experiment_member OR
+    - user is_operator (activate: only operators)
+    """
+    experiment = get_object_or_404(experiment_queryset(user), pk=pk)
+    is_operator = user.is_operator()
+    if not (is_operator or get_membership_index(user).is_experiment_participant(experiment)):
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to GET,PUT,PATCH /experiments/{0}/state".format(pk))
+    if data is not None:
+        if experiment.is_deleted or experiment.is_retired:
+            raise PermissionDenied(
+                detail="PermissionDenied: IS_RETIRED - unable to PUT,PATCH /experiments/{0}/state".format(pk))
+        name = data.get('transition')
+        if name not in EXPERIMENT_STATE_TRANSITIONS:
+            raise ValidationError(
+                detail="transition: must be one of {0}".format(', '.join(EXPERIMENT_STATE_TRANSITIONS)))
+        if name in EXPERIMENT_OPERATOR_TRANSITIONS and not is_operator:
+            raise PermissionDenied(
+                detail="PermissionDenied: unable to {0} /experiments/{1}/state".format(name, pk))
+        args = []
+        if name == 'deploy':
+            if data.get('session_type') not in AerpawExperiment.WAIT_DEPLOY_STATES:
+                raise ValidationError(
+                    detail="session_type: must be one of {0}".format(', '.join(AerpawExperiment.WAIT_DEPLOY_STATES)))
+            args.append(data.get('session_type'))
+        with transaction.atomic():
+            # concurrent changes of the state wait for this one, then see its result
+            experiment = AerpawExperiment.objects.select_for_update().get(pk=experiment.pk)
+            transition = getattr(experiment, name)
+            if not can_proceed(transition):
+                raise ValidationError(
+                    detail="ValidationError: unable to {0} /experiments/{1}/state in state {2}".format(
+                        name, pk, experiment.experiment_state))
+            # the transition is logged by experiments.signals
+            transition(*args, by=user)
+            experiment.modified_by = user
+            experiment.save(update_fields=['experiment_state', 'modified', 'modified_by'])
+    return {
+        'experiment_state': experiment.experiment_state,
+        'state_transitions': [
+            {
+                'from_state': t.from_state,
+                'to_state': t.to_state,
+                'transition': t.transition,
+                'transitioned_at': t.transitioned_at,
+                'transitioned_by': t.transitioned_by_id
+            } for t in experiment.state_transitions.order_by('transitioned_at', 'id')
+        ],
+        'transitions': sorted(
+            t.name for t in experiment.get_available_experiment_state_transitions()
+            if is_operator or t.name not in EXPERIMENT_OPERATOR_TRANSITIONS)
+    }
+
+
+def canonical_experiment_resource_ordering(experiment_id=None, resource_id=None) -> tuple:
+    """
+    Order (and cursor ordering) of canonical experiment resources: creation order for an experiment and / or resource,
+    newest first for the unfiltered list
+    """
+    if not experiment_id and not resource_id:
+        return tuple('-' + field for field in CANONICAL_EXPERIMENT_RESOURCE_ORDERING)
+    return CANONICAL_EXPERIMENT_RESOURCE_ORDERING
+
+
+def canonical_experiment_resource_queryset(experiment_id=None, resource_id=None):
+    """
+    Canonical experiment resources of an experiment and / or resource (see canonical_experiment_resource_ordering)
+    """
+    queryset = CanonicalExperimentResource.objects.all()
+    if experiment_id:
+        queryset = queryset.filter(experiment__id=experiment_id)
+    if resource_id:
+        queryset = queryset.filter(resource__id=resource_id)
+    return queryset.order_by(*canonical_experiment_resource_ordering(experiment_id, resource_id)).distinct()
+
+
+def can_view_canonical_experiment_resources(user: AerpawUser, experiment_id) -> bool:
+    """
+    Operators see all canonical experiment resources, participants those of their experiment
+    """
+    if user.is_operator():
+        return True
+    try:
+        experiment = AerpawExperiment.objects.get(pk=experiment_id)
+        return get_membership_index(user).is_experiment_participant(experiment)
+    except Exception as exc:
+        logger.warning('unable to check canonical experiment resources of experiment %s: %s', experiment_id, exc)
+        return False
+
+
+def list_canonical_experiment_resources(user: AerpawUser, experiment_id, resource_id=None,
+                                        cursor: str = None) -> Page:
+    """
+    Cursor page of canonical experiment resource rows (see CANONICAL_EXPERIMENT_RESOURCE_LIST_PROJECTION)
+
+    Permission:
+    - user is_operator OR
+    - user is_experiment_creator OR
+    - user is_experiment_member
+    """
+    if not can_view_canonical_experiment_resources(user, experiment_id):
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to GET /canonical-experiment-resource list")
+    return cursor_page(
+        canonical_experiment_resource_queryset(experiment_id, resource_id),
+        canonical_experiment_resource_ordering(experiment_id, resource_id), cursor,
+        CANONICAL_EXPERIMENT_RESOURCE_LIST_PROJECTION)
+
+
+def list_experiment_resource_definitions(user: AerpawUser, experiment_id, resource_ids: list) -> list:
+    """
+    Canonical experiment resource row (see CANONICAL_EXPERIMENT_RESOURCE_LIST_PROJECTION) of each targeted
+    resource in resource_ids order, loaded in one query with the resource joined
+    - resource_name          - string
+
+    Permission:
+    - user is_operator OR
+    - user is_experiment_creator OR
+    - user is_experiment_member
+    """
+    if not can_view_canonical_experiment_resources(user, experiment_id):
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to GET /canonical-experiment-resource list")
+    queryset = CANONICAL_EXPERIMENT_RESOURCE_LIST_PROJECTION.values(
+        CanonicalExperimentResource.objects.filter(experiment_id=experiment_id, resource_id__in=resource_ids)
+    ).annotate(resource_name=F('resource__name')).order_by(*CANONICAL_EXPERIMENT_RESOURCE_ORDERING)
+    # first definition per resource (matches the per-resource list the page used to take results[0] of)
+    definitions = {}
+    for row in CANONICAL_EXPERIMENT_RESOURCE_LIST_PROJECTION.rows(queryset):
+        definitions.setdefault(row['resource_id'], row)
+    return [definitions[resource_id] for resource_id in resource_ids if resource_id in definitions]
+
+
+def get_canonical_experiment_resource(user: AerpawUser, pk) -> dict:
+    """
+    Canonical experiment resource as detailed result
+    - canonical_experiment_resource_id - int
+    - experiment_id (fk)               - int
+    - experiment_node_number           - int
+    - node_type                        - string
+    - node_uhd                         - string
+    - node_vehicle                     - string
+    - resource_id (fk)                 - int
+
+    Permission:
+    - user is_operator OR
+    - user is_experiment_creator OR
+    - user is_experiment_member
+    """
+    cer = get_object_or_404(CanonicalExperimentResource.objects.select_related('experiment'), pk=pk)
+    if not (user.is_operator() or get_membership_index(user).is_experiment_participant(cer.experiment)):
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to GET /canonical-experiment-resource/{0} details".format(pk))
+    du = dict(CanonicalExperimentResourceSerializer(cer).data)
+    return {
+        'canonical_experiment_resource_id': du.get('canonical_experiment_resource_id'),
+        'experiment_id': du.get('experiment_id'),
+        'experiment_node_number': du.get('experiment_node_number'),
+        'node_type': du.get('node_type'),
+        'node_uhd': du.get('node_uhd'),
+        'node_vehicle': du.get('node_vehicle'),
+        'resource_id': du.get('resource_id')
+    }
+
+
+def update_canonical_experiment_resource(user: AerpawUser, pk, data) -> CanonicalExperimentResource:
+    """
+    Update the node settings of a canonical experiment resource
+    - node_uhd, node_vehicle
+
+    Permission:
+    - user is_experiment_creator OR
+    - user is_experiment_member
+    """
+    cer = get_object_or_404(CanonicalExperimentResource.objects.select_related('experiment', 'resource'), pk=pk)
+    if not get_membership_index(user).is_experiment_participant(cer.experiment):
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to PUT/PATCH /canonical-experiment-resource/{0} details".format(pk))
+    if cer.experiment.is_retired:
+        raise PermissionDenied(
+            detail="PermissionDenied: IS_RETIRED - "
+                   "unable to PUT/PATCH /canonical-experiment-resource/{0} details".format(pk))
+    modified = False
+    # check node_uhd
+    if data.get('node_uhd', None):
+        node_uhd_choices = [c[0] for c in CanonicalExperimentResource.NodeUhd.choices]
+        if data.get('node_uhd') not in node_uhd_choices:
+            raise ValidationError(
+                detail="node_uhd:  valid choices are {0}".format(node_uhd_choices))
+        cer.node_uhd = data.get('node_uhd')
+        modified = True
+    # check node_vehicle
+    if data.get('node_vehicle', None):
+        node_vehicle = data.get('node_vehicle')
+        node_vehicle_choices = [c[0] for c in CanonicalExperimentResource.NodeVehicle.choices]
+        if node_vehicle not in node_vehicle_choices:
+            raise ValidationError(
+                detail="node_vehicle:  valid choices are {0}".format(node_vehicle_choices))
+        # AFRN must be vehicle_none
+        if cer.resource.resource_type == AerpawResource.ResourceType.AFRN and \
+                node_vehicle != CanonicalExperimentResource.NodeVehicle.VEHICLE_NONE:
+            raise ValidationError(
+                detail="node_vehicle: resource type AFRN must be vehicle_none")
+        # APRN must be in [vehicle_uav, vehicle_ugv, vehicle_none]
+        if cer.resource.resource_type == AerpawResource.ResourceType.APRN and node_vehicle not in [
+                CanonicalExperimentResource.NodeVehicle.VEHICLE_UAV,
+                CanonicalExperimentResource.NodeVehicle.VEHICLE_UGV,
+                CanonicalExperimentResource.NodeVehicle.VEHICLE_NONE]:
+            raise ValidationError(
+                detail="node_vehicle: resource type APRN must be in [vehicle_uav, vehicle_ugv, vehicle_none]")
+        # TODO: other checks for UAV, UGV, 3PBBE, Other
+        cer.node_vehicle = data.get('node_vehicle')
+        modified = True
+    # save if modified
+    if modified:
+        cer.modified_by = user
+        cer.save()
+    return cer
@@ -0,0 +1,16 @@
+from django.dispatch import receiver
+from django_fsm.signals import post_transition
+
+from portal.apps.experiments.models import AerpawExperiment, ExperimentStateTransition
+
+
+@receiver(post_transition, sender=AerpawExperiment)
+def log_experiment_state_transition(sender, instance, name, source, target, method_kwargs=None, **kwargs):
+    # saved in the transaction / row lock of the state change (see experiments.services.experiment_state)
+    ExperimentStateTransition.objects.create(
+        experiment_id=instance.id,
+        from_state=source,
+        to_state=target,
+        transition=name,
+        transitioned_by=(method_kwargs or {}).get('by')
+    )
@@ -0,0 +1,65 @@
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from portal.apps.experiments.models import AerpawExperiment, ExperimentStateTransition
+
+# stays in a state: from a transition into it to the next transition of the experiment (still in it: until now)
+TIME_IN_STATE_SQL = """
+SELECT to_state,
+       COUNT(*) AS stays,
+       COUNT(*) FILTER (WHERE left_at IS NULL) AS current,
+       AVG(seconds) AS avg_seconds,
+       PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY seconds) AS p50_seconds,
+       PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY seconds) AS p95_seconds,
+       MAX(seconds) AS max_seconds
+FROM (
+    SELECT to_state, left_at, EXTRACT(EPOCH FROM COALESCE(left_at, %s) - transitioned_at) AS seconds
+    FROM (
+        SELECT to_state, transitioned_at,
+               LEAD(transitioned_at) OVER (PARTITION BY experiment_id ORDER BY transitioned_at, id) AS left_at
+        FROM {log} WHERE transitioned_at >= %s
+    ) AS transitions
+) AS stays
+GROUP BY to_state
+ORDER BY to_state
+"""
+
+
+def time_in_state(since) -> dict:
+    """
+    Time spent in each state by the stays that began since since, from the transition log only
+    - {state: {stays, current, avg_seconds, p50_seconds, p95_seconds, max_seconds}}
+    - current: stays that have not ended, they count until now
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(TIME_IN_STATE_SQL.format(log=ExperimentStateTransition._meta.db_table),
+                       [timezone.now(), since])
+        columns = [c[0] for c in cursor.description]
+        rows = cursor.fetchall()
+    metrics = {}
+    for row in rows:
+        values = dict(zip(columns, row))
+        state = values.pop('to_state')
+        metrics[state] = {name: round(float(value), 3) if 'seconds' in name else value for name, value in
+                          values.items()}
+    return metrics
+
+
+def experiments_not_saved(state: str = None):
+    """
+    Experiments that are deployed or waiting for a deployment (state: only those in state), on the partial index
+    experiment_not_saved_idx
+    """
+    experiments = AerpawExperiment.objects.exclude(experiment_state=AerpawExperiment.ExperimentState.SAVED)
+    if state is not None:
+        experiments = experiments.filter(experiment_state=state)
+    return experiments
+
+
+def experiment_state_counts() -> dict:
+    """
+    Number of experiments in each state other than saved
+    """
+    return dict(experiments_not_saved().values_list('experiment_state').annotate(
+        count=Count('id')).order_by('experiment_state'))
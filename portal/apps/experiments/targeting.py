@@ -0,0 +1,78 @@
+from uuid import uuid4
+
+from django.db import connection, transaction
+
+from portal.apps.experiments.models import AerpawExperiment, CanonicalExperimentResource
+from portal.apps.resources.models import AerpawResource
+
+# resource_type -> (node_type, node_vehicle) of the canonical-experiment-resource created for the resource
+CER_NODE_TYPES = {
+    AerpawResource.ResourceType.AFRN: (
+        CanonicalExperimentResource.NodeType.AFRN, CanonicalExperimentResource.NodeVehicle.VEHICLE_NONE),
+    AerpawResource.ResourceType.APRN: (
+        CanonicalExperimentResource.NodeType.APRN, CanonicalExperimentResource.NodeVehicle.VEHICLE_NONE),
+    AerpawResource.ResourceType.UAV: (
+        CanonicalExperimentResource.NodeType.APRN, CanonicalExperimentResource.NodeVehicle.VEHICLE_UAV),
+    AerpawResource.ResourceType.UGV: (
+        CanonicalExperimentResource.NodeType.APRN, CanonicalExperimentResource.NodeVehicle.VEHICLE_UGV),
+    AerpawResource.ResourceType.OTHER: (
+        CanonicalExperimentResource.NodeType.APRN, CanonicalExperimentResource.NodeVehicle.VEHICLE_OTHER),
+    AerpawResource.ResourceType.THREE_PBBE: (
+        CanonicalExperimentResource.NodeType.APRN, CanonicalExperimentResource.NodeVehicle.VEHICLE_NONE),
+}
+
+RENUMBER_SQL = """
+UPDATE {cer} SET experiment_node_number = numbered.node_number
+FROM (
+    SELECT id, ROW_NUMBER() OVER (ORDER BY created, id) AS node_number FROM {cer} WHERE experiment_id = %s
+) AS numbered
+WHERE {cer}.id = numbered.id AND {cer}.experiment_node_number <> numbered.node_number
+"""
+
+
+def renumber_experiment_nodes(experiment: AerpawExperiment) -> None:
+    """
+    experiment_node_number = 1..n in order of creation, in a single UPDATE
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(RENUMBER_SQL.format(cer=CanonicalExperimentResource._meta.db_table), [experiment.id])
+
+
+def update_experiment_resources(experiment: AerpawExperiment, resource_ids: list) -> None:
+    """
+    Set based experiment resource targeting (one atomic block, a fixed number of queries)
+    - resource_ids replace the current experiment resources, ids of unknown resources are ignored
+    - a canonical-experiment-resource is created / deleted with each added / removed resource
+    - raises ValueError (and changes nothing) when a canonical experiment targets a resource
+      that is not ALLOW_CANONICAL
+    """
+    resource_ids = set(resource_ids)
+    through = AerpawExperiment.resources.through
+    with transaction.atomic():
+        current = set(experiment.resources.values_list('id', flat=True))
+        added_ids = resource_ids.difference(current)
+        removed_ids = current.difference(resource_ids)
+        resources = AerpawResource.objects.only('id', 'resource_class', 'resource_type').in_bulk(
+            added_ids) if added_ids else {}
+        if experiment.is_canonical and any(
+                r.resource_class != AerpawResource.ResourceClass.ALLOW_CANONICAL for r in resources.values()):
+            raise ValueError('ALLOW_CANONICAL')
+        if resources:
+            through.objects.bulk_create(
+                [through(aerpawexperiment_id=experiment.id, aerpawresource_id=pk) for pk in resources],
+                ignore_conflicts=True)
+            CanonicalExperimentResource.objects.bulk_create([
+                CanonicalExperimentResource(
+                    experiment_id=experiment.id,
+                    resource_id=resource.id,
+                    node_type=CER_NODE_TYPES[resource.resource_type][0],
+                    node_uhd=CanonicalExperimentResource.NodeUhd.ONE_THREE_THREE,
+                    node_vehicle=CER_NODE_TYPES[resource.resource_type][1],
+                    uuid=str(uuid4())
+                ) for resource in sorted(resources.values(), key=lambda r: r.id)
+            ])
+        if removed_ids:
+            CanonicalExperimentResource.objects.filter(
+                experiment_id=experiment.id, resource_id__in=removed_ids).delete()
+            through.objects.filter(aerpawexperiment_id=experiment.id, aerpawresource_id__in=removed_ids).delete()
+        renumber_experiment_nodes(experiment)
@@ -1,6 +1,7 @@
 from django import template
 
 from portal.apps.experiments.models import AerpawExperiment
+from portal.apps.mixins.identity import identity_map
 
 register = template.Library()
 
@@ -8,8 +9,8 @@ register = template.Library()
 @register.filter
 def id_to_experiment_name(experiment_id):
     try:
-        experiment = AerpawExperiment.objects.get(pk=int(experiment_id))
-        return experiment.name
+        experiment = identity_map().get(AerpawExperiment, experiment_id)
+        return experiment.name if experiment else 'not found'
     except Exception as exc:
         print(exc)
         return 'not found'
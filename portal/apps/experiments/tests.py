@@ -1 +1,548 @@
-# Create your tests here.
+from datetime import timedelta
+from unittest import mock
+from uuid import uuid4
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from portal.apps.experiments.api.viewsets import ExperimentViewSet
+from portal.apps.experiments.models import AerpawExperiment, CanonicalExperimentResource, ExperimentSession, \
+    ExperimentStateTransition, UserExperiment
+from portal.apps.experiments.states import experiments_not_saved, time_in_state
+from portal.apps.experiments.targeting import CER_NODE_TYPES
+from portal.apps.mixins.testing import AsyncReadPathTestCase, IndexScanTestCase, QueryBudgetTestCase, audit_fields, \
+    create_user
+from portal.apps.operations.models import CanonicalNumber, FreeCanonicalNumber
+from portal.apps.projects.models import AerpawProject, UserProject
+from portal.apps.resources.models import AerpawResource
+from portal.apps.users.models import AerpawRolesEnum, AerpawUser
+
+
+class LargePagePagination(PageNumberPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class ExperimentListQueryCountTestCase(TestCase):
+    """
+    Regression benchmark: GET /experiments costs a fixed number of queries regardless of page size
+    """
+    fixtures = ['aerpaw_roles']
+    num_experiments = 1000
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = AerpawUser.objects.create_user(username='exp@example.org', email='exp@example.org')
+        cls.user.groups.add(Group.objects.get(name=AerpawRolesEnum.EXPERIMENTER.value))
+        other = AerpawUser.objects.create_user(username='other@example.org', email='other@example.org')
+        project = AerpawProject.objects.create(
+            name='project', description='project', project_creator=cls.user, uuid=str(uuid4()))
+        UserProject.objects.create(
+            project=project, user=cls.user, granted_by=cls.user, project_role=UserProject.RoleType.PROJECT_OWNER)
+        canonical_numbers = CanonicalNumber.objects.bulk_create(
+            [CanonicalNumber(canonical_number=i + 1) for i in range(cls.num_experiments)])
+        experiments = AerpawExperiment.objects.bulk_create([
+            AerpawExperiment(
+                name='experiment-{0:04d}'.format(i), description='experiment', project=project,
+                canonical_number=canonical_numbers[i], experiment_creator=cls.user if i % 2 else other,
+                uuid=str(uuid4()))
+            for i in range(cls.num_experiments)
+        ])
+        UserExperiment.objects.bulk_create([
+            UserExperiment(experiment=e, user=cls.user, granted_by=cls.user) for e in experiments[::3]
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _list(self, page_size):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/experiments', {'page_size': page_size})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), page_size)
+        return len(ctx.captured_queries), response.data['results']
+
+    def test_query_count_is_independent_of_page_size(self):
+        with mock.patch.object(ExperimentViewSet, 'pagination_class', LargePagePagination):
+            self._list(5)
+            query_counts = {page_size: self._list(page_size)[0] for page_size in [100, 500, 1000]}
+        self.assertEqual(len(set(query_counts.values())), 1, query_counts)
+        self.assertLessEqual(query_counts[1000], 3)
+
+    def test_membership_flags(self):
+        with mock.patch.object(ExperimentViewSet, 'pagination_class', LargePagePagination):
+            results = self._list(1000)[1]
+        members = set(UserExperiment.objects.filter(user=self.user).values_list('experiment_id', flat=True))
+        creators = set(AerpawExperiment.objects.filter(experiment_creator=self.user).values_list('id', flat=True))
+        for result in results:
+            self.assertEqual(result['membership']['is_experiment_member'], result['experiment_id'] in members)
+            self.assertEqual(result['membership']['is_experiment_creator'], result['experiment_id'] in creators)
+
+
+class ExperimentEndpointBudgetTestCase(QueryBudgetTestCase):
+    """
+    Query and wall-clock budgets for /experiments, /user-experiment, /sessions, /canonical-experiment-resource
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pi = create_user('pi@example.org', AerpawRolesEnum.EXPERIMENTER.value, AerpawRolesEnum.PI.value)
+        cls.operator = create_user('operator@example.org', AerpawRolesEnum.OPERATOR.value)
+        cls.members = [create_user('member{0}@example.org'.format(i), AerpawRolesEnum.EXPERIMENTER.value)
+                       for i in range(10)]
+        cls.project = AerpawProject.objects.create(
+            name='project', description='project', project_creator=cls.pi, **audit_fields(cls.pi))
+        UserProject.objects.bulk_create(
+            [UserProject(project=cls.project, user=cls.pi, granted_by=cls.pi,
+                         project_role=UserProject.RoleType.PROJECT_OWNER)] +
+            [UserProject(project=cls.project, user=u, granted_by=cls.pi,
+                         project_role=UserProject.RoleType.PROJECT_MEMBER) for u in cls.members]
+        )
+        cls.resources = AerpawResource.objects.bulk_create([
+            AerpawResource(name='resource-{0:02d}'.format(i), description='resource',
+                           resource_class=AerpawResource.ResourceClass.ALLOW_CANONICAL,
+                           resource_type=AerpawResource.ResourceType.AFRN, **audit_fields(cls.operator))
+            for i in range(10)
+        ])
+        cls.experiments = [cls.create_experiment(i) for i in range(3)]
+        cls.experiment = cls.experiments[0]
+        cls.cer = CanonicalExperimentResource.objects.filter(experiment=cls.experiment).first()
+        cls.session = ExperimentSession.objects.filter(experiment=cls.experiment).first()
+
+    @classmethod
+    def create_experiment(cls, i: int) -> AerpawExperiment:
+        canonical_number = CanonicalNumber.objects.create(canonical_number=100 + i)
+        experiment = AerpawExperiment.objects.create(
+            name='experiment-{0:02d}'.format(i), description='experiment', project=cls.project,
+            canonical_number=canonical_number, experiment_creator=cls.pi, **audit_fields(cls.pi))
+        UserExperiment.objects.create(experiment=experiment, user=cls.pi, granted_by=cls.pi)
+        cls.add_resource(experiment, cls.resources[i])
+        ExperimentSession.objects.create(
+            experiment=experiment, started_by=cls.pi, ended_by=cls.pi, uuid=str(uuid4()))
+        return experiment
+
+    @staticmethod
+    def add_resource(experiment: AerpawExperiment, resource: AerpawResource):
+        experiment.resources.add(resource)
+        CanonicalExperimentResource.objects.create(
+            experiment=experiment, resource=resource, node_type=CanonicalExperimentResource.NodeType.AFRN,
+            node_vehicle=CanonicalExperimentResource.NodeVehicle.VEHICLE_NONE, uuid=str(uuid4()))
+
+    def grow_experiments(self):
+        for i in range(3, 10):
+            self.create_experiment(i)
+
+    def grow_experiment(self):
+        member_ids = set(self.experiment.userexperiment_set.values_list('user_id', flat=True))
+        for user in self.members:
+            if user.id not in member_ids:
+                UserExperiment.objects.create(experiment=self.experiment, user=user, granted_by=self.pi)
+        for resource in self.resources[3:]:
+            self.add_resource(self.experiment, resource)
+
+    def test_experiments(self):
+        path = '/api/experiments/{0}'.format(self.experiment.id)
+        self.assertQueryBudget(self.pi, 'get', '/api/experiments', max_queries=3, max_ms=250)
+        self.assertQueryBudget(self.pi, 'get', path, max_queries=6, max_ms=250)
+        self.assertQueryBudget(self.pi, 'put', path, data={'description': 'updated experiment'},
+                               max_queries=8, max_ms=500)
+        self.assertNoNPlusOne(self.pi, '/api/experiments', self.grow_experiments)
+        self.assertNoNPlusOne(self.pi, path, self.grow_experiment)
+
+    def test_experiment_create_and_delete(self):
+        response = self.assertQueryBudget(
+            self.pi, 'post', '/api/experiments',
+            data={'name': 'new experiment', 'description': 'new experiment', 'project_id': self.project.id},
+            max_queries=20, max_ms=500)
+        self.assertEqual(response.data['canonical_number'], 1)
+        path = '/api/experiments/{0}'.format(response.data['experiment_id'])
+        self.assertQueryBudget(self.pi, 'delete', path, max_queries=14, max_ms=500, status_code=204)
+        self.assertTrue(FreeCanonicalNumber.objects.filter(canonical_number=1).exists())
+
+    def test_experiment_membership(self):
+        path = '/api/experiments/{0}/membership'.format(self.experiment.id)
+        self.assertQueryBudget(self.pi, 'get', path, max_queries=5, max_ms=250)
+        self.assertQueryBudget(self.pi, 'put', path, data={'experiment_members': [u.id for u in self.members[:5]]},
+                               max_queries=11, max_ms=500)
+        self.assertQueryBudget(self.pi, 'put', path, data={'experiment_members': [u.id for u in self.members]},
+                               max_queries=11, max_ms=500)
+        members = UserExperiment.objects.filter(experiment=self.experiment).values_list('user_id', flat=True)
+        self.assertEqual(set(members), {u.id for u in self.members})
+        self.assertNoNPlusOne(self.pi, path, self.grow_experiment)
+
+    def test_experiment_resources(self):
+        path = '/api/experiments/{0}/resources'.format(self.experiment.id)
+        self.assertQueryBudget(self.pi, 'get', path, max_queries=3, max_ms=250)
+        self.assertQueryBudget(self.pi, 'put', path,
+                               data={'experiment_resources': [r.id for r in self.resources[:5]]},
+                               max_queries=11, max_ms=500)
+        self.assertNoNPlusOne(self.pi, path, self.grow_experiment)
+
+    def test_user_experiment(self):
+        membership = UserExperiment.objects.filter(experiment=self.experiment).first()
+        self.assertQueryBudget(self.operator, 'get', '/api/user-experiment', max_queries=3, max_ms=250)
+        self.assertQueryBudget(self.operator, 'get', '/api/user-experiment/{0}'.format(membership.id),
+                               max_queries=2, max_ms=250)
+        self.assertNoNPlusOne(self.operator, '/api/user-experiment', self.grow_experiments)
+
+    def test_sessions(self):
+        self.assertQueryBudget(self.operator, 'get', '/api/sessions', max_queries=3, max_ms=250)
+        self.assertQueryBudget(self.operator, 'get', '/api/sessions/{0}'.format(self.session.id),
+                               max_queries=2, max_ms=250)
+        self.assertNoNPlusOne(self.operator, '/api/sessions', self.grow_experiments)
+
+    def test_canonical_experiment_resource(self):
+        path = '/api/canonical-experiment-resource/{0}'.format(self.cer.id)
+        list_path = '/api/canonical-experiment-resource?experiment_id={0}'.format(self.experiment.id)
+        self.assertQueryBudget(self.pi, 'get', list_path, max_queries=4, max_ms=250)
+        self.assertQueryBudget(self.pi, 'get', path, max_queries=3, max_ms=250)
+        self.assertQueryBudget(self.pi, 'put', path,
+                               data={'node_uhd': CanonicalExperimentResource.NodeUhd.ONE_THREE_THREE},
+                               max_queries=5, max_ms=500)
+        self.assertNoNPlusOne(self.pi, list_path, self.grow_experiment)
+
+    def test_experiment_pages(self):
+        path = '/experiments/{0}'.format(self.experiment.id)
+        self.assertPageBudget(self.pi, path, max_queries=13, max_ms=500)
+        self.assertPageBudget(self.pi, path + '/edit', max_queries=5, max_ms=500)
+        # canonical experiment resources and member names load in one query each however many rows there are
+        self.grow_experiment()
+        response = self.assertPageBudget(self.pi, path, max_queries=13, max_ms=500)
+        self.assertEqual([r['resource_name'] for r in response.context['resources']],
+                         [r.name for r in self.resources[:1] + self.resources[3:]])
+        self.assertContains(response, self.members[-1].username)
+
+    def test_experiment_page_error(self):
+        self.client.force_login(self.pi)
+        response = self.client.get('/experiments/0')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['experiment'])
+        self.assertIsNotNone(response.context['message'])
+
+
+class ExperimentResourceTargetingTestCase(QueryBudgetTestCase):
+    """
+    Set based resource targeting: 64 testbed nodes in a fixed number of queries
+    """
+    num_resources = 64
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pi = create_user('pi@example.org', AerpawRolesEnum.EXPERIMENTER.value, AerpawRolesEnum.PI.value)
+        project = AerpawProject.objects.create(
+            name='project', description='project', project_creator=cls.pi, **audit_fields(cls.pi))
+        UserProject.objects.create(
+            project=project, user=cls.pi, granted_by=cls.pi, project_role=UserProject.RoleType.PROJECT_OWNER)
+        resource_types = list(CER_NODE_TYPES.keys())
+        cls.resources = AerpawResource.objects.bulk_create([
+            AerpawResource(name='node-{0:02d}'.format(i), description='node',
+                           resource_class=AerpawResource.ResourceClass.ALLOW_CANONICAL if i % 8 else
+                           AerpawResource.ResourceClass.EXCLUDE_CANONICAL,
+                           resource_type=resource_types[i % len(resource_types)], **audit_fields(cls.pi))
+            for i in range(cls.num_resources)
+        ])
+        cls.experiment = AerpawExperiment.objects.create(
+            name='experiment', description='experiment', project=project, is_canonical=False,
+            canonical_number=CanonicalNumber.objects.create(canonical_number=1), experiment_creator=cls.pi,
+            **audit_fields(cls.pi))
+        UserExperiment.objects.create(experiment=cls.experiment, user=cls.pi, granted_by=cls.pi)
+        cls.path = '/api/experiments/{0}/resources'.format(cls.experiment.id)
+
+    def cers(self) -> list:
+        return list(CanonicalExperimentResource.objects.filter(experiment=self.experiment).order_by(
+            'experiment_node_number').values_list('resource_id', 'experiment_node_number', 'node_type', 'node_vehicle'))
+
+    def test_target_testbed(self):
+        resource_ids = [r.id for r in self.resources]
+        self.assertQueryBudget(self.pi, 'put', self.path, data={'experiment_resources': resource_ids + [0]},
+                               max_queries=11, max_ms=1000)
+        cers = self.cers()
+        self.assertEqual(sorted(c[0] for c in cers), resource_ids)
+        self.assertEqual([c[1] for c in cers], list(range(1, self.num_resources + 1)))
+        for resource in self.resources:
+            node_type, node_vehicle = CER_NODE_TYPES[resource.resource_type]
+            self.assertIn((resource.id, node_type, node_vehicle), {(c[0], c[2], c[3]) for c in cers})
+        self.assertQueryBudget(self.pi, 'put', self.path, data={'experiment_resources': resource_ids[::2]},
+                               max_queries=10, max_ms=1000)
+        cers = self.cers()
+        self.assertEqual(sorted(c[0] for c in cers), resource_ids[::2])
+        self.assertEqual([c[1] for c in cers], list(range(1, self.num_resources // 2 + 1)))
+
+    def test_canonical_experiment_is_all_or_nothing(self):
+        AerpawExperiment.objects.filter(pk=self.experiment.pk).update(is_canonical=True)
+        response = self.api_client(self.pi).put(
+            self.path, {'experiment_resources': [r.id for r in self.resources]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.cers(), [])
+        self.assertFalse(self.experiment.resources.exists())
+
+
+class TimestampCursorTestCase(QueryBudgetTestCase):
+    """
+    Keyset pagination on timestamps: rows that differ only in microseconds are neither skipped nor repeated
+    - sessions ('-created', '-id'), user-experiment ('-granted_date', '-id'), canonical-experiment-resource
+      ('created', 'id' of an experiment, '-created', '-id' unfiltered)
+    """
+    num_rows = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = create_user('operator@example.org', AerpawRolesEnum.OPERATOR.value)
+        project = AerpawProject.objects.create(
+            name='project', description='project', project_creator=cls.operator, **audit_fields(cls.operator))
+        experiment = AerpawExperiment.objects.create(
+            name='experiment', description='experiment', project=project, is_canonical=False,
+            canonical_number=CanonicalNumber.objects.create(canonical_number=1), experiment_creator=cls.operator,
+            **audit_fields(cls.operator))
+        resource = AerpawResource.objects.create(
+            name='resource', description='resource', resource_type=AerpawResource.ResourceType.AFRN,
+            **audit_fields(cls.operator))
+        members = [create_user('member{0}@example.org'.format(i)) for i in range(cls.num_rows)]
+        base = timezone.now().replace(microsecond=0)
+        for i in range(cls.num_rows):
+            # all rows within the same millisecond
+            at = base + timedelta(microseconds=100 * i + 1)
+            session = ExperimentSession.objects.create(
+                experiment=experiment, started_by=cls.operator, ended_by=cls.operator, uuid=str(uuid4()))
+            ExperimentSession.objects.filter(pk=session.pk).update(created=at)
+            membership = UserExperiment.objects.create(experiment=experiment, user=members[i], granted_by=cls.operator)
+            UserExperiment.objects.filter(pk=membership.pk).update(granted_date=at)
+            cer = CanonicalExperimentResource.objects.create(
+                experiment=experiment, resource=resource, node_type=CanonicalExperimentResource.NodeType.AFRN,
+                node_uhd=CanonicalExperimentResource.NodeUhd.ONE_THREE_THREE,
+                node_vehicle=CanonicalExperimentResource.NodeVehicle.VEHICLE_NONE, uuid=str(uuid4()))
+            CanonicalExperimentResource.objects.filter(pk=cer.pk).update(created=at)
+
+    def walk(self, path: str, key: str, expected: list, **params):
+        client = self.api_client(self.operator)
+        data = client.get(path, dict(params, pagination='cursor', page_size=2)).data
+        pages = [[r[key] for r in data['results']]]
+        while data['next'] and len(pages) <= self.num_rows:
+            data = client.get(data['next']).data
+            pages.append([r[key] for r in data['results']])
+        self.assertEqual(sum(pages, []), expected)
+        backward = []
+        while data['previous'] and len(backward) <= self.num_rows:
+            data = client.get(data['previous']).data
+            backward.insert(0, [r[key] for r in data['results']])
+        self.assertEqual(backward, pages[:-1])
+
+    def test_created_descending(self):
+        self.walk('/api/sessions', 'session_id',
+                  list(ExperimentSession.objects.order_by('-created', '-id').values_list('id', flat=True)))
+
+    def test_granted_date_descending(self):
+        self.walk('/api/user-experiment', 'id',
+                  list(UserExperiment.objects.order_by('-granted_date', '-id').values_list('id', flat=True)))
+
+    def test_created_ascending(self):
+        cers = CanonicalExperimentResource.objects.all()
+        self.walk('/api/canonical-experiment-resource', 'canonical_experiment_resource_id',
+                  list(cers.order_by('created', 'id').values_list('id', flat=True)),
+                  experiment_id=cers.first().experiment_id)
+
+    def test_cursor_and_page_order_match(self):
+        # unfiltered canonical experiment resources: newest first in both modes
+        expected = list(CanonicalExperimentResource.objects.order_by('-created', '-id').values_list('id', flat=True))
+        self.walk('/api/canonical-experiment-resource', 'canonical_experiment_resource_id', expected)
+        data = self.api_client(self.operator).get('/api/canonical-experiment-resource', {'page_size': 100}).data
+        self.assertEqual([r['canonical_experiment_resource_id'] for r in data['results']], expected)
+
+
+class UserExperimentIndexTestCase(IndexScanTestCase):
+
+    def test_membership_lookup(self):
+        membership = UserExperiment.objects.order_by('id').last()
+        self.assertIndexScan(
+            UserExperiment.objects.filter(user_id=membership.user_id, experiment_id=membership.experiment_id),
+            'unique_user_experiment')
+
+
+class ExperimentStateMachineTestCase(QueryBudgetTestCase):
+    """
+    saved -> wait_*_deploy -> active_* -> saved through /experiments/{id}/state, logged in ExperimentStateTransition
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pi = create_user('pi@example.org', AerpawRolesEnum.EXPERIMENTER.value, AerpawRolesEnum.PI.value)
+        cls.operator = create_user('operator@example.org', AerpawRolesEnum.OPERATOR.value)
+        cls.outsider = create_user('outsider@example.org', AerpawRolesEnum.EXPERIMENTER.value)
+        project = AerpawProject.objects.create(
+            name='project', description='project', project_creator=cls.pi, **audit_fields(cls.pi))
+        UserProject.objects.create(
+            project=project, user=cls.pi, granted_by=cls.pi, project_role=UserProject.RoleType.PROJECT_OWNER)
+        cls.experiment = AerpawExperiment.objects.create(
+            name='experiment', description='experiment', project=project, is_canonical=False,
+            canonical_number=CanonicalNumber.objects.create(canonical_number=1), experiment_creator=cls.pi,
+            **audit_fields(cls.pi))
+        UserExperiment.objects.create(experiment=cls.experiment, user=cls.pi, granted_by=cls.pi)
+        cls.path = '/api/experiments/{0}/state'.format(cls.experiment.id)
+
+    def transition(self, user: AerpawUser, data: dict):
+        return self.api_client(user).put(self.path, data, format='json')
+
+    def state(self) -> str:
+        return AerpawExperiment.objects.values_list('experiment_state', flat=True).get(pk=self.experiment.pk)
+
+    def test_deploy_activate_stop(self):
+        response = self.api_client(self.pi).get(self.path)
+        self.assertEqual(response.data['experiment_state'], 'saved')
+        self.assertEqual(response.data['transitions'], ['deploy'])
+        self.assertQueryBudget(self.pi, 'put', self.path, data={'transition': 'deploy', 'session_type': 'testbed'},
+                               max_queries=10, max_ms=1000)
+        self.assertEqual(self.state(), 'wait_testbed_deploy')
+        self.assertEqual(self.transition(self.pi, {'transition': 'activate'}).status_code, 403)
+        response = self.transition(self.operator, {'transition': 'activate'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['experiment_state'], 'active_testbed')
+        self.assertEqual(response.data['transitions'], ['stop'])
+        response = self.transition(self.pi, {'transition': 'stop'})
+        self.assertEqual(response.data['experiment_state'], 'saved')
+        self.assertEqual(
+            [(t['from_state'], t['to_state'], t['transition'], t['transitioned_by'])
+             for t in response.data['state_transitions']],
+            [('saved', 'wait_testbed_deploy', 'deploy', self.pi.id),
+             ('wait_testbed_deploy', 'active_testbed', 'activate', self.operator.id),
+             ('active_testbed', 'saved', 'stop', self.pi.id)])
+
+    def test_invalid_transitions(self):
+        self.assertEqual(self.transition(self.operator, {'transition': 'activate'}).status_code, 400)
+        self.assertEqual(self.transition(self.pi, {'transition': 'stop'}).status_code, 400)
+        self.assertEqual(self.transition(self.pi, {'transition': 'launch'}).status_code, 400)
+        self.assertEqual(self.transition(self.pi, {'transition': 'deploy', 'session_type': 'lab'}).status_code, 400)
+        sandbox = {'transition': 'deploy', 'session_type': 'sandbox'}
+        self.assertEqual(self.transition(self.outsider, sandbox).status_code, 404)
+        self.assertEqual(self.transition(self.pi, sandbox).status_code, 200)
+        self.assertEqual(self.transition(self.pi, {'transition': 'deploy', 'session_type': 'testbed'}).status_code, 400)
+        self.assertEqual(self.state(), 'wait_sandbox_deploy')
+        self.assertEqual(ExperimentStateTransition.objects.filter(experiment=self.experiment).count(), 1)
+
+    def test_transition_log_is_append_only(self):
+        self.transition(self.pi, {'transition': 'deploy', 'session_type': 'emulation'})
+        logged = ExperimentStateTransition.objects.get(experiment=self.experiment)
+        logged.to_state = 'saved'
+        self.assertRaises(ValueError, logged.save)
+        self.assertRaises(ValueError, logged.delete)
+
+    def test_time_in_state(self):
+        now = timezone.now()
+        ExperimentStateTransition.objects.bulk_create([
+            ExperimentStateTransition(experiment=self.experiment, from_state=from_state, to_state=to_state,
+                                      transition=name, transitioned_at=now - timedelta(minutes=minutes))
+            for from_state, to_state, name, minutes in [
+                ('saved', 'wait_testbed_deploy', 'deploy', 60),
+                ('wait_testbed_deploy', 'active_testbed', 'activate', 50),
+                ('active_testbed', 'saved', 'stop', 20),
+                ('saved', 'wait_testbed_deploy', 'deploy', 10)
+            ]
+        ])
+        AerpawExperiment.objects.filter(pk=self.experiment.pk).update(experiment_state='wait_testbed_deploy')
+        metrics = time_in_state(now - timedelta(days=1))
+        self.assertEqual(metrics['wait_testbed_deploy']['stays'], 2)
+        self.assertEqual(metrics['wait_testbed_deploy']['current'], 1)
+        self.assertEqual(metrics['active_testbed']['max_seconds'], 1800)
+        self.assertEqual(metrics['saved']['p50_seconds'], 600)
+        self.assertEqual(self.api_client(self.pi).get('/api/p-experiment-states').status_code, 403)
+        response = self.api_client(self.operator).get(
+            '/api/p-experiment-states', {'experiment_state': 'wait_testbed_deploy'})
+        self.assertEqual(response.data['states'], {'wait_testbed_deploy': 1})
+        self.assertEqual([e['experiment_id'] for e in response.data['experiments']], [self.experiment.id])
+        self.assertEqual(response.data['time_in_state']['active_testbed']['stays'], 1)
+
+
+class ExperimentStateIndexTestCase(IndexScanTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # most experiments are saved, a few wait for a deployment or are active
+        not_saved = list(AerpawExperiment.objects.order_by('id').values_list('id', flat=True))[::50]
+        AerpawExperiment.objects.exclude(id__in=not_saved).update(
+            experiment_state=AerpawExperiment.ExperimentState.SAVED)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_waiting_for_testbed_deploy(self):
+        self.assertIndexScan(experiments_not_saved(AerpawExperiment.ExperimentState.WAIT_TESTBED_DEPLOY),
+                             'experiment_not_saved_idx')
+
+
+class ExperimentAsyncReadPathTestCase(AsyncReadPathTestCase):
+    """
+    /api/async/experiments returns the same data as /api/experiments
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.pi = create_user('pi@example.org', AerpawRolesEnum.EXPERIMENTER.value, AerpawRolesEnum.PI.value)
+        self.member = create_user('member@example.org', AerpawRolesEnum.EXPERIMENTER.value)
+        self.outsider = create_user('outsider@example.org', AerpawRolesEnum.EXPERIMENTER.value)
+        self.project = AerpawProject.objects.create(
+            name='project', description='project', project_creator=self.pi, **audit_fields(self.pi))
+        UserProject.objects.create(project=self.project, user=self.member, granted_by=self.pi,
+                                   project_role=UserProject.RoleType.PROJECT_MEMBER)
+        resources = AerpawResource.objects.bulk_create([
+            AerpawResource(name='resource-{0:02d}'.format(i), description='resource', **audit_fields(self.pi))
+            for i in range(3)
+        ])
+        self.experiments = []
+        for i in range(7):
+            experiment = AerpawExperiment.objects.create(
+                name='experiment-{0:02d}'.format(i), description='experiment', project=self.project,
+                canonical_number=CanonicalNumber.objects.create(canonical_number=100 + i),
+                experiment_creator=self.pi, **audit_fields(self.pi))
+            UserExperiment.objects.create(experiment=experiment, user=self.pi, granted_by=self.pi)
+            experiment.resources.add(*resources[:i % 3 + 1])
+            self.experiments.append(experiment)
+        UserExperiment.objects.create(experiment=self.experiments[0], user=self.member, granted_by=self.pi)
+
+    def test_experiment_list(self):
+        for user in [self.pi, self.member, self.outsider]:
+            data = self.assertSameResponse(
+                user, '/api/experiments?pagination=cursor&count=approximate',
+                '/api/async/experiments?count=approximate')
+        self.assertEqual(data['count'], 0)
+        data = self.assertSameResponse(
+            self.member, '/api/experiments?pagination=cursor&count=exact&page_size=3&search=experiment',
+            '/api/async/experiments?count=exact&page_size=3&search=experiment')
+        self.assertEqual((data['count'], len(data['results'])), (7, 3))
+        cursor = data['next'].split('cursor=')[1]
+        data = self.assertSameResponse(
+            self.member, '/api/experiments?count=exact&page_size=3&search=experiment&cursor={0}'.format(cursor),
+            '/api/async/experiments?count=exact&page_size=3&search=experiment&cursor={0}'.format(cursor))
+        self.assertEqual([row['name'] for row in data['results']], ['experiment-03', 'experiment-04', 'experiment-05'])
+        self.assertSameResponse(self.pi, '/api/experiments?pagination=cursor&count=all',
+                                '/api/async/experiments?count=all', status_code=400)
+
+    def test_experiment_retrieve(self):
+        for experiment in self.experiments[:3]:
+            for user in [self.pi, self.member]:
+                data = self.assertSameResponse(
+                    user, '/api/experiments/{0}'.format(experiment.id),
+                    '/api/async/experiments/{0}'.format(experiment.id))
+        self.assertEqual(len(data['resources']), 3)
+        self.assertSameResponse(self.outsider, '/api/experiments/{0}'.format(self.experiments[0].id),
+                                '/api/async/experiments/{0}'.format(self.experiments[0].id), status_code=403)
+        self.assertSameResponse(self.pi, '/api/experiments/0', '/api/async/experiments/0', status_code=404)
+
+    def test_authentication(self):
+        response = async_to_sync(self.async_client.get)('/api/async/experiments')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), self.client.get('/api/experiments').json())
+        self.assertIn('Bearer', response.headers['WWW-Authenticate'])
+        # portal JWT that fails signature verification (opaque bearer tokens are verified by the OIDC provider)
+        token = str(AccessToken.for_user(self.pi))
+        response = async_to_sync(self.async_client.get)(
+            '/api/async/experiments', headers={'Authorization': 'Bearer {0}x'.format(token)})
+        self.assertEqual(response.status_code, 401)
+        response = async_to_sync(self.async_client.post)('/api/async/experiments')
+        self.assertEqual(response.status_code, 405)
@@ -1,17 +1,22 @@
-from urllib.parse import parse_qs, urlparse
+import logging
 
 from django.contrib.auth.decorators import login_required
-from django.http import HttpRequest, QueryDict
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views.decorators.csrf import csrf_exempt
-from rest_framework.request import Request
 
-from portal.apps.experiments.api.viewsets import CanonicalExperimentResourceViewSet, ExperimentViewSet
+from portal.apps.experiments import services
 from portal.apps.experiments.forms import ExperimentCreateForm, ExperimentEditForm, ExperimentMembershipForm, \
     ExperimentResourceTargetsForm, ExperimentResourceTargetModifyForm
+from portal.apps.experiments.membership import get_membership_index
 from portal.apps.experiments.models import AerpawExperiment, CanonicalExperimentResource
-from portal.apps.projects.api.viewsets import ProjectViewSet
-from portal.server.settings import DEBUG, REST_FRAMEWORK
+from portal.apps.mixins.identity import identity_map, load_ids
+from portal.apps.projects.models import AerpawProject
+from portal.apps.projects.services import get_project, get_project_membership
+from portal.apps.resources.models import AerpawResource
+from portal.apps.users.models import AerpawUser
+from portal.server.settings import DEBUG
+
+logger = logging.getLogger(__name__)
 
 
 @csrf_exempt
@@ -20,69 +25,37 @@ def experiment_list(request):
     message = None
     # TODO: request to join experiment
     try:
-        # check for query parameters
-        current_page = 1
-        search_term = None
-        data_dict = {}
-        if request.GET.get('search'):
-            data_dict['search'] = request.GET.get('search')
-            search_term = request.GET.get('search')
-        if request.GET.get('page'):
-            data_dict['page'] = request.GET.get('page')
-            current_page = int(request.GET.get('page'))
-        request.query_params = QueryDict('', mutable=True)
-        request.query_params.update(data_dict)
-        e = ExperimentViewSet(request=request)
-        experiments = e.list(request=request)
-        # get prev, next and item range
-        next_page = None
-        prev_page = None
-        count = 0
-        min_range = 0
-        max_range = 0
-        if experiments.data:
-            experiments = dict(experiments.data)
-            prev_url = experiments.get('previous', None)
-            if prev_url:
-                prev_dict = parse_qs(urlparse(prev_url).query)
-                try:
-                    prev_page = prev_dict['page'][0]
-                except Exception as exc:
-                    print(exc)
-                    prev_page = 1
-            next_url = experiments.get('next', None)
-            if next_url:
-                next_dict = parse_qs(urlparse(next_url).query)
-                try:
-                    next_page = next_dict['page'][0]
-                except Exception as exc:
-                    print(exc)
-                    next_page = 1
-            count = int(experiments.get('count'))
-            min_range = int(current_page - 1) * int(REST_FRAMEWORK['PAGE_SIZE']) + 1
-            max_range = int(current_page - 1) * int(REST_FRAMEWORK['PAGE_SIZE']) + int(REST_FRAMEWORK['PAGE_SIZE'])
-            if max_range > count:
-                max_range = count
-        item_range = '{0} - {1}'.format(str(min_range), str(max_range))
+        # cursor pagination with an approximate count
+        search_term = request.GET.get('search') or None
+        experiments = services.list_experiments(request.user, search=search_term, cursor=request.GET.get('cursor'))
+        next_cursor = experiments.next_cursor
+        prev_cursor = experiments.previous_cursor
+        count = experiments.count or 0
+        count_is_approximate = experiments.count_is_approximate
+        item_count = len(experiments)
+        load_ids(AerpawProject, experiments.results, 'project_id')
+        load_ids(AerpawUser, experiments.results, 'experiment_creator')
     except Exception as exc:
         message = exc
         experiments = None
-        item_range = None
-        next_page = None
-        prev_page = None
+        item_count = 0
+        next_cursor = None
+        prev_cursor = None
         search_term = None
         count = 0
+        count_is_approximate = False
     return render(request,
                   'experiment_list.html',
                   {
                       'user': request.user,
                       'experiments': experiments,
-                      'item_range': item_range,
+                      'item_count': item_count,
                       'message': message,
-                      'next_page': next_page,
-                      'prev_page': prev_page,
+                      'next_cursor': next_cursor,
+                      'prev_cursor': prev_cursor,
                       'search': search_term,
                       'count': count,
+                      'count_is_approximate': count_is_approximate,
                       'debug': DEBUG
                   })
 
@@ -92,28 +65,24 @@ def experiment_list(request):
 def experiment_detail(request, experiment_id):
     message = None
     try:
-        e = ExperimentViewSet(request=request)
-        experiment = e.retrieve(request=request, pk=experiment_id).data
+        experiment = services.get_experiment(request.user, experiment_id)
         if request.method == "POST":
             if request.POST.get('delete-experiment') == "true":
-                exp = e.destroy(request=request, pk=experiment_id).data
+                services.delete_experiment(request.user, experiment_id)
                 return redirect('experiment_list')
+        load_ids(AerpawProject, [experiment], 'project_id')
+        load_ids(AerpawUser, [experiment] + experiment.get('experiment_members'),
+                 'experiment_creator', 'last_modified_by', 'user_id', 'granted_by')
         # get canonical experiment resource definitions
         try:
-            resources = []
-            request.query_params = QueryDict('', mutable=True)
-            request.query_params.update({'experiment_id': experiment_id})
-            for res_id in experiment.get('resources'):
-                request.query_params.update({'resource_id': res_id})
-                r = CanonicalExperimentResourceViewSet(request=request)
-                res = r.list(request=request)
-                if res.data:
-                    resources.append(res.data.get('results')[0])
+            resources = services.list_experiment_resource_definitions(
+                request.user, experiment_id, experiment.get('resources'))
         except Exception as exc:
             resources = []
-            print(exc)
+            logger.warning('unable to list the resources of experiment %s: %s', experiment_id, exc)
     except Exception as exc:
         message = exc
+        experiment = None
         resources = []
     return render(request,
                   'experiment_detail.html',
@@ -135,19 +104,14 @@ def experiment_create(request):
         form = ExperimentCreateForm(request.POST)
         if form.is_valid():
             try:
-                request.data = QueryDict('', mutable=True)
-                data_dict = form.data.dict()
-                request.data.update(data_dict)
-                e = ExperimentViewSet(request=request)
-                request.data.update(data_dict)
-                experiment = e.create(request=request).data
-                return redirect('experiment_detail', experiment_id=experiment.get('experiment_id', 9999))
+                experiment = services.create_experiment(request.user, form.data.dict())
+                return redirect('experiment_detail', experiment_id=experiment.id)
             except Exception as exc:
                 message = exc
     else:
         project_id = request.GET.get('project_id')
-        p = ProjectViewSet()
-        project = p.retrieve(request=request, pk=project_id).data
+        project = get_project(request.user, project_id)
+        load_ids(AerpawProject, [project], 'project_id')
         form = ExperimentCreateForm(initial={'project_id': project_id})
     return render(request,
                   'experiment_create.html',
@@ -162,23 +126,20 @@ def experiment_create(request):
 @login_required
 def experiment_edit(request, experiment_id):
     message = 'INFO: selecting IS_RETIRED will permanently disable the experiment'
-    experiment = get_object_or_404(AerpawExperiment, id=experiment_id)
-    p = ProjectViewSet()
-    project = p.retrieve(request=request, pk=experiment.project.id).data
+    experiment = get_object_or_404(AerpawExperiment.objects.select_related('project'), id=experiment_id)
+    # the page only shows the project id and the caller's project membership
+    project = {
+        'membership': get_project_membership(request.user, experiment.project),
+        'project_id': experiment.project_id
+    }
+    identity_map().add(experiment, experiment.project)
     if request.method == "POST":
         form = ExperimentEditForm(request.POST)
         if form.is_valid():
             try:
-                request.data = QueryDict('', mutable=True)
                 data_dict = form.data.dict()
-                if data_dict.get('is_retired', '') == 'on':
-                    data_dict.update({'is_retired': 'true'})
-                else:
-                    data_dict.update({'is_retired': 'false'})
-                request.data.update(data_dict)
-                e = ExperimentViewSet(request=request)
-                request.data.update(data_dict)
-                experiment = e.partial_update(request=request, pk=experiment_id)
+                data_dict.update({'is_retired': 'true' if data_dict.get('is_retired', '') == 'on' else 'false'})
+                services.update_experiment(request.user, experiment_id, data_dict)
                 return redirect('experiment_detail', experiment_id=experiment_id)
             except Exception as exc:
                 message = exc
@@ -199,19 +160,17 @@ def experiment_edit(request, experiment_id):
 def experiment_members(request, experiment_id):
     message = None
     experiment = get_object_or_404(AerpawExperiment, id=experiment_id)
-    is_experiment_creator = experiment.is_creator(request.user)
-    is_experiment_member = experiment.is_member(request.user)
+    membership_index = get_membership_index(request.user)
+    is_experiment_creator = membership_index.is_experiment_creator(experiment)
+    is_experiment_member = membership_index.is_experiment_member(experiment)
+    identity_map().add(experiment)
     if request.method == "POST":
         form = ExperimentMembershipForm(request.POST, instance=experiment)
         if form.is_valid():
             try:
-                api_request = Request(request=HttpRequest())
-                api_request.data.update(
+                services.experiment_membership(
+                    request.user, experiment_id,
                     {'experiment_members': [int(i) for i in request.POST.getlist('experiment_members')]})
-                api_request.user = request.user
-                api_request.method = 'PUT'
-                e = ExperimentViewSet(request=api_request)
-                experiment = e.membership(request=api_request, pk=experiment_id)
                 return redirect('experiment_detail', experiment_id=experiment_id)
             except Exception as exc:
                 message = exc
@@ -236,70 +195,39 @@ def experiment_members(request, experiment_id):
 def experiment_resource_list(request, experiment_id):
     message = 'INFO: Be sure to properly configure "Node UHD" and "Node Vehicle"'
     try:
-        # check for query parameters
-        current_page = 1
-        search_term = None
-        data_dict = {'experiment_id': experiment_id}
-        if request.GET.get('search'):
-            data_dict['search'] = request.GET.get('search')
-            search_term = request.GET.get('search')
-        if request.GET.get('page'):
-            data_dict['page'] = request.GET.get('page')
-            current_page = int(request.GET.get('page'))
-        request.query_params = QueryDict('', mutable=True)
-        request.query_params.update(data_dict)
-        r = CanonicalExperimentResourceViewSet(request=request)
-        resources = r.list(request=request)
-        # get prev, next and item range
-        next_page = None
-        prev_page = None
-        count = 0
-        min_range = 0
-        max_range = 0
-        if resources.data:
-            resources = dict(resources.data)
-            prev_url = resources.get('previous', None)
-            if prev_url:
-                prev_dict = parse_qs(urlparse(prev_url).query)
-                try:
-                    prev_page = prev_dict['page'][0]
-                except Exception as exc:
-                    print(exc)
-                    prev_page = 1
-            next_url = resources.get('next', None)
-            if next_url:
-                next_dict = parse_qs(urlparse(next_url).query)
-                try:
-                    next_page = next_dict['page'][0]
-                except Exception as exc:
-                    print(exc)
-                    next_page = 1
-            count = int(resources.get('count'))
-            min_range = int(current_page - 1) * int(REST_FRAMEWORK['PAGE_SIZE']) + 1
-            max_range = int(current_page - 1) * int(REST_FRAMEWORK['PAGE_SIZE']) + int(REST_FRAMEWORK['PAGE_SIZE'])
-            if max_range > count:
-                max_range = count
-        item_range = '{0} - {1}'.format(str(min_range), str(max_range))
+        # cursor pagination with an approximate count
+        search_term = request.GET.get('search') or None
+        resources = services.list_canonical_experiment_resources(
+            request.user, experiment_id, cursor=request.GET.get('cursor'))
+        next_cursor = resources.next_cursor
+        prev_cursor = resources.previous_cursor
+        count = resources.count or 0
+        count_is_approximate = resources.count_is_approximate
+        item_count = len(resources)
+        load_ids(AerpawResource, resources.results, 'resource_id')
+        identity_map().load(AerpawExperiment, [experiment_id])
     except Exception as exc:
         message = exc
         resources = None
-        item_range = None
-        next_page = None
-        prev_page = None
+        item_count = 0
+        next_cursor = None
+        prev_cursor = None
         search_term = None
         count = 0
+        count_is_approximate = False
     return render(request,
                   'experiment_resource_list.html',
                   {
                       'user': request.user,
                       'resources': resources,
                       'experiment_id': experiment_id,
-                      'item_range': item_range,
+                      'item_count': item_count,
                       'message': message,
-                      'next_page': next_page,
-                      'prev_page': prev_page,
+                      'next_cursor': next_cursor,
+                      'prev_cursor': prev_cursor,
                       'search': search_term,
                       'count': count,
+                      'count_is_approximate': count_is_approximate,
                       'debug': DEBUG
                   })
 
@@ -309,19 +237,17 @@ def experiment_resource_list(request, experiment_id):
 def experiment_resource_targets(request, experiment_id):
     message = None
     experiment = get_object_or_404(AerpawExperiment, id=experiment_id)
-    is_experiment_creator = experiment.is_creator(request.user)
-    is_experiment_member = experiment.is_member(request.user)
+    membership_index = get_membership_index(request.user)
+    is_experiment_creator = membership_index.is_experiment_creator(experiment)
+    is_experiment_member = membership_index.is_experiment_member(experiment)
+    identity_map().add(experiment)
     if request.method == "POST":
         form = ExperimentResourceTargetsForm(request.POST, instance=experiment)
         if form.is_valid():
             try:
-                api_request = Request(request=HttpRequest())
-                api_request.data.update(
+                services.experiment_resources(
+                    request.user, experiment_id,
                     {'experiment_resources': [int(i) for i in request.POST.getlist('experiment_resources')]})
-                api_request.user = request.user
-                api_request.method = 'PUT'
-                e = ExperimentViewSet(request=api_request)
-                exp = e.resources(request=api_request, pk=experiment_id)
                 return redirect('experiment_resource_list', experiment_id=experiment_id)
             except Exception as exc:
                 message = exc
@@ -345,22 +271,19 @@ def experiment_resource_targets(request, experiment_id):
 @login_required
 def experiment_resource_target_edit(request, experiment_id, canonical_experiment_resource_id):
     message = None
-    cer = get_object_or_404(CanonicalExperimentResource, id=canonical_experiment_resource_id)
-    is_experiment_creator = cer.experiment.is_creator(request.user)
-    is_experiment_member = cer.experiment.is_member(request.user)
+    cer = get_object_or_404(
+        CanonicalExperimentResource.objects.select_related('experiment', 'resource'), id=canonical_experiment_resource_id)
+    membership_index = get_membership_index(request.user)
+    is_experiment_creator = membership_index.is_experiment_creator(cer.experiment)
+    is_experiment_member = membership_index.is_experiment_member(cer.experiment)
+    identity_map().add(cer.experiment, cer.resource)
     if request.method == "POST":
         form = ExperimentResourceTargetModifyForm(request.POST, instance=cer)
         if form.is_valid():
             try:
-                api_request = Request(request=HttpRequest())
-                if request.POST.get('node_uhd'):
-                    api_request.data.update({'node_uhd': request.POST.get('node_uhd')})
-                if request.POST.get('node_vehicle'):
-                    api_request.data.update({'node_vehicle': request.POST.get('node_vehicle')})
-                api_request.user = request.user
-                api_request.method = 'PUT'
-                c = CanonicalExperimentResourceViewSet(request=api_request)
-                u_cer = c.update(request=api_request, pk=canonical_experiment_resource_id)
+                services.update_canonical_experiment_resource(
+                    request.user, canonical_experiment_resource_id,
+                    {'node_uhd': request.POST.get('node_uhd'), 'node_vehicle': request.POST.get('node_vehicle')})
                 return redirect('experiment_resource_list', experiment_id=experiment_id)
             except Exception as exc:
                 message = exc
@@ -0,0 +1,98 @@
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import JsonResponse
+from rest_framework.exceptions import AuthenticationFailed, MethodNotAllowed, NotAuthenticated, ValidationError
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.views import exception_handler
+
+from portal.server.drf_settings import AerpawPagination, count_rows
+
+
+def authenticate(request) -> Request:
+    """
+    DRF request of request authenticated with the API authentication classes (JWT, OIDC bearer, session)
+    - blocking: run on a worker thread by async_api_view (see gather())
+    - the user's AERPAW roles are loaded here so role predicates do not query from the event loop
+    """
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    if not drf_request.user.is_authenticated:
+        raise NotAuthenticated()
+    drf_request.user.aerpaw_roles
+    return drf_request
+
+
+def async_api_view(view):
+    """
+    Async GET endpoint: view(request, *args, **kwargs) is awaited with the authenticated DRF request and returns
+    the response data
+    - errors are the same responses as on the DRF endpoints (DRF exception_handler)
+    """
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        drf_request = None
+        try:
+            if request.method != 'GET':
+                raise MethodNotAllowed(method=request.method)
+            drf_request, = await gather(lambda: authenticate(request))
+            return JsonResponse(await view(drf_request, *args, **kwargs), encoder=JSONEncoder, safe=False)
+        except Exception as exc:
+            if isinstance(exc, (AuthenticationFailed, NotAuthenticated)):
+                # like APIView: 401 with the header of the first authentication class
+                exc.auth_header = api_settings.DEFAULT_AUTHENTICATION_CLASSES[0]().authenticate_header(request)
+            response = exception_handler(exc, {'request': drf_request})
+            if response is None:
+                raise
+            return JsonResponse(response.data, encoder=JSONEncoder, safe=False, status=response.status_code,
+                                headers={name: response[name] for name in ['WWW-Authenticate', 'Retry-After']
+                                         if response.has_header(name)})
+
+    return wrapper
+
+
+def run_query(function):
+    """
+    function() on a worker thread with its own database connection, closed like at the end of a request
+    (connections are only kept when persistent)
+    """
+    close_old_connections()
+    try:
+        return function()
+    finally:
+        close_old_connections()
+
+
+async def gather(*functions) -> list:
+    """
+    Results of independent blocking functions (ORM queries) run concurrently, in the order of functions
+    - the async ORM runs the queries of a request one after the other on the request thread, so each function
+      runs on a thread of its own (and thus on its own connection) instead
+    """
+    return list(await asyncio.gather(
+        *[sync_to_async(run_query, thread_sensitive=False)(function) for function in functions]))
+
+
+async def cursor_page_data(request, queryset, ordering: tuple, projection) -> dict:
+    """
+    Response data of a keyset page of queryset: the same as the DRF list endpoints with ?pagination=cursor
+    - count: approximate (default) | exact
+    - the page rows and the count are read concurrently (see gather())
+    """
+    count_mode = request.query_params.get('count', 'approximate')
+    if count_mode not in ['exact', 'approximate']:
+        raise ValidationError(
+            detail="count: valid choices are ['approximate', 'exact']")
+    paginator = AerpawPagination()
+    paginator.request = request
+    queryset = projection.values(queryset)
+    cursor = request.query_params.get(paginator.cursor_query_param, None)
+    page_size = paginator.get_page_size(request)
+    results, (paginator.count, paginator.count_is_approximate) = await gather(
+        lambda: paginator.paginate_cursor(queryset, ordering, cursor, page_size),
+        lambda: count_rows(queryset, count_mode))
+    return paginator.get_paginated_response(projection.rows(results)).data
@@ -0,0 +1,49 @@
+from django.db.models import Q
+
+# rows per back-fill batch (one select, one user lookup and one bulk_update per batch)
+AUDIT_BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_audit_users(model, user_model, batch_size: int = AUDIT_BACKFILL_BATCH_SIZE) -> int:
+    """
+    Copy the created_by / modified_by strings of model into the created_by_user / modified_by_user foreign keys
+    - for migrations: model and user_model are the historical models (apps.get_model)
+    - the strings were written as username or email: both are matched, username first
+    - strings that match no user leave the foreign key null
+    """
+    updated = 0
+    last_pk = 0
+    while True:
+        rows = list(model.objects.filter(pk__gt=last_pk).order_by('pk').values_list(
+            'pk', 'created_by', 'modified_by')[:batch_size])
+        if not rows:
+            return updated
+        last_pk = rows[-1][0]
+        names = {name for row in rows for name in row[1:] if name}
+        user_ids = {}
+        for user_id, username, email in user_model.objects.filter(
+                Q(username__in=names) | Q(email__in=names)).values_list('pk', 'username', 'email'):
+            user_ids.setdefault(email, user_id)
+            user_ids[username] = user_id
+        model.objects.bulk_update(
+            [model(pk=pk, created_by_user_id=user_ids.get(created_by), modified_by_user_id=user_ids.get(modified_by))
+             for pk, created_by, modified_by in rows],
+            ['created_by_user', 'modified_by_user'])
+        updated += len(rows)
+
+
+def restore_audit_emails(model, batch_size: int = AUDIT_BACKFILL_BATCH_SIZE) -> None:
+    """
+    Reverse of backfill_audit_users(): created_by / modified_by strings from the foreign keys (user email)
+    """
+    last_pk = 0
+    while True:
+        rows = list(model.objects.filter(pk__gt=last_pk).order_by('pk').values_list(
+            'pk', 'created_by_user__email', 'modified_by_user__email')[:batch_size])
+        if not rows:
+            return
+        last_pk = rows[-1][0]
+        model.objects.bulk_update(
+            [model(pk=pk, created_by=created_by or '', modified_by=modified_by or '')
+             for pk, created_by, modified_by in rows],
+            ['created_by', 'modified_by'])
@@ -0,0 +1,156 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import urlencode
+
+# cache alias of the read-through response cache (see CACHES in settings)
+RESPONSE_CACHE_ALIAS = 'responses'
+# bumped by invalidate_all(): every namespace version is read together with it
+ALL_NAMESPACES = 'all'
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def response_cache():
+    return caches[RESPONSE_CACHE_ALIAS]
+
+
+def version_key(namespace: str) -> str:
+    return 'version:{0}'.format(namespace)
+
+
+def bump_version(namespace: str) -> None:
+    """
+    Move namespace to a new version: responses cached under the previous version are never read again
+    - versions start at the current time in ns so an evicted version key cannot come back as an old value
+    """
+    cache = response_cache()
+    key = version_key(namespace)
+    cache.add(key, time.time_ns(), timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def invalidate(*namespaces: str) -> None:
+    """
+    Invalidate the responses of namespaces now and again when the current transaction commits
+    - now: reads later in the same transaction see the write
+    - on commit: a concurrent read that cached pre-commit rows between the two bumps is discarded
+    """
+    for namespace in namespaces:
+        bump_version(namespace)
+    transaction.on_commit(lambda: [bump_version(namespace) for namespace in namespaces])
+
+
+def invalidate_all() -> None:
+    invalidate(ALL_NAMESPACES)
+
+
+def role_class(user) -> str:
+    """
+    Cached responses are shared by all callers of the same role class
+    """
+    return 'operator' if user.is_operator() else 'user'
+
+
+def cache_key(user, parts: list, namespaces: tuple, versions: dict) -> str:
+    parts = [role_class(user)] + [str(part) for part in parts] + \
+            ['{0}={1}'.format(namespace, versions.get(version_key(namespace))) for namespace in namespaces]
+    return 'response:{0}'.format(hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest())
+
+
+def cached_data(user, parts: tuple, namespaces: tuple, build):
+    """
+    Read-through cache of data
+    - keyed by the caller's role class, parts (what is read) and the current version of every namespace
+    - build() is only called on a miss
+    """
+    cache = response_cache()
+    namespaces = (ALL_NAMESPACES,) + tuple(namespaces)
+    versions = cache.get_many([version_key(namespace) for namespace in namespaces])
+    key = cache_key(user, list(parts), namespaces, versions)
+    data = cache.get(key)
+    count_lookup(namespaces, data is not None)
+    if data is None:
+        data = build()
+        cache.set(key, data)
+    return data
+
+
+async def acached_data(user, parts: tuple, namespaces: tuple, build):
+    """
+    cached_data() for async views: the cache is read with the async cache API and build() is awaited on a miss
+    """
+    cache = response_cache()
+    namespaces = (ALL_NAMESPACES,) + tuple(namespaces)
+    versions = await cache.aget_many([version_key(namespace) for namespace in namespaces])
+    key = cache_key(user, list(parts), namespaces, versions)
+    data = await cache.aget(key)
+    count_lookup(namespaces, data is not None)
+    if data is None:
+        data = await build()
+        await cache.aset(key, data)
+    return data
+
+
+def count_lookup(namespaces: tuple, hit: bool) -> None:
+    with _stats_lock:
+        for namespace in namespaces[1:]:
+            _stats['{0}:{1}'.format(namespace.split(':')[0], 'hits' if hit else 'misses')] += 1
+
+
+def cached_response_data(request, namespaces: tuple, build):
+    """
+    cached_data() of response data keyed by the request (URI and query parameters)
+    """
+    return cached_data(request.user, response_parts(request), namespaces, build)
+
+
+async def acached_response_data(request, namespaces: tuple, build):
+    """
+    cached_response_data() for async views (see acached_data())
+    """
+    return await acached_data(request.user, response_parts(request), namespaces, build)
+
+
+def response_parts(request) -> tuple:
+    return request.build_absolute_uri(), urlencode(sorted(request.query_params.lists()), doseq=True)
+
+
+def cached_list_data(view, request, namespaces: tuple, build):
+    """
+    cached_response_data() of a paginated list endpoint
+    - build() paginates through the view and returns the response data
+    - the paginator state (cursors, count) is cached with the data and restored on a hit
+    """
+    cached = cached_response_data(
+        request, namespaces, lambda: {'data': build(), 'pagination': view.paginator.get_state()})
+    view.paginator.set_state(cached['pagination'])
+    return cached['data']
+
+
+def cache_stats() -> dict:
+    """
+    Hit / miss counters of this process: {namespace: {'hits': int, 'misses': int}}
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    namespaces = sorted({key.rsplit(':', 1)[0] for key in stats})
+    return {
+        namespace: {
+            'hits': stats.get('{0}:hits'.format(namespace), 0),
+            'misses': stats.get('{0}:misses'.format(namespace), 0)
+        } for namespace in namespaces
+    }
+
+
+def reset_cache_stats() -> None:
+    with _stats_lock:
+        _stats.clear()
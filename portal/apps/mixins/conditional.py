@@ -0,0 +1,118 @@
+import hashlib
+from functools import wraps
+
+from django.db import transaction
+from django.db.models import CharField, Count, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Concat
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'PreconditionFailed: the resource has been modified (If-Match)'
+    default_code = 'precondition_failed'
+
+
+def rows_version(queryset, group_by: str) -> Subquery:
+    """
+    Version of a set of rows as 'count:max(id)'
+    - the rows are only ever inserted or deleted and ids only grow, so every change moves the version
+    """
+    return Subquery(
+        queryset.order_by().values(group_by).annotate(
+            version=Concat(Cast(Count('id'), CharField()), Value(':'), Cast(Max('id'), CharField()))
+        ).values('version'),
+        output_field=CharField()
+    )
+
+
+def related_version(queryset, field: str, outer: str = 'pk') -> Subquery:
+    """
+    rows_version() of related rows
+    - queryset: the related rows, field: their foreign key to the outer row, outer: the referenced outer column
+    """
+    return rows_version(queryset.filter(**{field: OuterRef(outer)}), field)
+
+
+def object_etag(request, model, pk, lock: bool = False, **versions):
+    """
+    Strong ETag of the detail response of one object (one query, None when the object does not exist)
+    - the object's modified timestamp and related versions (see related_version())
+    - the caller and the version of the caller's roles, the response shape and membership flags depend on both
+    - lock: SELECT ... FOR UPDATE of the object row (If-Match check and update in one transaction)
+    """
+    if not str(pk).isdigit():
+        return None
+    queryset = model.objects.filter(pk=pk)
+    if lock:
+        queryset = queryset.select_for_update(of=('self',))
+    roles = request.user.groups
+    versions['caller_roles_version'] = rows_version(
+        roles.through.objects.filter(**{roles.source_field_name: request.user.id}), roles.source_field_name)
+    row = queryset.annotate(**versions).values_list('modified', *versions.keys()).first()
+    if row is None:
+        return None
+    parts = [model._meta.label, pk, request.user.id] + list(row)
+    return '"{0}"'.format(hashlib.sha256('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()[:40])
+
+
+def etag_matches(header: str, etag: str, weak: bool) -> bool:
+    """
+    If-None-Match uses the weak comparison (W/ prefixes ignored), If-Match the strong comparison
+    """
+    if header.strip() == '*':
+        return True
+    for tag in parse_etags(header):
+        if tag.startswith('W/'):
+            if weak and tag[2:] == etag:
+                return True
+        elif tag == etag:
+            return True
+    return False
+
+
+def conditional_retrieve(method):
+    """
+    Conditional GET of a retrieve() that defines self.get_etag(request, pk)
+    - If-None-Match matching the current ETag: 304 without serializing
+    - successful responses carry the ETag
+    """
+
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        etag = self.get_etag(request, kwargs.get('pk'))
+        if etag is None:
+            return method(self, request, *args, **kwargs)
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH', None)
+        if request.method in ['GET', 'HEAD'] and if_none_match and etag_matches(if_none_match, etag, weak=True):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        response = method(self, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+        return response
+
+    return wrapper
+
+
+def conditional_update(method):
+    """
+    Lost-update protection of an update() that defines self.get_etag(request, pk, lock)
+    - If-Match not matching the current ETag: 412 before anything is written
+    - the object row stays locked until the update commits
+    """
+
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        if_match = request.META.get('HTTP_IF_MATCH', None)
+        if not if_match:
+            return method(self, request, *args, **kwargs)
+        with transaction.atomic():
+            etag = self.get_etag(request, kwargs.get('pk'), lock=True)
+            if etag is not None and not etag_matches(if_match, etag, weak=False):
+                raise PreconditionFailed()
+            return method(self, request, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,126 @@
+import logging
+import threading
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('identity_map', default=None)
+
+_fallbacks = Counter()
+_fallbacks_lock = threading.Lock()
+
+
+class IdentityMap:
+    """
+    Request scoped model instances by primary key for the ID-to-name template filters
+    - views load() the ids of the page context in bulk (one in_bulk per model)
+    - get() resolves from the map and only falls back to the database for ids that were not loaded
+    """
+
+    def __init__(self):
+        self.instances = {}
+        self.fallbacks = Counter()
+
+    def load(self, model, ids) -> None:
+        """
+        One in_bulk query for the ids of model not loaded yet (ids that do not exist are remembered as None)
+        """
+        loaded = self.instances.setdefault(model, {})
+        missing = {int(i) for i in ids if i is not None and str(i).isdigit()} - loaded.keys()
+        if missing:
+            found = model.objects.in_bulk(missing)
+            for pk in missing:
+                loaded[pk] = found.get(pk)
+
+    def add(self, *instances) -> None:
+        """
+        Seed the map with instances the view has already fetched
+        """
+        for instance in instances:
+            self.instances.setdefault(type(instance), {})[instance.pk] = instance
+
+    def get(self, model, pk):
+        """
+        Instance of model with pk (None if it does not exist)
+        """
+        pk = int(pk)
+        loaded = self.instances.setdefault(model, {})
+        if pk not in loaded:
+            label = model._meta.label
+            self.fallbacks[label] += 1
+            with _fallbacks_lock:
+                _fallbacks[label] += 1
+            logger.warning('identity map fallback: %s %s was not loaded by the view', label, pk)
+            loaded[pk] = model.objects.filter(pk=pk).first()
+        return loaded[pk]
+
+
+def identity_map() -> IdentityMap:
+    """
+    Identity map of the current request (a throwaway map outside of IdentityMapMiddleware)
+    """
+    current = _current.get()
+    return current if current is not None else IdentityMap()
+
+
+def load_ids(model, rows, *fields) -> None:
+    """
+    Load the ids found under fields of rows (dicts, None rows and fields are skipped) into the identity map
+    """
+    identity_map().load(model, [row.get(field) for row in rows if row for field in fields])
+
+
+def identity_fallbacks() -> dict:
+    """
+    Database fallbacks of this process: {model label: count}
+    """
+    with _fallbacks_lock:
+        return dict(_fallbacks)
+
+
+def reset_identity_fallbacks() -> None:
+    with _fallbacks_lock:
+        _fallbacks.clear()
+
+
+class IdentityMapMiddleware:
+    """
+    Bind a new identity map to every request
+    - sync and async capable so ASGI requests to async views are not moved to a thread by this middleware
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _current.set(IdentityMap())
+        try:
+            response = self.get_response(request)
+            self.log_fallbacks(request)
+            return response
+        finally:
+            _current.reset(token)
+
+    async def __acall__(self, request):
+        token = _current.set(IdentityMap())
+        try:
+            response = await self.get_response(request)
+            self.log_fallbacks(request)
+            return response
+        finally:
+            _current.reset(token)
+
+    @staticmethod
+    def log_fallbacks(request):
+        fallbacks = _current.get().fallbacks
+        if fallbacks:
+            logger.warning('identity map fallbacks on %s: %s', request.path, dict(fallbacks))
@@ -0,0 +1,55 @@
+import re
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import Value
+from django.db.models.functions import Replace
+
+# 'simple' does not stem or drop stop words: names and hostnames are matched as typed
+SEARCH_CONFIG = 'simple'
+
+
+def email_words(field: str):
+    """
+    user@example.org -> 'user example.org' so either part of an email can be searched
+    """
+    return Replace(field, Value('@'), Value(' '))
+
+
+def search_vector(*expressions) -> SearchVector:
+    """
+    tsvector over the given fields / expressions
+    - the same expression is used by search_index() so queries are answered from the GIN index
+    """
+    return SearchVector(*expressions, config=SEARCH_CONFIG)
+
+
+def search_index(name: str, *expressions) -> GinIndex:
+    """
+    GIN expression index matching search_vector(*expressions)
+    """
+    return GinIndex(search_vector(*expressions), name=name)
+
+
+def search_query(text: str):
+    """
+    Prefix query: every word of text must start a word of the document ('exp proj' -> 'exp:* & proj:*')
+    - returns None when text has no searchable words
+    """
+    words = re.findall(r'\w+', text or '')
+    if not words:
+        return None
+    return SearchQuery(' & '.join('{0}:*'.format(w) for w in words), config=SEARCH_CONFIG, search_type='raw')
+
+
+def search_filter(queryset, vector: SearchVector, text: str, rank: bool = False):
+    """
+    Filter queryset to rows whose vector matches text (optionally annotate rank)
+    """
+    query = search_query(text)
+    if query is None:
+        return queryset.none()
+    queryset = queryset.alias(search=vector).filter(search=query)
+    if rank:
+        queryset = queryset.annotate(rank=SearchRank(vector, query))
+    return queryset
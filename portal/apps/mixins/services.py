@@ -0,0 +1,41 @@
+from portal.server.drf_settings import AerpawPagination
+
+
+class Page:
+    """
+    One cursor page of list rows as returned by the app services to the API and the HTML views
+    - results: rows of the page
+    - count, count_is_approximate: total rows (planner estimate on large results)
+    - next_cursor, previous_cursor: cursors of the adjacent pages (None at either end)
+    """
+
+    def __init__(self, results: list, count: int = None, count_is_approximate: bool = False,
+                 next_cursor: str = None, previous_cursor: str = None):
+        self.results = results
+        self.count = count
+        self.count_is_approximate = count_is_approximate
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def __repr__(self) -> str:
+        return 'Page(results={0}, count={1}, next_cursor={2}, previous_cursor={3})'.format(
+            self.results, self.count, self.next_cursor, self.previous_cursor)
+
+
+def cursor_page(queryset, ordering: tuple, cursor: str = None, projection=None, count: str = 'approximate') -> Page:
+    """
+    Keyset page of queryset on ordering (see AerpawPagination)
+    - projection: Projection whose values() / rows() shape the page rows, model instances otherwise
+    - count: exact | approximate | None (no count query)
+    """
+    paginator = AerpawPagination()
+    if projection is not None:
+        queryset = projection.values(queryset)
+    results = paginator.paginate_cursor(queryset, ordering, cursor, paginator.page_size, count_mode=count)
+    if projection is not None:
+        results = projection.rows(results)
+    return Page(results, count=paginator.count, count_is_approximate=paginator.count_is_approximate,
+                next_cursor=paginator.next_cursor, previous_cursor=paginator.previous_cursor)
@@ -0,0 +1,201 @@
+import json
+import os
+import time
+from io import StringIO
+from uuid import uuid4
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from portal.apps.mixins.cache import response_cache
+from portal.apps.users.models import AerpawUser
+
+# wall-clock budgets are multiplied by this factor (slow CI runners can raise it)
+QUERY_BUDGET_TIME_FACTOR = float(os.getenv('QUERY_BUDGET_TIME_FACTOR', '1.0'))
+
+
+def create_user(username: str, *roles: str) -> AerpawUser:
+    """
+    Create a user with the given AERPAW role names
+    """
+    user = AerpawUser.objects.create_user(username=username, email=username, display_name=username)
+    if roles:
+        user.groups.add(*Group.objects.filter(name__in=roles))
+    return user
+
+
+def audit_fields(user: AerpawUser) -> dict:
+    """
+    created_by / modified_by values for AuditModelMixin models
+    """
+    return {'created_by': user, 'modified_by': user, 'uuid': str(uuid4())}
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    Endpoint performance tests
+    - every request is run through the DRF test client with a query count and wall-clock budget
+    - assertNoNPlusOne() fails when the query count of an endpoint grows with the seeded data
+    - per-endpoint timings are printed as a table when the test class finishes
+    - the response cache is cleared before every test (the database is rolled back, the cache is not)
+    """
+    fixtures = ['aerpaw_roles']
+    timings = None
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.timings = []
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.timings:
+            print(cls.format_timings())
+        super().tearDownClass()
+
+    @classmethod
+    def format_timings(cls) -> str:
+        header = ('endpoint', 'queries', 'budget', 'ms', 'budget ms')
+        rows = [header] + [
+            (t['endpoint'], str(t['queries']), str(t['max_queries']), '{0:.1f}'.format(t['ms']),
+             '{0:.0f}'.format(t['max_ms']))
+            for t in cls.timings
+        ]
+        widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+        lines = ['', cls.__name__]
+        for i, row in enumerate(rows):
+            lines.append('  '.join(
+                col.ljust(widths[j]) if j == 0 else col.rjust(widths[j]) for j, col in enumerate(row)))
+            if i == 0:
+                lines.append('  '.join('-' * w for w in widths))
+        return '\n'.join(lines)
+
+    def setUp(self):
+        super().setUp()
+        response_cache().clear()
+
+    def api_client(self, user: AerpawUser) -> APIClient:
+        client = APIClient()
+        client.force_authenticate(user=AerpawUser.objects.get(pk=user.id))
+        return client
+
+    def measure(self, user: AerpawUser, method: str, path: str, data: dict = None):
+        """
+        Run one request as user and return (response, query count, elapsed ms)
+        """
+        client = self.api_client(user)
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            response = getattr(client, method.lower())(path, data=data, format='json')
+            elapsed_ms = (time.perf_counter() - start) * 1000
+        return response, len(ctx.captured_queries), elapsed_ms
+
+    def assertQueryBudget(self, user: AerpawUser, method: str, path: str, max_queries: int, max_ms: float,
+                          data: dict = None, status_code: int = 200):
+        """
+        Request must succeed within max_queries and max_ms
+        """
+        response, queries, elapsed_ms = self.measure(user, method, path, data)
+        max_ms = max_ms * QUERY_BUDGET_TIME_FACTOR
+        self.timings.append({
+            'endpoint': '{0} {1}'.format(method.upper(), path), 'queries': queries, 'max_queries': max_queries,
+            'ms': elapsed_ms, 'max_ms': max_ms
+        })
+        self.assertEqual(response.status_code, status_code, response.data)
+        self.assertLessEqual(queries, max_queries, '{0} {1}: {2} queries'.format(method.upper(), path, queries))
+        self.assertLessEqual(elapsed_ms, max_ms, '{0} {1}: {2:.1f} ms'.format(method.upper(), path, elapsed_ms))
+        return response
+
+    def assertPageBudget(self, user: AerpawUser, path: str, max_queries: int, max_ms: float, data: dict = None):
+        """
+        HTML page (session login, GET or POST of form data) must render within max_queries and max_ms
+        """
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            response = self.client.post(path, data) if data is not None else self.client.get(path)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+        queries = len(ctx.captured_queries)
+        max_ms = max_ms * QUERY_BUDGET_TIME_FACTOR
+        self.timings.append({
+            'endpoint': '{0} {1}'.format('POST' if data is not None else 'GET', path), 'queries': queries,
+            'max_queries': max_queries, 'ms': elapsed_ms, 'max_ms': max_ms
+        })
+        self.assertIn(response.status_code, [200, 302], path)
+        self.assertLessEqual(queries, max_queries, '{0}: {1} queries'.format(path, queries))
+        self.assertLessEqual(elapsed_ms, max_ms, '{0}: {1:.1f} ms'.format(path, elapsed_ms))
+        return response
+
+    def assertNoNPlusOne(self, user: AerpawUser, path: str, grow):
+        """
+        GET path, call grow() to add related rows, GET path again: the query count must not change
+        - both requests are answered without the response cache
+        """
+        response_cache().clear()
+        before = self.measure(user, 'get', path)[1]
+        grow()
+        response_cache().clear()
+        after = self.measure(user, 'get', path)[1]
+        self.assertEqual(before, after, 'GET {0}: {1} queries grew to {2}'.format(path, before, after))
+
+
+class IndexScanTestCase(TestCase):
+    """
+    EXPLAIN tests on a seeded dataset (seed_load_data at reduced volume)
+    - assertIndexScan() fails unless the planner reads the queryset through the named index
+    """
+    fixtures = ['aerpaw_roles']
+    seed_options = {'users': 2000, 'projects': 400, 'experiments': 4000, 'resources': 50, 'sessions': 0}
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_load_data', *['--{0}={1}'.format(k, v) for k, v in cls.seed_options.items()],
+                     stdout=StringIO())
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertIndexScan(self, queryset, index_name: str):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, plan)
+        self.assertNotIn('Seq Scan on {0}'.format(queryset.model._meta.db_table), plan, plan)
+
+
+class AsyncReadPathTestCase(TransactionTestCase):
+    """
+    Async endpoints (/api/async, see portal.apps.mixins.async_views) against their synchronous DRF counterparts
+    - TransactionTestCase: the concurrent queries of an async view run on connections of their own, which only see
+      committed rows (the rows are flushed after each test)
+    - connections are closed at the end of every request as under ASGI (POSTGRES_CONN_MODE=request)
+    - both paths authenticate with the same JWT bearer token
+    """
+    fixtures = ['aerpaw_roles']
+
+    def setUp(self):
+        response_cache().clear()
+        db = connections.settings['default']
+        self.addCleanup(db.__setitem__, 'CONN_MAX_AGE', db['CONN_MAX_AGE'])
+        db['CONN_MAX_AGE'] = 0
+
+    def get(self, user: AerpawUser, path: str, asynchronous: bool):
+        headers = {'Authorization': 'Bearer {0}'.format(AccessToken.for_user(user))}
+        if asynchronous:
+            return async_to_sync(self.async_client.get)(path, headers=headers)
+        return self.client.get(path, headers=headers)
+
+    def assertSameResponse(self, user: AerpawUser, path: str, async_path: str, status_code: int = 200):
+        """
+        GET async_path returns the status and data of GET path (links to /api/async/ read as links to /api/)
+        """
+        response = self.get(user, path, asynchronous=False)
+        async_response = self.get(user, async_path, asynchronous=True)
+        self.assertEqual(response.status_code, status_code, response.content)
+        self.assertEqual(async_response.status_code, status_code, async_response.content)
+        async_data = json.loads(async_response.content.decode('utf-8').replace('/api/async/', '/api/'))
+        self.assertEqual(async_data, response.json())
+        return async_data
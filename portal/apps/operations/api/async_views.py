@@ -0,0 +1,20 @@
+from rest_framework.exceptions import PermissionDenied
+
+from portal.apps.mixins.async_views import async_api_view, gather
+from portal.apps.operations.models import get_current_canonical_number
+
+
+@async_api_view
+async def canonical_number_current(request):
+    """
+    GET: current (read only: site admins set it on /p-canonical-experiment-number/current)
+    - current_canonical_number  - int (null when every canonical number is in use)
+
+    Permission:
+    - user is_active
+    """
+    if not request.user.is_active:
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to GET /canonical-number/current")
+    current, = await gather(get_current_canonical_number)
+    return {'current_canonical_number': current}
@@ -1,5 +1,10 @@
+from datetime import timezone
+
+from django.db.models import IntegerField
+from django.db.models.functions import Cast, Extract, Round
 from rest_framework import serializers
 
+from portal.apps.mixins.projection import Projection
 from portal.apps.operations.models import CanonicalNumber
 
 
@@ -20,3 +25,11 @@ class CanonicalNumberSerializerDetail(serializers.ModelSerializer):
         model = CanonicalNumber
         fields = ['canonical_number', 'canonical_number_id', 'created_date', 'is_deleted',
                   'is_retired', 'modified_date', 'timestamp']
+
+
+# list endpoint projection: response field -> model field (values() rows are the response rows)
+# - timestamp is CanonicalNumber.timestamp() computed in SQL (epoch seconds of created, extracted in UTC)
+CANONICAL_NUMBER_LIST_PROJECTION = Projection(
+    fields={'canonical_number': 'canonical_number', 'canonical_number_id': 'id',
+            'timestamp': Cast(Round(Extract('created', 'epoch', tzinfo=timezone.utc)), output_field=IntegerField())}
+)
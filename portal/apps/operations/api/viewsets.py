@@ -1,13 +1,19 @@
+from django.db import connections
 from django.shortcuts import get_object_or_404
 from rest_framework import permissions
 from rest_framework.decorators import action
-from rest_framework.exceptions import MethodNotAllowed, PermissionDenied
+from rest_framework.exceptions import MethodNotAllowed, PermissionDenied, ValidationError
 from rest_framework.mixins import ListModelMixin, RetrieveModelMixin, UpdateModelMixin
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
-from portal.apps.operations.api.serializers import CanonicalNumberSerializerDetail, CanonicalNumberSerializerList
+from portal.apps.mixins.cache import cache_stats, cached_list_data, response_cache
+from portal.apps.operations.api.serializers import CANONICAL_NUMBER_LIST_PROJECTION, CanonicalNumberSerializerDetail
 from portal.apps.operations.models import CanonicalNumber, get_current_canonical_number, set_current_canonical_number
+from portal.apps.operations.signals import CANONICAL_NUMBERS_CACHE_NAMESPACE
+from portal.apps.users.authentication import token_cache_stats
+from portal.apps.users.jwks import jwks_stats
+from portal.server.postgresql.base import connection_stats
 
 
 class CanonicalNumberViewSet(GenericViewSet, RetrieveModelMixin, ListModelMixin, UpdateModelMixin):
@@ -18,6 +24,7 @@ class CanonicalNumberViewSet(GenericViewSet, RetrieveModelMixin, ListModelMixin,
     - current
     """
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = ('-created', '-id')
     queryset = CanonicalNumber.objects.all().order_by('-created')
     serializer_class = CanonicalNumberSerializerDetail
 
@@ -40,25 +47,16 @@ class CanonicalNumberViewSet(GenericViewSet, RetrieveModelMixin, ListModelMixin,
         - user is_operator
         """
         if request.user.is_operator():
-            page = self.paginate_queryset(self.get_queryset())
-            if page:
-                serializer = CanonicalNumberSerializerList(page, many=True)
-            else:
-                serializer = CanonicalNumberSerializerList(self.get_queryset(), many=True)
-            response_data = []
-            for u in serializer.data:
-                du = dict(u)
-                response_data.append(
-                    {
-                        'canonical_number': du.get('canonical_number'),
-                        'canonical_number_id': du.get('canonical_number_id'),
-                        'timestamp': du.get('timestamp')
-                    }
-                )
-            if page:
-                return self.get_paginated_response(response_data)
-            else:
-                return Response(response_data)
+            def build():
+                queryset = CANONICAL_NUMBER_LIST_PROJECTION.values(self.get_queryset())
+                page = self.paginate_queryset(queryset)
+                response_data = CANONICAL_NUMBER_LIST_PROJECTION.rows(page if page is not None else queryset)
+                if page is not None:
+                    return self.get_paginated_response(response_data).data
+                else:
+                    return response_data
+
+            return Response(cached_list_data(self, request, (CANONICAL_NUMBERS_CACHE_NAMESPACE,), build))
         else:
             raise PermissionDenied(
                 detail="PermissionDenied: unable to GET /canonical-number list")
@@ -123,7 +121,7 @@ class CanonicalNumberViewSet(GenericViewSet, RetrieveModelMixin, ListModelMixin,
     def current(self, request, *args, **kwargs):
         """
         GET: current
-        - current_canonical_number  - int
+        - current_canonical_number  - int (null when every canonical number is in use)
 
         Permission:
         - user is_active
@@ -131,15 +129,101 @@ class CanonicalNumberViewSet(GenericViewSet, RetrieveModelMixin, ListModelMixin,
         new_number = self.request.query_params.get('number', None)
         if new_number:
             if request.user.is_site_admin():
-                set_current_canonical_number(new_number)
-                response_data = {'current_canonical_number': int(get_current_canonical_number())}
+                try:
+                    response_data = {'current_canonical_number': set_current_canonical_number(new_number)}
+                except ValueError as exc:
+                    raise ValidationError(
+                        detail="ValidationError: {0}".format(exc))
                 return Response(response_data)
             else:
                 raise PermissionDenied(
                     detail="PermissionDenied: unable to PUT/PATCH /canonical-number")
         if request.user.is_active:
-            response_data = {'current_canonical_number': int(get_current_canonical_number())}
+            response_data = {'current_canonical_number': get_current_canonical_number()}
             return Response(response_data)
         else:
             raise PermissionDenied(
                 detail="PermissionDenied: unable to GET /canonical-number/current")
+
+
+class ResponseCacheViewSet(GenericViewSet):
+    """
+    Response cache
+    - hit / miss counters
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request, *args, **kwargs):
+        """
+        GET: response cache hit / miss counters of the serving process
+        - backend                - string
+        - namespaces             - {namespace: {hits: int, misses: int}}
+
+        Permission:
+        - user is_operator
+        """
+        if request.user.is_operator():
+            response_data = {
+                'backend': response_cache().__class__.__name__,
+                'namespaces': cache_stats()
+            }
+            return Response(response_data)
+        else:
+            raise PermissionDenied(
+                detail="PermissionDenied: unable to GET /response-cache")
+
+
+class DatabaseConnectionViewSet(GenericViewSet):
+    """
+    Database connections
+    - checkout / connect counters and pool state
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request, *args, **kwargs):
+        """
+        GET: database connection counters of the serving process
+        - conn_max_age           - int (seconds, 0: a new connection per request)
+        - connections            - {alias: {checkouts, reuses, connects, connect_ms, connect_ms_max, closes}}
+        - pool                   - {requests_num, requests_waiting, requests_wait_ms, pool_size, ...} (pool mode)
+
+        Permission:
+        - user is_operator
+        """
+        if request.user.is_operator():
+            response_data = {
+                'conn_max_age': connections['default'].settings_dict.get('CONN_MAX_AGE'),
+                'connections': connection_stats(),
+                'pool': connections['default'].pool_stats()
+            }
+            return Response(response_data)
+        else:
+            raise PermissionDenied(
+                detail="PermissionDenied: unable to GET /db-connections")
+
+
+class TokenCacheViewSet(GenericViewSet):
+    """
+    Verified OIDC token cache and JWKS store
+    - upstream calls made / saved
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request, *args, **kwargs):
+        """
+        GET: verified-token cache counters of the serving process
+        - coalesced              - int (requests that waited for a concurrent userinfo call)
+        - hits                   - int (verified tokens answered from the cache)
+        - jwks                   - dict (JWKS store: fetches, hits, unknown_kid, shared_hits, coalesced, rotations)
+        - negative_hits          - int (rejected tokens answered from the cache)
+        - saved                  - int (upstream calls saved)
+        - upstream_calls         - int (userinfo calls made)
+
+        Permission:
+        - user is_operator
+        """
+        if request.user.is_operator():
+            return Response(dict(token_cache_stats(), jwks=jwks_stats()))
+        else:
+            raise PermissionDenied(
+                detail="PermissionDenied: unable to GET /token-cache")
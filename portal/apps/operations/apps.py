@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class OperationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'portal.apps.operations'
+
+    def ready(self):
+        # response cache invalidation
+        from portal.apps.operations import signals  # noqa: F401
@@ -0,0 +1,232 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.util import setup_testing_defaults
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from portal.apps.experiments.models import AerpawExperiment
+from portal.apps.experiments.services import experiment_queryset
+from portal.apps.operations.management.commands.loadtest_api import close_worker_connections, \
+    configure_connections, percentile
+from portal.apps.users.models import AerpawUser
+from portal.server.postgresql.base import connection_stats, reset_connection_stats
+
+# endpoint: (synchronous DRF path, async path) returning the same data
+ENDPOINTS = {
+    'experiments': ('/api/experiments?pagination=cursor&count=approximate',
+                    '/api/async/experiments?count=approximate'),
+    'experiment': ('/api/experiments/{experiment_id}', '/api/async/experiments/{experiment_id}'),
+    'resources': ('/api/resources?pagination=cursor&count=approximate', '/api/async/resources?count=approximate'),
+    'canonical-number': ('/api/p-canonical-experiment-number/current',
+                         '/api/async/p-canonical-experiment-number/current'),
+}
+
+
+def wsgi_get(application, path: str, token: str) -> int:
+    """
+    Status of GET path through the WSGI application
+    """
+    path, _, query = path.partition('?')
+    environ = {}
+    setup_testing_defaults(environ)
+    environ.update({'PATH_INFO': path, 'QUERY_STRING': query, 'HTTP_AUTHORIZATION': 'Bearer {0}'.format(token)})
+    status = []
+    response = application(environ, lambda s, headers, exc_info=None: status.append(s))
+    try:
+        for _ in response:
+            pass
+    finally:
+        response.close()
+    return int(status[0].split()[0])
+
+
+async def asgi_get(application, path: str, token: str) -> int:
+    """
+    Status of GET path through the ASGI application
+    """
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode('utf-8'), 'query_string': query.encode('utf-8'), 'root_path': '',
+        'headers': [(b'host', b'127.0.0.1'), (b'authorization', 'Bearer {0}'.format(token).encode('utf-8'))],
+        'client': ('127.0.0.1', 0), 'server': ('127.0.0.1', 80)
+    }
+    status = []
+    received = False
+
+    async def receive():
+        nonlocal received
+        if received:
+            # no disconnect: the handler cancels this wait once the response is sent
+            await asyncio.Future()
+        received = True
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+class Command(BaseCommand):
+    """
+    In-process benchmark of the async read path (/api/async) against the synchronous DRF endpoints
+    - sync: --clients threads send their requests to the WSGI application on a pool of --workers threads
+      (a threaded app server)
+    - async: --clients coroutines send their requests to the ASGI application on one event loop, the concurrent
+      queries of the async views run on a pool of --workers threads
+    - each client sends --requests requests (after --warmup unmeasured requests) with a JWT bearer token,
+      req/s, p50 / p95 / p99 latency and database connects are reported per endpoint and path
+    - there is no network hop on either path: the numbers compare the request handling of both stacks
+    - every request has a unique query string so the read-through response cache is bypassed (unless --cached)
+    - reads the existing data: seed it first with seed_load_data
+    """
+    help = 'Compare req/s and tail latency of the async read path with the synchronous API endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', action='append', choices=list(ENDPOINTS),
+                            help='endpoint (repeatable, default: all)')
+        parser.add_argument('--mode', choices=['request', 'persistent'], default='request',
+                            help='connection mode of both paths (default: request, as under ASGI)')
+        parser.add_argument('--clients', type=int, default=50, help='concurrent clients (default: 50)')
+        parser.add_argument('--requests', type=int, default=20, help='requests per client (default: 20)')
+        parser.add_argument('--warmup', type=int, default=1, help='unmeasured requests per client (default: 1)')
+        parser.add_argument('--workers', type=int, default=16, help='worker threads (default: 16)')
+        parser.add_argument('--username', help='user of the bearer token (default: creator of the first experiment)')
+        parser.add_argument('--cached', action='store_true', help='allow response cache hits')
+
+    def handle(self, *args, **options):
+        users = AerpawUser.objects.filter(is_active=True).order_by('id')
+        if options['username']:
+            user = users.filter(username=options['username']).first()
+        else:
+            experiment = AerpawExperiment.objects.select_related('experiment_creator').order_by('id').first()
+            user = experiment.experiment_creator if experiment else users.first()
+        if user is None:
+            raise CommandError("no user to benchmark with: run 'manage.py seed_load_data' first")
+        experiment_id = experiment_queryset(user).values_list('id', flat=True).first()
+        endpoints = options['endpoint'] or list(ENDPOINTS)
+        if 'experiment' in endpoints and experiment_id is None:
+            raise CommandError('--endpoint=experiment: {0} cannot view any experiment'.format(user.username))
+        self.token = str(AccessToken.for_user(user))
+        self.options = options
+        configure_connections(options['mode'])
+        results = []
+        for endpoint in endpoints:
+            sync_path, async_path = [path.format(experiment_id=experiment_id) for path in ENDPOINTS[endpoint]]
+            results.append((endpoint, 'sync') + self.run_sync(sync_path))
+            results.append((endpoint, 'async') + self.run_async(async_path))
+        self.report(results)
+
+    def paths(self, path: str):
+        """
+        path with a unique query string per request (unless --cached)
+        """
+        sequence = iter(range(10 ** 9))
+        separator = '&' if '?' in path else '?'
+        while True:
+            yield path if self.options['cached'] else '{0}{1}_bm={2}'.format(path, separator, next(sequence))
+
+    def run_sync(self, path: str) -> tuple:
+        application = WSGIHandler()
+        executor = ThreadPoolExecutor(max_workers=self.options['workers'], thread_name_prefix='benchmark-worker')
+        paths = self.paths(path)
+        latencies, errors = [], []
+        lock = threading.Lock()
+        barrier = threading.Barrier(self.options['clients'] + 1)
+
+        def get() -> tuple:
+            with lock:
+                next_path = next(paths)
+            start = time.perf_counter()
+            try:
+                status = executor.submit(wsgi_get, application, next_path, self.token).result()
+            except Exception as exc:
+                status = str(exc)
+            return (time.perf_counter() - start) * 1000, status
+
+        def client_loop():
+            for _ in range(self.options['warmup']):
+                get()
+            barrier.wait()
+            for _ in range(self.options['requests']):
+                elapsed_ms, status = get()
+                with lock:
+                    latencies.append(elapsed_ms)
+                    if status != 200:
+                        errors.append(status)
+
+        clients = [threading.Thread(target=client_loop) for _ in range(self.options['clients'])]
+        for client in clients:
+            client.start()
+        barrier.wait()
+        reset_connection_stats()
+        start = time.perf_counter()
+        for client in clients:
+            client.join()
+        seconds = time.perf_counter() - start
+        stats = connection_stats().get('default', {})
+        close_worker_connections(executor, self.options['workers'])
+        return self.result(path, latencies, errors, seconds, stats)
+
+    def run_async(self, path: str) -> tuple:
+        return asyncio.run(self.run_async_clients(path))
+
+    async def run_async_clients(self, path: str) -> tuple:
+        application = ASGIHandler()
+        executor = ThreadPoolExecutor(max_workers=self.options['workers'], thread_name_prefix='benchmark-worker')
+        asyncio.get_running_loop().set_default_executor(executor)
+        paths = self.paths(path)
+        latencies, errors = [], []
+
+        async def get() -> tuple:
+            start = time.perf_counter()
+            try:
+                status = await asgi_get(application, next(paths), self.token)
+            except Exception as exc:
+                status = str(exc)
+            return (time.perf_counter() - start) * 1000, status
+
+        async def warmup():
+            for _ in range(self.options['warmup']):
+                await get()
+
+        async def client_loop():
+            for _ in range(self.options['requests']):
+                elapsed_ms, status = await get()
+                latencies.append(elapsed_ms)
+                if status != 200:
+                    errors.append(status)
+
+        await asyncio.gather(*[warmup() for _ in range(self.options['clients'])])
+        reset_connection_stats()
+        start = time.perf_counter()
+        await asyncio.gather(*[client_loop() for _ in range(self.options['clients'])])
+        seconds = time.perf_counter() - start
+        stats = connection_stats().get('default', {})
+        close_worker_connections(executor, self.options['workers'])
+        return self.result(path, latencies, errors, seconds, stats)
+
+    def result(self, path: str, latencies: list, errors: list, seconds: float, stats: dict) -> tuple:
+        if errors:
+            self.stderr.write('{0}: {1} errors, first: {2}'.format(path, len(errors), errors[0]))
+        return sorted(latencies), len(errors), seconds, stats
+
+    def report(self, results: list):
+        self.stdout.write('{0} x {1} requests per endpoint ({2} worker threads, {3} connections)'.format(
+            self.options['clients'], self.options['requests'], self.options['workers'], self.options['mode']))
+        self.stdout.write('{0:<17}  {1:<5}  {2:>8}  {3:>6}  {4:>8}  {5:>8}  {6:>8}  {7:>8}  {8:>8}'.format(
+            'endpoint', 'path', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'connects'))
+        for endpoint, stack, latencies, errors, seconds, stats in results:
+            self.stdout.write('{0:<17}  {1:<5}  {2:>8}  {3:>6}  {4:>8.0f}  {5:>8.1f}  {6:>8.1f}  {7:>8.1f}  '
+                              '{8:>8}'.format(
+                                  endpoint, stack, len(latencies), errors, len(latencies) / seconds if seconds else 0,
+                                  percentile(latencies, 50), percentile(latencies, 95), percentile(latencies, 99),
+                                  stats.get('connects', 0)))
@@ -0,0 +1,149 @@
+import time
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import BooleanField, Value
+
+from portal.apps.experiments.api.serializers import CANONICAL_EXPERIMENT_RESOURCE_LIST_PROJECTION, \
+    CanonicalExperimentResourceSerializer, EXPERIMENT_LIST_PROJECTION, EXPERIMENT_SESSION_LIST_PROJECTION, \
+    ExperimentSerializerList, ExperimentSessionSerializer, USER_EXPERIMENT_LIST_PROJECTION, UserExperimentSerializer
+from portal.apps.experiments.models import AerpawExperiment, CanonicalExperimentResource, ExperimentSession, \
+    UserExperiment
+from portal.apps.operations.api.serializers import CANONICAL_NUMBER_LIST_PROJECTION, CanonicalNumberSerializerList
+from portal.apps.operations.models import CanonicalNumber
+from portal.apps.projects.api.serializers import PROJECT_LIST_PROJECTION, ProjectSerializerList, \
+    USER_PROJECT_LIST_PROJECTION, UserProjectSerializer
+from portal.apps.projects.models import AerpawProject, UserProject
+from portal.apps.resources.api.serializers import RESOURCE_LIST_PROJECTION, ResourceSerializerList
+from portal.apps.resources.models import AerpawResource
+from portal.apps.users.api.serializers import USER_LIST_PROJECTION, UserSerializerList
+from portal.apps.users.models import AerpawUser
+
+
+def flags(*names) -> dict:
+    # membership flags are per-user columns of the list query: constant here, the cost is the same
+    return {name: Value(False, output_field=BooleanField()) for name in names}
+
+
+# endpoint: (queryset, ModelSerializer of the previous list path, projection of the current list path)
+BENCHMARKS = {
+    'experiments': (
+        lambda: AerpawExperiment.objects.filter(is_deleted=False).annotate(
+            **flags('is_experiment_creator', 'is_experiment_member')).order_by('name', 'id'),
+        ExperimentSerializerList, EXPERIMENT_LIST_PROJECTION),
+    'projects': (
+        lambda: AerpawProject.objects.filter(is_deleted=False).annotate(
+            **flags('is_project_creator', 'is_project_member', 'is_project_owner')).order_by('name', 'id'),
+        ProjectSerializerList, PROJECT_LIST_PROJECTION),
+    'resources': (
+        lambda: AerpawResource.objects.filter(is_deleted=False).order_by('name', 'id'),
+        ResourceSerializerList, RESOURCE_LIST_PROJECTION),
+    'users': (
+        lambda: AerpawUser.objects.order_by('display_name', 'id'),
+        UserSerializerList, USER_LIST_PROJECTION),
+    'sessions': (
+        lambda: ExperimentSession.objects.order_by('-created', '-id'),
+        ExperimentSessionSerializer, EXPERIMENT_SESSION_LIST_PROJECTION),
+    'canonical-experiment-resource': (
+        lambda: CanonicalExperimentResource.objects.order_by('created', 'id'),
+        CanonicalExperimentResourceSerializer, CANONICAL_EXPERIMENT_RESOURCE_LIST_PROJECTION),
+    'user-experiment': (
+        lambda: UserExperiment.objects.order_by('-granted_date', '-id'),
+        UserExperimentSerializer, USER_EXPERIMENT_LIST_PROJECTION),
+    'user-project': (
+        lambda: UserProject.objects.order_by('-granted_date', '-id'),
+        UserProjectSerializer, USER_PROJECT_LIST_PROJECTION),
+    'canonical-number': (
+        lambda: CanonicalNumber.objects.filter(is_deleted=False).order_by('-created', '-id'),
+        CanonicalNumberSerializerList, CANONICAL_NUMBER_LIST_PROJECTION),
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    Micro-benchmark of the list endpoint serialization paths
+    - serializer: model instances -> ModelSerializer -> response dict copy (previous list path)
+    - projection: values() projection rows emitted as the response (current list path)
+    - both paths must produce identical rows, the command fails otherwise
+    - by default the dataset is seeded with seed_load_data and rolled back when the benchmark ends
+    """
+    help = 'Compare rows/sec of the serializer and projection paths of the list endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='rows per list (default: 10000)')
+        parser.add_argument('--repeat', type=int, default=3, help='best of N runs (default: 3)')
+        parser.add_argument('--endpoint', action='append', choices=sorted(BENCHMARKS.keys()),
+                            help='endpoint to benchmark (repeatable, default: all)')
+        parser.add_argument('--no-seed', action='store_true', help='benchmark the existing data')
+
+    def handle(self, *args, **options):
+        self.rows = options['rows']
+        self.repeat = options['repeat']
+        endpoints = options['endpoint'] or sorted(BENCHMARKS.keys())
+        if options['no_seed']:
+            results = [self.benchmark(endpoint) for endpoint in endpoints]
+        else:
+            results = []
+            try:
+                with transaction.atomic():
+                    call_command(
+                        'seed_load_data', '--prefix=benchmark', '--users={0}'.format(self.rows),
+                        '--projects={0}'.format(self.rows), '--experiments={0}'.format(self.rows),
+                        '--resources={0}'.format(self.rows), '--sessions={0}'.format(self.rows),
+                        stdout=StringIO())
+                    results = [self.benchmark(endpoint) for endpoint in endpoints]
+                    raise Rollback()
+            except Rollback:
+                pass
+        self.report(results)
+
+    def benchmark(self, endpoint: str) -> tuple:
+        queryset, serializer_class, projection = BENCHMARKS[endpoint]
+        serializer_seconds, serializer_rows = self.best(lambda: self.serializer_rows(
+            queryset()[:self.rows], serializer_class, projection))
+        projection_seconds, projection_rows = self.best(lambda: projection.rows(
+            projection.values(queryset())[:self.rows]))
+        if serializer_rows != projection_rows:
+            raise CommandError('{0}: projection rows differ from serializer rows'.format(endpoint))
+        return endpoint, len(projection_rows), serializer_seconds, projection_seconds
+
+    def best(self, run) -> tuple:
+        timings = []
+        rows = None
+        for _ in range(max(self.repeat, 1)):
+            start = time.perf_counter()
+            rows = run()
+            timings.append(time.perf_counter() - start)
+        return min(timings), rows
+
+    @staticmethod
+    def serializer_rows(queryset, serializer_class, projection) -> list:
+        """
+        The previous list path: serialize instances, then copy each row into the hand-built response dict
+        """
+        instances = list(queryset)
+        rows = []
+        for instance, data in zip(instances, serializer_class(instances, many=True).data):
+            du = dict(data)
+            row = {name: du.get(name) for name in projection.fields if name in du}
+            for name, keys in projection.nested.items():
+                row[name] = {key: getattr(instance, key) for key in keys}
+            rows.append(row)
+        return rows
+
+    def report(self, results: list):
+        width = max([len(endpoint) for endpoint, _, _, _ in results] + [len('endpoint')])
+        self.stdout.write('{0}  {1:>6}  {2:>14}  {3:>14}  {4:>7}'.format(
+            'endpoint'.ljust(width), 'rows', 'serializer r/s', 'projection r/s', 'speedup'))
+        for endpoint, rows, serializer_seconds, projection_seconds in results:
+            self.stdout.write('{0}  {1:>6}  {2:>14.0f}  {3:>14.0f}  {4:>6.1f}x'.format(
+                endpoint.ljust(width), rows,
+                rows / serializer_seconds if serializer_seconds else 0,
+                rows / projection_seconds if projection_seconds else 0,
+                serializer_seconds / projection_seconds if projection_seconds else 0))
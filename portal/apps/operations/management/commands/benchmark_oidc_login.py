@@ -0,0 +1,243 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from mozilla_django_oidc.auth import OIDCAuthenticationBackend
+
+from portal.apps.operations.management.commands.loadtest_api import percentile
+from portal.apps.profiles.models import AerpawUserProfile
+from portal.apps.users.jwks import JWKS_CACHE_ALIAS, jwks_stats, jwks_store, reset_jwks_stats, reset_jwks_stores
+from portal.apps.users.models import AerpawUser
+from portal.apps.users.oidc_users import MyOIDCAB
+
+# usernames of the users created by the login storm (deleted at the end of the benchmark)
+STORM_USER_PREFIX = 'oidc-storm-'
+
+
+class MockOIDCProvider(ThreadingHTTPServer):
+    """
+    Local OIDC provider on 127.0.0.1: discovery, JWKS, token and userinfo endpoints
+    - the authorization code is the user's email: the token endpoint returns an RS256 ID token for it (with the
+      nonce given to code()) and an access token the userinfo endpoint answers with the user's claims
+    - every response is delayed by latency seconds (the network round trip to the provider)
+    - rotate(): sign with a new key (kid), the JWKS document lists both keys
+    - calls: requests per endpoint
+    """
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, latency: float = 0.02):
+        super().__init__(('127.0.0.1', 0), MockOIDCHandler)
+        self.latency = latency
+        self.calls = {'discovery': 0, 'jwks': 0, 'token': 0, 'userinfo': 0}
+        self.calls_lock = threading.Lock()
+        self.nonces = {}
+        self.keys = []
+        self.rotate()
+
+    @property
+    def url(self) -> str:
+        return 'http://127.0.0.1:{0}'.format(self.server_address[1])
+
+    def settings(self) -> dict:
+        """
+        OIDC settings of the RP against this provider
+        """
+        return {
+            'OIDC_OP_DISCOVERY_ENDPOINT': None,
+            'OIDC_OP_JWKS_ENDPOINT': self.url + '/certs',
+            'OIDC_OP_TOKEN_ENDPOINT': self.url + '/token',
+            'OIDC_OP_USER_ENDPOINT': self.url + '/userinfo',
+            'OIDC_RP_SIGN_ALGO': 'RS256',
+            'OIDC_RP_CLIENT_ID': 'portal',
+        }
+
+    def rotate(self) -> str:
+        kid = 'key-{0}'.format(len(self.keys) + 1)
+        self.keys.append((kid, rsa.generate_private_key(public_exponent=65537, key_size=2048)))
+        return kid
+
+    def jwks(self) -> dict:
+        keys = []
+        for kid, private_key in self.keys:
+            jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+            keys.append(dict(jwk, kid=kid, alg='RS256', use='sig'))
+        return {'keys': keys}
+
+    def code(self, email: str, nonce: str) -> str:
+        self.nonces[email] = nonce
+        return email
+
+    def id_token(self, email: str) -> str:
+        kid, private_key = self.keys[-1]
+        now = int(time.time())
+        claims = {'iss': self.url, 'sub': email, 'aud': 'portal', 'email': email, 'iat': now, 'exp': now + 300,
+                  'nonce': self.nonces.get(email)}
+        return jwt.encode(claims, private_key, algorithm='RS256', headers={'kid': kid})
+
+    def count(self, endpoint: str) -> None:
+        with self.calls_lock:
+            self.calls[endpoint] += 1
+
+    def serve(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class MockOIDCHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        provider = self.server
+        time.sleep(provider.latency)
+        if self.path == '/.well-known/openid-configuration':
+            provider.count('discovery')
+            self.reply(200, {'issuer': provider.url, 'jwks_uri': provider.url + '/certs'})
+        elif self.path == '/certs':
+            provider.count('jwks')
+            self.reply(200, provider.jwks())
+        elif self.path == '/userinfo':
+            provider.count('userinfo')
+            email = self.headers.get('Authorization', '').split(' ')[-1].replace('access-', '', 1)
+            name = email.split('@')[0]
+            self.reply(200, {'email': email, 'sub': email, 'given_name': name, 'family_name': 'Student'})
+        else:
+            self.reply(404, {})
+
+    def do_POST(self):
+        provider = self.server
+        time.sleep(provider.latency)
+        provider.count('token')
+        data = parse_qs(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8'))
+        email = data.get('code', [''])[0]
+        self.reply(200, {'access_token': 'access-' + email, 'id_token': provider.id_token(email),
+                         'token_type': 'Bearer'})
+
+    def reply(self, status: int, data: dict):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UncachedJWKSBackend(MyOIDCAB):
+    # mozilla-django-oidc as is: the JWKS document is fetched by every callback
+    retrieve_matching_jwk = OIDCAuthenticationBackend.retrieve_matching_jwk
+
+
+def login_callback(backend_class, provider: MockOIDCProvider, email: str, nonce: str):
+    """
+    Authentication of one OIDC callback (code exchange, ID token verification, userinfo, user upsert)
+    """
+    code = provider.code(email, nonce)
+    request = RequestFactory().get('/oidc/callback/', {'code': code, 'state': 'state'})
+    request.session = {}
+    return backend_class().authenticate(request, nonce=nonce)
+
+
+class Command(BaseCommand):
+    """
+    Login storm against a local mock OIDC provider: --users users complete the OIDC callback at once
+    (a class starting together) on --workers threads
+    - uncached: mozilla-django-oidc fetches the JWKS document on every callback
+    - cached: signing keys come from the JWKS store (portal.apps.users.jwks), starting cold
+    - --rotate: the provider rotates its signing key half way through the storm, the callbacks after it carry an
+      unknown kid
+    - reports callbacks/sec, p50 / p95 / p99 latency and the provider calls of each mode
+    - every mode logs in its own set of new users; they are deleted at the end
+    """
+    help = 'Compare OIDC callbacks/sec with and without the JWKS store during a login storm'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', action='append', choices=['uncached', 'cached'],
+                            help='JWKS handling (repeatable, default: both)')
+        parser.add_argument('--users', type=int, default=200, help='users logging in at once (default: 200)')
+        parser.add_argument('--workers', type=int, default=32, help='callback threads (default: 32)')
+        parser.add_argument('--latency', type=float, default=20, help='provider latency in ms (default: 20)')
+        parser.add_argument('--rotate', action='store_true', help='rotate the signing key half way through')
+
+    def handle(self, *args, **options):
+        self.options = options
+        results = []
+        try:
+            for mode in options['mode'] or ['uncached', 'cached']:
+                results.append(self.run(mode))
+        finally:
+            self.delete_storm_users()
+        self.report(results)
+
+    def run(self, mode: str) -> tuple:
+        provider = MockOIDCProvider(latency=self.options['latency'] / 1000).serve()
+        backend_class = MyOIDCAB if mode == 'cached' else UncachedJWKSBackend
+        executor = ThreadPoolExecutor(max_workers=self.options['workers'], thread_name_prefix='login-worker')
+        users = self.options['users']
+        latencies, errors = [], []
+        lock = threading.Lock()
+
+        def callback(i: int):
+            if self.options['rotate'] and i == users // 2:
+                provider.rotate()
+            email = '{0}{1}-{2:04d}@example.org'.format(STORM_USER_PREFIX, mode, i)
+            start = time.perf_counter()
+            try:
+                user = login_callback(backend_class, provider, email, 'nonce-{0}'.format(i))
+                error = None if user is not None else 'no user'
+            except Exception as exc:
+                error = str(exc)
+            finally:
+                connections.close_all()
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+                if error:
+                    errors.append(error)
+
+        with override_settings(**provider.settings()):
+            reset_jwks_stores()
+            reset_jwks_stats()
+            caches[JWKS_CACHE_ALIAS].delete(jwks_store().cache_key())
+            start = time.perf_counter()
+            list(executor.map(callback, range(users)))
+            seconds = time.perf_counter() - start
+            stats = jwks_stats()
+            reset_jwks_stores()
+        executor.shutdown(wait=True)
+        provider.shutdown()
+        provider.server_close()
+        if errors:
+            self.stderr.write('{0}: {1} errors, first: {2}'.format(mode, len(errors), errors[0]))
+        return mode, sorted(latencies), len(errors), seconds, dict(provider.calls), stats
+
+    @staticmethod
+    def delete_storm_users():
+        users = AerpawUser.objects.filter(username__startswith=STORM_USER_PREFIX)
+        profile_ids = list(users.values_list('profile_id', flat=True))
+        users.delete()
+        AerpawUserProfile.objects.filter(id__in=profile_ids).delete()
+
+    def report(self, results: list):
+        self.stdout.write('{0} users logging in on {1} threads, provider latency {2:.0f} ms{3}'.format(
+            self.options['users'], self.options['workers'], self.options['latency'],
+            ', signing key rotated half way' if self.options['rotate'] else ''))
+        self.stdout.write('{0:<9}  {1:>9}  {2:>6}  {3:>11}  {4:>8}  {5:>8}  {6:>8}  {7:>11}  {8:>9}'.format(
+            'mode', 'callbacks', 'errors', 'callbacks/s', 'p50 ms', 'p95 ms', 'p99 ms', 'jwks calls',
+            'coalesced'))
+        for mode, latencies, errors, seconds, calls, stats in results:
+            self.stdout.write('{0:<9}  {1:>9}  {2:>6}  {3:>11.1f}  {4:>8.1f}  {5:>8.1f}  {6:>8.1f}  {7:>11}  '
+                              '{8:>9}'.format(
+                                  mode, len(latencies), errors, len(latencies) / seconds if seconds else 0,
+                                  percentile(latencies, 50), percentile(latencies, 95), percentile(latencies, 99),
+                                  calls['jwks'], stats['coalesced']))
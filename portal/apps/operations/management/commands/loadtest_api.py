@@ -0,0 +1,202 @@
+import http.client
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from rest_framework_simplejwt.tokens import AccessToken
+
+from portal.apps.users.models import AerpawUser
+from portal.server.postgresql.base import connection_stats, reset_connection_stats
+
+CONN_MODES = ('request', 'persistent', 'pool')
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WorkerPoolWSGIServer(WSGIServer):
+    """
+    WSGI server that hands connections to a fixed pool of worker threads (like a threaded app server):
+    a worker keeps its database connection across requests when connections are persistent
+    """
+    request_queue_size = 256
+
+    def __init__(self, workers: int, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='loadtest-worker')
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        close_worker_connections(self.executor, self.workers)
+
+
+def close_worker_connections(executor: ThreadPoolExecutor, workers: int):
+    """
+    Close the database connections the worker threads of executor kept open and shut it down
+    - the close tasks wait for each other, so each of the workers runs one
+    """
+    barrier = threading.Barrier(workers)
+
+    def close_connections():
+        barrier.wait()
+        connections.close_all()
+
+    for _ in range(workers):
+        executor.submit(close_connections)
+    executor.shutdown(wait=True)
+
+
+def configure_connections(mode: str):
+    """
+    Switch the default database between the request and persistent connection modes in process
+    """
+    db = connections.settings['default']
+    if mode == 'request':
+        db['CONN_MAX_AGE'] = 0
+        db['CONN_HEALTH_CHECKS'] = False
+    elif mode == 'persistent':
+        db['CONN_MAX_AGE'] = int(settings.DATABASES['default'].get('CONN_MAX_AGE') or 60)
+        db['CONN_HEALTH_CHECKS'] = True
+
+
+def percentile(latencies: list, p: float) -> float:
+    """
+    Nearest-rank percentile of sorted latencies
+    """
+    if not latencies:
+        return 0
+    return latencies[max(math.ceil(p / 100 * len(latencies)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    """
+    HTTP load test of an API endpoint against the configured database
+    - the WSGI application is served on 127.0.0.1 by --workers threads, --clients concurrent clients each send
+      --requests requests with a JWT bearer token (after --warmup unmeasured requests each)
+    - runs once per connection mode (--mode, repeatable) and reports req/s, p50 / p95 / p99 latency and the
+      connection counters of the run (portal.server.postgresql)
+    - request / persistent switch CONN_MAX_AGE in process, pool needs POSTGRES_CONN_MODE=pool at startup
+    - every request has a unique query string so the read-through response cache is bypassed (unless --cached)
+    - reads the existing data: seed it first with seed_load_data
+    """
+    help = 'Compare req/s and tail latency of an API endpoint across database connection modes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/experiments', help='endpoint (default: /api/experiments)')
+        parser.add_argument('--mode', action='append', choices=CONN_MODES,
+                            help='connection mode (repeatable, default: request and persistent, or pool)')
+        parser.add_argument('--clients', type=int, default=50, help='concurrent clients (default: 50)')
+        parser.add_argument('--requests', type=int, default=20, help='requests per client (default: 20)')
+        parser.add_argument('--warmup', type=int, default=1, help='unmeasured requests per client (default: 1)')
+        parser.add_argument('--workers', type=int, default=16, help='server worker threads (default: 16)')
+        parser.add_argument('--username', help='user of the bearer token (default: first active user)')
+        parser.add_argument('--cached', action='store_true', help='allow response cache hits')
+
+    def handle(self, *args, **options):
+        configured_pool = settings.POSTGRES_CONN_MODE == 'pool'
+        modes = options['mode'] or (['pool'] if configured_pool else ['request', 'persistent'])
+        if configured_pool and set(modes) != {'pool'}:
+            raise CommandError('POSTGRES_CONN_MODE=pool: only --mode=pool can be measured in this process')
+        if not configured_pool and 'pool' in modes:
+            raise CommandError('--mode=pool: restart with POSTGRES_CONN_MODE=pool (requires psycopg[pool])')
+        users = AerpawUser.objects.filter(is_active=True).order_by('id')
+        user = users.filter(username=options['username']).first() if options['username'] else users.first()
+        if user is None:
+            raise CommandError("no user to load test with: run 'manage.py seed_load_data' first")
+        self.token = str(AccessToken.for_user(user))
+        self.options = options
+        results = [self.run(mode) for mode in modes]
+        self.report(results)
+
+    def run(self, mode: str) -> tuple:
+        configure_connections(mode)
+        server = WorkerPoolWSGIServer(self.options['workers'], ('127.0.0.1', 0), QuietRequestHandler)
+        server.set_app(WSGIHandler())
+        port = server.server_address[1]
+        serve = threading.Thread(target=server.serve_forever, daemon=True)
+        serve.start()
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+        sequence = iter(range(10 ** 9))
+        barrier = threading.Barrier(self.options['clients'] + 1)
+
+        def get() -> tuple:
+            path = self.options['path']
+            if not self.options['cached']:
+                path = '{0}{1}_lt={2}'.format(path, '&' if '?' in path else '?', next(sequence))
+            start = time.perf_counter()
+            client = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            try:
+                client.request('GET', path, headers={'Authorization': 'Bearer {0}'.format(self.token)})
+                response = client.getresponse()
+                response.read()
+                status = response.status
+            except Exception as exc:
+                status = str(exc)
+            finally:
+                client.close()
+            return (time.perf_counter() - start) * 1000, status
+
+        def client_loop():
+            for _ in range(self.options['warmup']):
+                get()
+            barrier.wait()
+            for _ in range(self.options['requests']):
+                elapsed_ms, status = get()
+                with lock:
+                    latencies.append(elapsed_ms)
+                    if status != 200:
+                        errors.append(status)
+
+        clients = [threading.Thread(target=client_loop) for _ in range(self.options['clients'])]
+        for client in clients:
+            client.start()
+        barrier.wait()
+        reset_connection_stats()
+        start = time.perf_counter()
+        for client in clients:
+            client.join()
+        seconds = time.perf_counter() - start
+        stats = connection_stats().get('default', {})
+        server.shutdown()
+        server.server_close()
+        if errors:
+            self.stderr.write('{0}: {1} errors, first: {2}'.format(mode, len(errors), errors[0]))
+        return mode, sorted(latencies), len(errors), seconds, stats
+
+    def report(self, results: list):
+        self.stdout.write('{0} x {1} requests of GET {2} ({3} server workers)'.format(
+            self.options['clients'], self.options['requests'], self.options['path'], self.options['workers']))
+        self.stdout.write('{0:<10}  {1:>8}  {2:>6}  {3:>8}  {4:>8}  {5:>8}  {6:>8}  {7:>9}  {8:>8}  {9:>10}'.format(
+            'mode', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'checkouts', 'connects',
+            'connect ms'))
+        for mode, latencies, errors, seconds, stats in results:
+            connects = stats.get('connects', 0)
+            self.stdout.write('{0:<10}  {1:>8}  {2:>6}  {3:>8.0f}  {4:>8.1f}  {5:>8.1f}  {6:>8.1f}  {7:>9}  {8:>8}  '
+                              '{9:>10.2f}'.format(
+                                  mode, len(latencies), errors, len(latencies) / seconds if seconds else 0,
+                                  percentile(latencies, 50), percentile(latencies, 95), percentile(latencies, 99),
+                                  stats.get('checkouts', 0), connects,
+                                  stats.get('connect_ms', 0) / connects if connects else 0))
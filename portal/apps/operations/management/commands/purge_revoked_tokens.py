@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from portal.apps.users.models import RevokedToken
+
+
+class Command(BaseCommand):
+    """
+    Delete the revoked tokens that have expired (an expired token is rejected anyway)
+    - in batches of --batch-size rows (one short DELETE each, on the expires_at index)
+    - safe to run while the portal serves requests, e.g. daily from cron
+    """
+    help = 'Purge expired rows from the token revocation list in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='rows per DELETE (default: 1000)')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        expired = RevokedToken.objects.filter(expires_at__lte=now).order_by('expires_at')
+        purged = batches = 0
+        while True:
+            jtis = list(expired.values_list('jti', flat=True)[:options['batch_size']])
+            if not jtis:
+                break
+            purged += RevokedToken.objects.filter(jti__in=jtis).delete()[0]
+            batches += 1
+        self.stdout.write('purged {0} expired revoked tokens in {1} batches'.format(purged, batches))
@@ -0,0 +1,296 @@
+import random
+import time
+from itertools import islice
+from uuid import UUID
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from portal.apps.experiments.models import AerpawExperiment, CanonicalExperimentResource, ExperimentSession, \
+    UserExperiment
+from portal.apps.mixins.cache import invalidate_all
+from portal.apps.operations.models import CANONICAL_NUMBER_SEQUENCE_ID, CanonicalNumber, CanonicalNumberSequence, \
+    FreeCanonicalNumber, MAX_CANONICAL_NUMBER, set_current_canonical_number
+from portal.apps.projects.models import AerpawProject, UserProject
+from portal.apps.resources.models import AerpawResource
+from portal.apps.users.models import AerpawRolesEnum, AerpawUser
+
+
+class Command(BaseCommand):
+    """
+    Synthetic large dataset for load testing
+    - deterministic for a given --seed
+    - rows are written with bulk_create in batches of --batch-size
+    - all seeded rows are named with --prefix so they can be removed with --flush
+    """
+    help = 'Seed a large synthetic dataset (users, projects, experiments, resources, sessions) for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='rows per INSERT (default: 5000)')
+        parser.add_argument('--prefix', default='load', help='name prefix of seeded rows (default: load)')
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--projects', type=int, default=2000)
+        parser.add_argument('--experiments', type=int, default=50000)
+        parser.add_argument('--resources', type=int, default=500)
+        parser.add_argument('--sessions', type=int, default=200000)
+        parser.add_argument('--flush', action='store_true', help='delete previously seeded rows and exit')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.prefix = options['prefix']
+        self.stats = []
+        if options['flush']:
+            with transaction.atomic():
+                self.flush()
+                # bulk writes send no model signals
+                invalidate_all()
+            self.report()
+            return
+        if AerpawUser.objects.filter(username__startswith='{0}-'.format(self.prefix)).exists():
+            raise CommandError("seeded rows with prefix '{0}' already exist: run with --flush first".format(
+                self.prefix))
+        if not Group.objects.filter(name=AerpawRolesEnum.EXPERIMENTER.value).exists():
+            raise CommandError("AERPAW roles are missing: run 'manage.py loaddata aerpaw_roles' first")
+        with transaction.atomic():
+            users, pis = self.seed_users(options['users'])
+            resources = self.seed_resources(options['resources'], users)
+            projects, project_users = self.seed_projects(options['projects'], users, pis)
+            experiments = self.seed_experiments(options['experiments'], projects, project_users, resources)
+            self.seed_sessions(options['sessions'], experiments)
+            # bulk writes send no model signals
+            invalidate_all()
+        self.report()
+
+    def uuid(self) -> str:
+        return str(UUID(int=self.rng.getrandbits(128), version=4))
+
+    def bulk_create(self, model, rows) -> list:
+        """
+        Insert rows (any iterable) in batches and record rows/sec for the model
+        """
+        start = time.perf_counter()
+        created = []
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            created.extend(model.objects.bulk_create(batch))
+        self.stats.append((model.__name__, len(created), time.perf_counter() - start))
+        return created
+
+    def seed_users(self, count: int) -> tuple:
+        password = make_password(None)
+        users = self.bulk_create(AerpawUser, (
+            AerpawUser(
+                username='{0}-{1:05d}@example.org'.format(self.prefix, i),
+                email='{0}-{1:05d}@example.org'.format(self.prefix, i),
+                display_name='{0} user {1:05d}'.format(self.prefix, i),
+                openid_sub='{0}-{1:05d}'.format(self.prefix, i),
+                password=password, uuid=self.uuid()
+            ) for i in range(count)
+        ))
+        # every user is an experimenter, ~20% pi, ~2% operator, ~0.5% site_admin
+        roles = {g.name: g.id for g in Group.objects.filter(name__in=[r.value for r in AerpawRolesEnum])}
+        user_groups = []
+        pis = []
+        for user in users:
+            user_roles = [AerpawRolesEnum.EXPERIMENTER.value]
+            for role, ratio in [(AerpawRolesEnum.PI, 0.2), (AerpawRolesEnum.OPERATOR, 0.02),
+                                (AerpawRolesEnum.SITE_ADMIN, 0.005)]:
+                if self.rng.random() < ratio:
+                    user_roles.append(role.value)
+            if AerpawRolesEnum.PI.value in user_roles:
+                pis.append(user)
+            user_groups.extend(
+                AerpawUser.groups.through(aerpawuser_id=user.id, group_id=roles[r]) for r in user_roles)
+        self.bulk_create(AerpawUser.groups.through, user_groups)
+        return users, pis or users
+
+    def seed_resources(self, count: int, users: list) -> list:
+        creator = users[0]
+        return self.bulk_create(AerpawResource, (
+            AerpawResource(
+                name='{0}-resource-{1:04d}'.format(self.prefix, i),
+                description='synthetic resource {0}'.format(i),
+                hostname='{0}-resource-{1:04d}.example.org'.format(self.prefix, i),
+                ip_address='10.{0}.{1}.{2}'.format(i // 65536 % 256, i // 256 % 256, i % 256),
+                is_active=self.rng.random() < 0.9,
+                location='site {0}'.format(i % 10),
+                resource_class=self.rng.choice(AerpawResource.ResourceClass.values),
+                resource_mode=self.rng.choice(AerpawResource.ResourceMode.values),
+                resource_type=self.rng.choice(AerpawResource.ResourceType.values),
+                created_by=creator, modified_by=creator, uuid=self.uuid()
+            ) for i in range(count)
+        ))
+
+    def seed_projects(self, count: int, users: list, pis: list) -> tuple:
+        projects = []
+        for i in range(count):
+            creator = self.rng.choice(pis)
+            projects.append(AerpawProject(
+                name='{0}-project-{1:04d}'.format(self.prefix, i),
+                description='synthetic project {0}'.format(i),
+                is_public=self.rng.random() < 0.3,
+                project_creator=creator,
+                created_by=creator, modified_by=creator, uuid=self.uuid()
+            ))
+        projects = self.bulk_create(AerpawProject, projects)
+        # creator + 0-2 more owners, 3-10 members
+        project_users = {}
+        memberships = []
+        for project in projects:
+            owners = {project.project_creator} | set(self.rng.sample(pis, min(len(pis), self.rng.randint(0, 2))))
+            members = set(self.rng.sample(users, min(len(users), self.rng.randint(3, 10)))) - owners
+            project_users[project.id] = sorted(owners | members, key=lambda u: u.id)
+            memberships.extend(
+                UserProject(project=project, user=u, granted_by=project.project_creator,
+                            project_role=UserProject.RoleType.PROJECT_OWNER) for u in owners)
+            memberships.extend(
+                UserProject(project=project, user=u, granted_by=project.project_creator,
+                            project_role=UserProject.RoleType.PROJECT_MEMBER) for u in members)
+        self.bulk_create(UserProject, memberships)
+        return projects, project_users
+
+    def seed_experiments(self, count: int, projects: list, project_users: dict, resources: list) -> list:
+        # canonical numbers are unique among active experiments: experiments beyond the unused numbers are seeded as
+        # deleted (released numbers, as left behind by delete_experiment)
+        in_use = set(CanonicalNumber.objects.filter(
+            canonical_number__lte=MAX_CANONICAL_NUMBER, is_deleted=False).values_list('canonical_number', flat=True))
+        numbers = list(islice((n for n in range(1, MAX_CANONICAL_NUMBER + 1) if n not in in_use), count))
+        canonical_numbers = self.bulk_create(CanonicalNumber, (
+            CanonicalNumber(canonical_number=numbers[i], is_deleted=False) if i < len(numbers) else
+            CanonicalNumber(canonical_number=i % MAX_CANONICAL_NUMBER + 1, is_deleted=True) for i in range(count)
+        ))
+        if numbers:
+            self.sync_canonical_number_sequence(max(self.canonical_number_sequence(), max(numbers) + 1))
+        experiments = []
+        for i, canonical_number in enumerate(canonical_numbers):
+            project = self.rng.choice(projects)
+            creator = self.rng.choice(project_users[project.id])
+            experiments.append(AerpawExperiment(
+                name='{0}-experiment-{1:05d}'.format(self.prefix, i),
+                description='synthetic experiment {0}'.format(i),
+                canonical_number=canonical_number,
+                experiment_creator=creator,
+                experiment_state=self.rng.choice(AerpawExperiment.ExperimentState.values),
+                is_canonical=self.rng.random() < 0.8,
+                is_deleted=canonical_number.is_deleted,
+                is_retired=self.rng.random() < 0.1 or canonical_number.is_deleted,
+                project=project,
+                created_by=creator, modified_by=creator, uuid=self.uuid()
+            ))
+        experiments = self.bulk_create(AerpawExperiment, experiments)
+        # creator + 0-3 project users as experiment members
+        self.bulk_create(UserExperiment, (
+            UserExperiment(experiment=e, user=u, granted_by=e.experiment_creator)
+            for e in experiments
+            for u in {e.experiment_creator} | set(
+                self.rng.sample(project_users[e.project_id], min(len(project_users[e.project_id]),
+                                                                 self.rng.randint(0, 3))))
+        ))
+        # 1-4 resources per experiment, each with a canonical-experiment-resource
+        experiment_resources = [(e, self.rng.sample(resources, min(len(resources), self.rng.randint(1, 4))))
+                                for e in experiments] if resources else []
+        self.bulk_create(AerpawExperiment.resources.through, (
+            AerpawExperiment.resources.through(aerpawexperiment_id=e.id, aerpawresource_id=r.id)
+            for e, rs in experiment_resources for r in rs
+        ))
+        self.bulk_create(CanonicalExperimentResource, (
+            self.canonical_experiment_resource(e, r, n)
+            for e, rs in experiment_resources for n, r in enumerate(rs, start=1)
+        ))
+        return experiments
+
+    def canonical_experiment_resource(self, experiment, resource, node_number) -> CanonicalExperimentResource:
+        if resource.resource_type == AerpawResource.ResourceType.AFRN:
+            node_type = CanonicalExperimentResource.NodeType.AFRN
+            node_vehicle = CanonicalExperimentResource.NodeVehicle.VEHICLE_NONE
+        else:
+            node_type = CanonicalExperimentResource.NodeType.APRN
+            node_vehicle = {
+                AerpawResource.ResourceType.UAV: CanonicalExperimentResource.NodeVehicle.VEHICLE_UAV,
+                AerpawResource.ResourceType.UGV: CanonicalExperimentResource.NodeVehicle.VEHICLE_UGV,
+                AerpawResource.ResourceType.OTHER: CanonicalExperimentResource.NodeVehicle.VEHICLE_OTHER
+            }.get(resource.resource_type, CanonicalExperimentResource.NodeVehicle.VEHICLE_NONE)
+        return CanonicalExperimentResource(
+            experiment=experiment, resource=resource, experiment_node_number=node_number, node_type=node_type,
+            node_uhd=self.rng.choice(CanonicalExperimentResource.NodeUhd.values), node_vehicle=node_vehicle,
+            uuid=self.uuid())
+
+    @staticmethod
+    def canonical_number_sequence() -> int:
+        return CanonicalNumberSequence.objects.filter(pk=CANONICAL_NUMBER_SEQUENCE_ID).values_list(
+            'next_number', flat=True).first() or 1
+
+    @staticmethod
+    def sync_canonical_number_sequence(next_number: int) -> None:
+        """
+        Canonical number allocation after bulk writes (which bypass allocate / release_canonical_number)
+        - numbers are issued from next_number on, the unused numbers below it are moved to the free list
+        """
+        if next_number <= MAX_CANONICAL_NUMBER:
+            set_current_canonical_number(next_number)
+            return
+        # the sequence is used up: numbers are only reissued from the free list
+        CanonicalNumberSequence.objects.update_or_create(
+            pk=CANONICAL_NUMBER_SEQUENCE_ID, defaults={'next_number': MAX_CANONICAL_NUMBER + 1})
+        in_use = set(CanonicalNumber.objects.filter(is_deleted=False).values_list('canonical_number', flat=True))
+        FreeCanonicalNumber.objects.all().delete()
+        FreeCanonicalNumber.objects.bulk_create([FreeCanonicalNumber(canonical_number=n) for n in range(
+            1, MAX_CANONICAL_NUMBER + 1) if n not in in_use])
+
+    def seed_sessions(self, count: int, experiments: list):
+        if not experiments:
+            return
+        self.bulk_create(ExperimentSession, (
+            self.experiment_session(self.rng.choice(experiments)) for _ in range(count)
+        ))
+
+    def experiment_session(self, experiment) -> ExperimentSession:
+        ended = self.rng.random() < 0.95
+        return ExperimentSession(
+            experiment=experiment,
+            session_type=self.rng.choice(ExperimentSession.SessionType.values),
+            started_by=experiment.experiment_creator,
+            ended_by=experiment.experiment_creator if ended else None,
+            uuid=self.uuid())
+
+    def flush(self):
+        """
+        Delete seeded rows in reverse dependency order
+        """
+        start = time.perf_counter()
+        experiments = AerpawExperiment.objects.filter(name__startswith='{0}-experiment-'.format(self.prefix))
+        canonical_number_ids = list(experiments.values_list('canonical_number_id', flat=True))
+        deleted = 0
+        for queryset in [
+            ExperimentSession.objects.filter(experiment__in=experiments),
+            CanonicalExperimentResource.objects.filter(experiment__in=experiments),
+            UserExperiment.objects.filter(experiment__in=experiments),
+            AerpawExperiment.resources.through.objects.filter(aerpawexperiment__in=experiments),
+            experiments,
+            CanonicalNumber.objects.filter(id__in=canonical_number_ids),
+            UserProject.objects.filter(project__name__startswith='{0}-project-'.format(self.prefix)),
+            AerpawProject.objects.filter(name__startswith='{0}-project-'.format(self.prefix)),
+            AerpawResource.objects.filter(name__startswith='{0}-resource-'.format(self.prefix)),
+            AerpawUser.objects.filter(username__startswith='{0}-'.format(self.prefix))
+        ]:
+            deleted += queryset.delete()[0]
+        # the numbers of the deleted experiments can be issued again
+        if canonical_number_ids:
+            self.sync_canonical_number_sequence(self.canonical_number_sequence())
+        self.stats.append(('flush', deleted, time.perf_counter() - start))
+
+    def report(self):
+        total_rows = sum(rows for _, rows, _ in self.stats)
+        total_seconds = sum(seconds for _, _, seconds in self.stats)
+        width = max([len(name) for name, _, _ in self.stats] + [len('total')])
+        self.stdout.write('{0}  {1:>9}  {2:>8}  {3:>10}'.format('model'.ljust(width), 'rows', 'seconds', 'rows/sec'))
+        for name, rows, seconds in self.stats + [('total', total_rows, total_seconds)]:
+            self.stdout.write('{0}  {1:>9}  {2:>8.2f}  {3:>10.0f}'.format(
+                name.ljust(width), rows, seconds, rows / seconds if seconds else 0))
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='canonicalnumber',
+            index=models.Index(fields=['canonical_number', 'is_deleted'], name='canonical_number_deleted_idx'),
+        ),
+    ]
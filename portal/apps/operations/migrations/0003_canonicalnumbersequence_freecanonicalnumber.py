@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+MAX_CANONICAL_NUMBER = 9999
+
+
+def initialize_sequence(apps, schema_editor):
+    """
+    Start the sequence after the highest active canonical number and free every unused number below it
+    """
+    CanonicalNumber = apps.get_model('operations', 'CanonicalNumber')
+    CanonicalNumberSequence = apps.get_model('operations', 'CanonicalNumberSequence')
+    FreeCanonicalNumber = apps.get_model('operations', 'FreeCanonicalNumber')
+    in_use = set(CanonicalNumber.objects.filter(
+        is_deleted=False, canonical_number__gte=1, canonical_number__lte=MAX_CANONICAL_NUMBER
+    ).values_list('canonical_number', flat=True))
+    next_number = max(in_use) + 1 if in_use else 1
+    CanonicalNumberSequence.objects.update_or_create(pk=1, defaults={'next_number': next_number})
+    FreeCanonicalNumber.objects.bulk_create(
+        [FreeCanonicalNumber(canonical_number=n) for n in range(1, next_number) if n not in in_use])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('operations', '0002_canonicalnumber_canonical_number_deleted_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CanonicalNumberSequence',
+            fields=[
+                ('id', models.IntegerField(default=1, primary_key=True, serialize=False)),
+                ('next_number', models.IntegerField(default=1)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FreeCanonicalNumber',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('canonical_number', models.IntegerField(unique=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(initialize_sequence, migrations.RunPython.noop),
+    ]
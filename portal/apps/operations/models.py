@@ -1,72 +1,103 @@
-import json
-import os
-from datetime import datetime, timezone
+from datetime import datetime
 
-from django.db import models
+from django.db import models, transaction
 
 from portal.apps.mixins.models import BaseModel, BaseTimestampModel
-from portal.server.settings import BASE_DIR
 
 # constants
 MAX_CANONICAL_NUMBER = 9999
-CANONICAL_NUMBER_JSON = 'apps/operations/current-canonical-number.json'
-
-# global for Canonical Number
-current_canonical_number = 0
-
-
-def _read_current_canonical_number() -> int:
-    print('### read_current_canonical_number()')
-    try:
-        file_path = os.path.join(BASE_DIR, CANONICAL_NUMBER_JSON)
-        with open(file_path, "r") as file:
-            file_dict = json.load(file)
-        if file_dict.get('current_canonical_number', None):
-            return int(file_dict.get('current_canonical_number'))
-    except Exception as exc:
-        print(exc)
-
-    return 0
-
-
-def _write_current_canonical_number(canonical_number: int):
-    print('### write_current_canonical_number()')
-    file_path = os.path.join(BASE_DIR, CANONICAL_NUMBER_JSON)
-    file_dict = {
-        "current_canonical_number": canonical_number,
-        "timestamp": int(round(datetime.now(timezone.utc).timestamp()))
-    }
-    file_json = json.dumps(file_dict, indent=4)
-    with open(file_path, "w") as file:
-        file.write(file_json)
-
-
-def get_current_canonical_number() -> int:
-    global current_canonical_number
-    current_canonical_number = _read_current_canonical_number()
-    if CanonicalNumber.objects.filter(canonical_number=current_canonical_number, is_deleted=False).exists() or \
-            int(current_canonical_number) < 1 or int(current_canonical_number) > 9999:
-        return increment_current_canonical_number()
-    _write_current_canonical_number(current_canonical_number)
-    return current_canonical_number
-
-
-def set_current_canonical_number(new_number: int = None) -> int:
-    global current_canonical_number
-    current_canonical_number = int(new_number)
-    _write_current_canonical_number(current_canonical_number)
-    return current_canonical_number
-
-
-def increment_current_canonical_number() -> int:
-    global current_canonical_number
-    current_canonical_number += 1
-    if current_canonical_number < 1 or current_canonical_number > 9999:
-        current_canonical_number = 1
-    while CanonicalNumber.objects.filter(canonical_number=current_canonical_number, is_deleted=False).exists():
-        current_canonical_number += 1
-    _write_current_canonical_number(current_canonical_number)
-    return current_canonical_number
+CANONICAL_NUMBER_SEQUENCE_ID = 1
+
+
+def _locked_sequence():
+    """
+    Lock and return the single CanonicalNumberSequence row (must be called inside transaction.atomic)
+    """
+    sequence, created = CanonicalNumberSequence.objects.select_for_update().get_or_create(
+        pk=CANONICAL_NUMBER_SEQUENCE_ID)
+    return sequence
+
+
+def _next_unused_number(number: int):
+    """
+    Lowest number >= number that is not held by an active CanonicalNumber (None when the range is used up)
+    - numbers at or above the sequence are normally unused: this is one empty index lookup
+    """
+    in_use = set(CanonicalNumber.objects.filter(
+        canonical_number__gte=number, canonical_number__lte=MAX_CANONICAL_NUMBER, is_deleted=False
+    ).values_list('canonical_number', flat=True))
+    while number in in_use:
+        number += 1
+    return number if number <= MAX_CANONICAL_NUMBER else None
+
+
+def get_current_canonical_number():
+    """
+    Canonical number that would be issued to the next experiment (read only, None when all are in use)
+    """
+    sequence = CanonicalNumberSequence.objects.filter(pk=CANONICAL_NUMBER_SEQUENCE_ID).first()
+    number = _next_unused_number(sequence.next_number if sequence else 1)
+    if number is None:
+        number = FreeCanonicalNumber.objects.order_by('canonical_number').values_list(
+            'canonical_number', flat=True).first()
+    return number
+
+
+def set_current_canonical_number(new_number: int = None):
+    """
+    Issue canonical numbers from new_number onwards
+    - unused numbers below new_number are moved to the free list so they are reissued once the sequence runs out
+    """
+    new_number = int(new_number)
+    if new_number < 1 or new_number > MAX_CANONICAL_NUMBER:
+        raise ValueError('canonical_number: must be between 1 and {0}'.format(MAX_CANONICAL_NUMBER))
+    with transaction.atomic():
+        sequence = _locked_sequence()
+        sequence.next_number = new_number
+        sequence.save()
+        in_use = set(CanonicalNumber.objects.filter(
+            canonical_number__lt=new_number, is_deleted=False).values_list('canonical_number', flat=True))
+        FreeCanonicalNumber.objects.all().delete()
+        FreeCanonicalNumber.objects.bulk_create(
+            [FreeCanonicalNumber(canonical_number=n) for n in range(1, new_number) if n not in in_use])
+    return get_current_canonical_number()
+
+
+def allocate_canonical_number():
+    """
+    Create and return a new CanonicalNumber
+    - numbers are issued in order from CanonicalNumberSequence, then reused from FreeCanonicalNumber
+    - the sequence row lock serializes allocation across processes and nodes
+    - raises ValueError when every number is in use
+    """
+    with transaction.atomic():
+        sequence = _locked_sequence()
+        number = _next_unused_number(sequence.next_number) if sequence.next_number <= MAX_CANONICAL_NUMBER else None
+        if number is not None:
+            sequence.next_number = number + 1
+            sequence.save()
+        else:
+            free_number = FreeCanonicalNumber.objects.order_by('canonical_number').first()
+            if free_number is None:
+                raise ValueError('canonical_number: all {0} canonical numbers are in use'.format(
+                    MAX_CANONICAL_NUMBER))
+            number = free_number.canonical_number
+            free_number.delete()
+        return CanonicalNumber.objects.create(canonical_number=number)
+
+
+def release_canonical_number(canonical_number):
+    """
+    Mark canonical_number as is_deleted and return its number to the free list
+    """
+    with transaction.atomic():
+        sequence = _locked_sequence()
+        canonical_number.is_deleted = True
+        canonical_number.save()
+        # numbers at or above the sequence are issued again by the sequence itself
+        if canonical_number.canonical_number < sequence.next_number and not CanonicalNumber.objects.filter(
+                canonical_number=canonical_number.canonical_number, is_deleted=False).exists():
+            FreeCanonicalNumber.objects.get_or_create(canonical_number=canonical_number.canonical_number)
 
 
 class CanonicalNumber(BaseModel, BaseTimestampModel, models.Model):
@@ -84,5 +115,32 @@ class CanonicalNumber(BaseModel, BaseTimestampModel, models.Model):
     is_deleted = models.BooleanField(default=False)
     is_retired = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['canonical_number', 'is_deleted'], name='canonical_number_deleted_idx')
+        ]
+
     def timestamp(self) -> int:
         return int(round(datetime.strptime(str(self.created), "%Y-%m-%d %H:%M:%S.%f%z").timestamp()))
+
+
+class CanonicalNumberSequence(models.Model):
+    """
+    Canonical Number Sequence (single row, locked while a number is allocated)
+    - id
+    - next_number
+    """
+
+    id = models.IntegerField(primary_key=True, default=CANONICAL_NUMBER_SEQUENCE_ID)
+    next_number = models.IntegerField(default=1)
+
+
+class FreeCanonicalNumber(BaseTimestampModel, models.Model):
+    """
+    Free Canonical Number (released by is_deleted, reissued once the sequence is used up)
+    - canonical_number
+    - created (from BaseTimestampModel)
+    - modified (from BaseTimestampModel)
+    """
+
+    canonical_number = models.IntegerField(unique=True)
@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from portal.apps.mixins.cache import invalidate
+from portal.apps.operations.models import CanonicalNumber
+
+# response cache namespace of the canonical number list endpoint
+CANONICAL_NUMBERS_CACHE_NAMESPACE = 'canonical-numbers'
+
+
+@receiver([post_save, post_delete], sender=CanonicalNumber)
+def invalidate_canonical_numbers(sender, instance, **kwargs):
+    invalidate(CANONICAL_NUMBERS_CACHE_NAMESPACE)
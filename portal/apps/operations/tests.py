@@ -1 +1,254 @@
-# Create your tests here.
+import threading
+import time
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+
+from portal.apps.experiments.models import AerpawExperiment, CanonicalExperimentResource, ExperimentSession
+from portal.apps.mixins.cache import reset_cache_stats
+from portal.apps.mixins.testing import AsyncReadPathTestCase, IndexScanTestCase, QueryBudgetTestCase, create_user
+from portal.apps.operations.models import CanonicalNumber, CanonicalNumberSequence, FreeCanonicalNumber, \
+    MAX_CANONICAL_NUMBER, allocate_canonical_number, get_current_canonical_number, release_canonical_number, \
+    set_current_canonical_number
+from portal.apps.users.models import AerpawRolesEnum, AerpawUser
+from portal.server.postgresql.base import connection_stats, reset_connection_stats
+
+
+class CanonicalNumberEndpointBudgetTestCase(QueryBudgetTestCase):
+    """
+    Query and wall-clock budgets for /p-canonical-experiment-number
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = create_user('operator@example.org', AerpawRolesEnum.OPERATOR.value)
+        CanonicalNumber.objects.bulk_create([CanonicalNumber(canonical_number=i) for i in range(1, 4)])
+        cls.canonical_number = CanonicalNumber.objects.first()
+
+    def grow_canonical_numbers(self):
+        CanonicalNumber.objects.bulk_create([CanonicalNumber(canonical_number=i) for i in range(4, 11)])
+
+    def test_canonical_numbers(self):
+        path = '/api/p-canonical-experiment-number'
+        self.assertQueryBudget(self.operator, 'get', path, max_queries=3, max_ms=250)
+        self.assertQueryBudget(self.operator, 'get', '{0}/{1}'.format(path, self.canonical_number.id),
+                               max_queries=2, max_ms=250)
+        self.assertNoNPlusOne(self.operator, path, self.grow_canonical_numbers)
+        self.assertQueryBudget(self.operator, 'get', '{0}/current'.format(path), max_queries=2, max_ms=250)
+
+    def test_cached_canonical_numbers(self):
+        path = '/api/p-canonical-experiment-number'
+        reset_cache_stats()
+        count = self.assertQueryBudget(self.operator, 'get', path, max_queries=3, max_ms=250).data['count']
+        self.assertQueryBudget(self.operator, 'get', path, max_queries=1, max_ms=250)
+        allocate_canonical_number()
+        self.assertEqual(self.api_client(self.operator).get(path).data['count'], count + 1)
+        stats = self.assertQueryBudget(self.operator, 'get', '/api/p-response-cache', max_queries=1, max_ms=250)
+        self.assertEqual(stats.data['namespaces']['canonical-numbers'], {'hits': 1, 'misses': 2})
+
+
+class DatabaseConnectionTestCase(QueryBudgetTestCase):
+    """
+    Query and wall-clock budgets for /p-db-connections
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = create_user('operator@example.org', AerpawRolesEnum.OPERATOR.value)
+        cls.experimenter = create_user('experimenter@example.org', AerpawRolesEnum.EXPERIMENTER.value)
+
+    def test_db_connections(self):
+        response = self.assertQueryBudget(self.operator, 'get', '/api/p-db-connections', max_queries=1, max_ms=250)
+        self.assertIn('default', response.data['connections'])
+        self.assertEqual(response.data['pool'], {})
+        self.assertQueryBudget(self.experimenter, 'get', '/api/p-db-connections', max_queries=1, max_ms=250,
+                               status_code=403)
+
+
+class CanonicalNumberAllocatorTestCase(TestCase):
+
+    def numbers(self, count: int) -> list:
+        return [allocate_canonical_number().canonical_number for _ in range(count)]
+
+    def test_numbers_are_issued_in_order(self):
+        self.assertEqual(get_current_canonical_number(), 1)
+        self.assertEqual(self.numbers(3), [1, 2, 3])
+        self.assertEqual(get_current_canonical_number(), 4)
+
+    def test_active_numbers_are_skipped(self):
+        CanonicalNumber.objects.bulk_create([CanonicalNumber(canonical_number=i) for i in (2, 3)])
+        self.assertEqual(self.numbers(2), [1, 4])
+
+    def test_released_numbers_are_reused_after_the_sequence(self):
+        set_current_canonical_number(MAX_CANONICAL_NUMBER - 1)
+        self.assertEqual(FreeCanonicalNumber.objects.count(), MAX_CANONICAL_NUMBER - 2)
+        FreeCanonicalNumber.objects.exclude(canonical_number=5).delete()
+        CanonicalNumber.objects.create(canonical_number=5)
+        released = CanonicalNumber.objects.get(canonical_number=5)
+        release_canonical_number(released)
+        self.assertEqual(self.numbers(3), [MAX_CANONICAL_NUMBER - 1, MAX_CANONICAL_NUMBER, 5])
+        self.assertIsNone(get_current_canonical_number())
+        with self.assertRaises(ValueError):
+            allocate_canonical_number()
+
+    def test_allocation_query_count(self):
+        CanonicalNumber.objects.bulk_create([CanonicalNumber(canonical_number=i) for i in range(1, 1001)])
+        self.numbers(1)
+        with self.assertNumQueries(6):
+            self.numbers(1)
+
+
+class CanonicalNumberConcurrencyTestCase(TransactionTestCase):
+    """
+    32 parallel creators, each on its own database connection, must never receive the same canonical number
+    """
+    creators = 32
+    numbers_per_creator = 10
+
+    def test_parallel_allocation(self):
+        barrier = threading.Barrier(self.creators)
+        numbers, errors = [], []
+
+        def creator():
+            try:
+                barrier.wait()
+                for _ in range(self.numbers_per_creator):
+                    numbers.append(allocate_canonical_number().canonical_number)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=creator) for _ in range(self.creators)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        total = self.creators * self.numbers_per_creator
+        print('\n{0}: {1} creators, {2} numbers in {3:.2f}s ({4:.0f} numbers/sec)'.format(
+            self.__class__.__name__, self.creators, total, elapsed, total / elapsed))
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(numbers), list(range(1, total + 1)))
+        self.assertEqual(CanonicalNumberSequence.objects.get().next_number, total + 1)
+
+
+class DatabaseConnectionCountersTestCase(TransactionTestCase):
+    """
+    Checkout / connect counters of the portal.server.postgresql backend
+    - outside of a test transaction request boundaries close / keep connections as in production
+    - loadtest_api server threads read committed data (the rows are flushed after each test)
+    """
+
+    def test_checkouts(self):
+        connection.ensure_connection()
+        reset_connection_stats()
+        for _ in range(3):
+            # request boundary (request_started / request_finished)
+            connection.close_if_unusable_or_obsolete()
+            AerpawUser.objects.count()
+            AerpawUser.objects.count()
+        self.assertEqual(connection_stats()['default'], {
+            'checkouts': 3, 'reuses': 3, 'connects': 0, 'connect_ms': 0, 'connect_ms_max': 0, 'closes': 0})
+
+    def test_loadtest_api(self):
+        create_user('experimenter@example.org')
+        out = StringIO()
+        call_command('loadtest_api', '--clients=4', '--requests=3', '--workers=2', stdout=out, stderr=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split()[:3] for line in lines[2:]], [['request', '12', '0'], ['persistent', '12', '0']])
+        # persistent: the two workers connect during the warmup and reuse their connection afterwards
+        self.assertEqual(lines[3].split()[-2], '0', out.getvalue())
+
+
+class SeedLoadDataTestCase(TestCase):
+    fixtures = ['aerpaw_roles']
+
+    def seed(self, *args):
+        call_command('seed_load_data', '--users=20', '--projects=5', '--experiments=30', '--resources=5',
+                     '--sessions=50', *args, stdout=StringIO())
+
+    def test_seed_is_deterministic(self):
+        self.seed('--seed=7')
+        self.assertEqual(AerpawExperiment.objects.count(), 30)
+        self.assertEqual(ExperimentSession.objects.count(), 50)
+        self.assertTrue(CanonicalExperimentResource.objects.exists())
+        first = list(AerpawExperiment.objects.order_by('name').values_list('uuid', 'experiment_state'))
+        self.seed('--flush')
+        self.assertFalse(AerpawExperiment.objects.exists())
+        self.seed('--seed=7')
+        self.assertEqual(list(AerpawExperiment.objects.order_by('name').values_list('uuid', 'experiment_state')), first)
+
+
+    def test_active_canonical_numbers_are_unique(self):
+        with mock.patch('portal.apps.operations.management.commands.seed_load_data.MAX_CANONICAL_NUMBER', 20):
+            self.seed()
+        active = list(CanonicalNumber.objects.filter(is_deleted=False).values_list('canonical_number', flat=True))
+        self.assertEqual(sorted(active), list(range(1, 21)))
+        self.assertEqual(AerpawExperiment.objects.filter(is_deleted=True, is_retired=True).count(), 10)
+        self.assertFalse(AerpawExperiment.objects.filter(is_deleted=True, canonical_number__is_deleted=False).exists())
+
+    def test_allocation_after_seeding(self):
+        self.seed()
+        self.assertEqual(get_current_canonical_number(), 31)
+        self.assertEqual(allocate_canonical_number().canonical_number, 31)
+        self.seed('--flush')
+        # the seeded numbers are reissued once the sequence is used up
+        self.assertEqual(FreeCanonicalNumber.objects.count(), 30)
+        self.assertEqual(allocate_canonical_number().canonical_number, 32)
+
+    def test_allocation_after_seeding_every_number(self):
+        with mock.patch('portal.apps.operations.management.commands.seed_load_data.MAX_CANONICAL_NUMBER', 30):
+            self.seed()
+            self.assertEqual(CanonicalNumberSequence.objects.get().next_number, 31)
+            self.assertFalse(FreeCanonicalNumber.objects.exists())
+            self.seed('--flush')
+            self.assertEqual(FreeCanonicalNumber.objects.count(), 30)
+
+class BenchmarkListSerializersTestCase(TestCase):
+    fixtures = ['aerpaw_roles']
+
+    def test_projection_rows_match_serializer_rows(self):
+        # the command fails when a projection emits different rows than the serializer path
+        out = StringIO()
+        call_command('benchmark_list_serializers', '--rows=40', '--repeat=1', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 10)
+        self.assertTrue(all(line.split()[1] == '40' for line in lines[1:]), out.getvalue())
+        # the seeded dataset is rolled back
+        self.assertFalse(AerpawExperiment.objects.exists())
+
+
+class CanonicalNumberIndexTestCase(IndexScanTestCase):
+
+    def test_canonical_number_lookup(self):
+        self.assertIndexScan(
+            CanonicalNumber.objects.filter(canonical_number=1234, is_deleted=False), 'canonical_number_deleted_idx')
+
+
+class CanonicalNumberAsyncReadPathTestCase(AsyncReadPathTestCase):
+    """
+    /api/async/p-canonical-experiment-number/current returns the same data as the synchronous endpoint
+    """
+
+    def test_canonical_number_current(self):
+        user = create_user('experimenter@example.org', AerpawRolesEnum.EXPERIMENTER.value)
+        path = '/api/p-canonical-experiment-number/current'
+        async_path = '/api/async/p-canonical-experiment-number/current'
+        self.assertEqual(self.assertSameResponse(user, path, async_path), {'current_canonical_number': 1})
+        CanonicalNumber.objects.bulk_create([CanonicalNumber(canonical_number=i) for i in (1, 2, 4)])
+        self.assertEqual(self.assertSameResponse(user, path, async_path), {'current_canonical_number': 3})
+
+    def test_benchmark_async_api(self):
+        call_command('seed_load_data', '--users=20', '--projects=5', '--experiments=30', '--resources=5',
+                     '--sessions=0', stdout=StringIO())
+        out = StringIO()
+        call_command('benchmark_async_api', '--clients=4', '--requests=3', '--workers=2', stdout=out, stderr=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split()[:4] for line in lines[2:]], [
+            [endpoint, path, '12', '0'] for endpoint in ['experiments', 'experiment', 'resources', 'canonical-number']
+            for path in ['sync', 'async']], out.getvalue())
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:30
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # separate from the back-fill: PostgreSQL cannot ALTER a table with pending deferred foreign key checks
+
+    dependencies = [
+        ('profiles', '0002_audit_user_backfill'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='aerpawuserprofile',
+            name='created_by',
+        ),
+        migrations.RemoveField(
+            model_name='aerpawuserprofile',
+            name='modified_by',
+        ),
+        migrations.RemoveField(
+            model_name='publiccredentials',
+            name='created_by',
+        ),
+        migrations.RemoveField(
+            model_name='publiccredentials',
+            name='modified_by',
+        ),
+        migrations.RenameField(
+            model_name='aerpawuserprofile',
+            old_name='created_by_user',
+            new_name='created_by',
+        ),
+        migrations.RenameField(
+            model_name='aerpawuserprofile',
+            old_name='modified_by_user',
+            new_name='modified_by',
+        ),
+        migrations.RenameField(
+            model_name='publiccredentials',
+            old_name='created_by_user',
+            new_name='created_by',
+        ),
+        migrations.RenameField(
+            model_name='publiccredentials',
+            old_name='modified_by_user',
+            new_name='modified_by',
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:00
+
+from datetime import datetime, timezone
+
+import jwt
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def token_claims(token: str) -> dict:
+    """
+    jti / iat / exp of a stored token (its signature was verified when it was issued)
+    """
+    try:
+        claims = jwt.decode(token, options={'verify_signature': False})
+    except jwt.InvalidTokenError:
+        return {}
+    return {
+        'jti': claims.get('jti'),
+        'issued_at': datetime.fromtimestamp(claims['iat'], tz=timezone.utc) if 'iat' in claims else None,
+        'expires_at': datetime.fromtimestamp(claims['exp'], tz=timezone.utc) if 'exp' in claims else None,
+    }
+
+
+def backfill(apps, schema_editor):
+    """
+    Token metadata columns of the stored tokens, in batches
+    """
+    AerpawUserProfile = apps.get_model('profiles', 'AerpawUserProfile')
+    fields = ['{0}_{1}'.format(prefix, name) for prefix in ['access_token', 'refresh_token']
+              for name in ['jti', 'issued_at', 'expires_at']]
+    profiles = AerpawUserProfile.objects.exclude(access_token__isnull=True, refresh_token__isnull=True).order_by('id')
+    last_id = 0
+    while True:
+        batch = list(profiles.filter(id__gt=last_id).only('id', 'access_token', 'refresh_token')[:BATCH_SIZE])
+        if not batch:
+            break
+        for profile in batch:
+            for prefix in ['access_token', 'refresh_token']:
+                token = getattr(profile, prefix)
+                for name, value in token_claims(token).items() if token else []:
+                    setattr(profile, '{0}_{1}'.format(prefix, name), value)
+        AerpawUserProfile.objects.bulk_update(batch, fields)
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0003_audit_user_fk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aerpawuserprofile',
+            name='access_token_expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='aerpawuserprofile',
+            name='access_token_issued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='aerpawuserprofile',
+            name='access_token_jti',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='aerpawuserprofile',
+            name='refresh_token_expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='aerpawuserprofile',
+            name='refresh_token_issued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='aerpawuserprofile',
+            name='refresh_token_jti',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -8,17 +8,30 @@ class AerpawUserProfile(BaseModel, AuditModelMixin):
     """
     User Profile
     - access_token
+    - access_token_expires_at
+    - access_token_issued_at
+    - access_token_jti
     - created (from AuditModelMixin)
     - created_by (from AuditModelMixin)
     - id (from Basemodel)
     - modified (from AuditModelMixin)
     - modified_by (from AuditModelMixin)
     - refresh_token
+    - refresh_token_expires_at
+    - refresh_token_issued_at
+    - refresh_token_jti
     - uuid
     """
 
     access_token = models.TextField(null=True, blank=True)
     refresh_token = models.TextField(null=True, blank=True)
+    # claims of the issued tokens (portal.apps.users.tokens.token_fields): revocation by jti, expiry without decoding
+    access_token_jti = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    access_token_issued_at = models.DateTimeField(null=True, blank=True)
+    access_token_expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    refresh_token_jti = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    refresh_token_issued_at = models.DateTimeField(null=True, blank=True)
+    refresh_token_expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
     uuid = models.CharField(max_length=255, primary_key=False, editable=False)
 
     def __str__(self):
@@ -8,7 +8,13 @@ register = template.Library()
 
 
 @register.filter
-def token_expiry(token_jwt):
+def token_expiry(token_jwt, expires_at=None):
+    """
+    Expiry of a token: the stored expires_at column (e.g. token|token_expiry:expires_at), the token is only decoded
+    for profiles issued before the column existed
+    """
+    if expires_at:
+        return expires_at
     token_json = jwt.decode(
         jwt=token_jwt,
         key=os.getenv('DJANGO_SECRET_KEY'),
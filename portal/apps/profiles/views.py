@@ -2,7 +2,7 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
 
-from portal.apps.users.api.viewsets import UserViewSet
+from portal.apps.users import services
 from portal.apps.users.oidc_users import get_tokens_for_user, refresh_access_token_for_user
 from portal.server.settings import DEBUG
 
@@ -16,12 +16,10 @@ def profile(request):
     """
     message = None
     user = request.user
-    user_data = UserViewSet()
     if request.method == 'POST':
         try:
             if request.POST.get('display_name'):
-                request.data = {'display_name': request.POST.get('display_name')}
-                user_data.update(request, pk=user.id)
+                services.update_user(request.user, user.id, {'display_name': request.POST.get('display_name')})
             if request.POST.get('authorization_token'):
                 get_tokens_for_user(user)
             if request.POST.get('refresh_access_token'):
@@ -32,8 +30,8 @@ def profile(request):
                   'profile.html',
                   {
                       'user': user,
-                      'user_data': user_data.retrieve(request=request, pk=request.user.id).data,
-                      'user_tokens': user_data.tokens(request=request, pk=request.user.id).data,
+                      'user_data': services.get_user(request.user, request.user.id),
+                      'user_tokens': services.get_user_tokens(request.user, request.user.id),
                       'message': message,
                       'debug': DEBUG
                   })
@@ -1,11 +1,12 @@
 from rest_framework import serializers
 
+from portal.apps.mixins.projection import Projection
 from portal.apps.projects.models import AerpawProject, UserProject
 
 
 class UserProjectSerializer(serializers.ModelSerializer):
-    project_id = serializers.IntegerField(source='project.id')
-    user_id = serializers.IntegerField(source='user.id')
+    project_id = serializers.IntegerField()
+    user_id = serializers.IntegerField()
 
     class Meta:
         model = UserProject
@@ -23,7 +24,7 @@ class ProjectSerializerList(serializers.ModelSerializer):
 
 class ProjectSerializerDetail(serializers.ModelSerializer):
     created_date = serializers.DateTimeField(source='created')
-    last_modified_by = serializers.CharField(source='modified_by')
+    last_modified_by = serializers.PrimaryKeyRelatedField(source='modified_by', read_only=True)
     modified_date = serializers.DateTimeField(source='modified')
     project_id = serializers.IntegerField(source='id', read_only=True)
     project_membership = UserProjectSerializer(source='userproject_set', many=True)
@@ -32,3 +33,20 @@ class ProjectSerializerDetail(serializers.ModelSerializer):
         model = AerpawProject
         fields = ['created_date', 'description', 'is_deleted', 'is_public', 'last_modified_by', 'modified_date',
                   'name', 'project_creator', 'project_id', 'project_membership']
+
+
+# list endpoint projections: response field -> model field (values() rows are the response rows)
+USER_PROJECT_LIST_PROJECTION = Projection(
+    fields={'granted_by': 'granted_by', 'granted_date': 'granted_date', 'id': 'id', 'project_id': 'project_id',
+            'project_role': 'project_role', 'user_id': 'user_id'},
+    datetime_fields=('granted_date',)
+)
+
+PROJECT_LIST_PROJECTION = Projection(
+    fields={'created_date': 'created', 'description': 'description', 'is_public': 'is_public',
+            'is_project_creator': 'is_project_creator', 'is_project_member': 'is_project_member',
+            'is_project_owner': 'is_project_owner', 'name': 'name', 'project_creator': 'project_creator',
+            'project_id': 'id'},
+    datetime_fields=('created_date',),
+    nested={'membership': ('is_project_creator', 'is_project_member', 'is_project_owner')}
+)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ProjectsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'portal.apps.projects'
+
+    def ready(self):
+        # response cache invalidation
+        from portal.apps.projects import signals  # noqa: F401
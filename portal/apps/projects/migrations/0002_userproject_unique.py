@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:02
+
+from django.db import migrations, models
+
+
+def delete_duplicate_memberships(apps, schema_editor):
+    # keep the earliest grant of each (user, project, project_role)
+    UserProject = apps.get_model('projects', 'UserProject')
+    seen = set()
+    duplicates = []
+    for membership in UserProject.objects.order_by('id').values('id', 'user_id', 'project_id', 'project_role'):
+        key = (membership['user_id'], membership['project_id'], membership['project_role'])
+        if key in seen:
+            duplicates.append(membership['id'])
+        seen.add(key)
+    UserProject.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_memberships, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='userproject',
+            constraint=models.UniqueConstraint(fields=('user', 'project', 'project_role'), name='unique_user_project_role'),
+        ),
+    ]
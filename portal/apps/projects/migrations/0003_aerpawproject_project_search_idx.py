@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:40
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0002_userproject_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aerpawproject',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('name', 'description', config='simple'), name='project_search_idx'),
+        ),
+    ]
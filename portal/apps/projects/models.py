@@ -3,9 +3,13 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 
 from portal.apps.mixins.models import AuditModelMixin, BaseModel
+from portal.apps.mixins.search import search_index
 from portal.apps.profiles.models import AerpawUserProfile
 from portal.apps.users.models import AerpawUser
 
+# full-text search document
+PROJECT_SEARCH_FIELDS = ['name', 'description']
+
 
 class AerpawProject(BaseModel, AuditModelMixin, models.Model):
     """
@@ -43,12 +47,15 @@ class AerpawProject(BaseModel, AuditModelMixin, models.Model):
 
     class Meta:
         verbose_name = 'AERPAW Project'
+        indexes = [
+            search_index('project_search_idx', *PROJECT_SEARCH_FIELDS)
+        ]
 
     def __str__(self):
         return self.name
 
     def is_creator(self, user: AerpawUser) -> bool:
-        return user == self.project_creator
+        return user.id == self.project_creator_id
 
     def is_member(self, user: AerpawUser) -> bool:
         return UserProject.objects.filter(
@@ -95,3 +102,8 @@ class UserProject(BaseModel, models.Model):
         default=RoleType.PROJECT_MEMBER
     )
     user = models.ForeignKey(AerpawUser, related_name='project_user', on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'project', 'project_role'], name='unique_user_project_role')
+        ]
@@ -0,0 +1,390 @@
+from uuid import uuid4
+
+from django.db.models import BooleanField, Exists, ExpressionWrapper, OuterRef, Q
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from rest_framework.exceptions import PermissionDenied, ValidationError
+
+from portal.apps.experiments.api.serializers import ExperimentSerializerDetail
+from portal.apps.experiments.membership import get_membership_index, reset_membership_index, \
+    update_project_memberships
+from portal.apps.experiments.models import AerpawExperiment
+from portal.apps.mixins.cache import cached_data
+from portal.apps.mixins.search import search_filter, search_vector
+from portal.apps.mixins.services import Page, cursor_page
+from portal.apps.projects.api.serializers import PROJECT_LIST_PROJECTION, ProjectSerializerDetail
+from portal.apps.projects.models import AerpawProject, PROJECT_SEARCH_FIELDS, UserProject
+from portal.apps.projects.signals import project_cache_namespace
+from portal.apps.users.models import AerpawUser
+
+# constants
+PROJECT_MIN_NAME_LEN = 5
+PROJECT_MIN_DESC_LEN = 5
+PROJECT_ORDERING = ('name', 'id')
+PROJECT_ROLES = [('project_members', UserProject.RoleType.PROJECT_MEMBER),
+                 ('project_owners', UserProject.RoleType.PROJECT_OWNER)]
+
+
+def project_queryset(user: AerpawUser, search: str = None):
+    """
+    Projects the user can list: all for operators, otherwise public or joined projects (optional search)
+    """
+    if user.is_operator():
+        queryset = AerpawProject.objects.filter(is_deleted=False)
+    else:
+        queryset = AerpawProject.objects.filter(
+            Q(is_deleted=False) &
+            (Q(is_public=True) | Q(project_membership__email__in=[user.email]) | Q(project_creator=user))
+        )
+    if search:
+        queryset = search_filter(queryset, search_vector(*PROJECT_SEARCH_FIELDS), search)
+    return queryset.order_by('name').distinct()
+
+
+def project_list_queryset(user: AerpawUser, search: str = None):
+    """
+    project_queryset() with the user's membership flags as computed columns (see PROJECT_LIST_PROJECTION)
+    """
+    return project_queryset(user, search).annotate(
+        is_project_creator=ExpressionWrapper(Q(project_creator_id=user.id), output_field=BooleanField()),
+        is_project_member=Exists(UserProject.objects.filter(
+            project_id=OuterRef('pk'), user_id=user.id, project_role=UserProject.RoleType.PROJECT_MEMBER)),
+        is_project_owner=Exists(UserProject.objects.filter(
+            project_id=OuterRef('pk'), user_id=user.id, project_role=UserProject.RoleType.PROJECT_OWNER))
+    )
+
+
+def list_projects(user: AerpawUser, search: str = None, cursor: str = None) -> Page:
+    """
+    Cursor page of project rows (see PROJECT_LIST_PROJECTION) with an approximate count
+
+    Permission:
+    - user is_active
+    """
+    if not user.is_active:
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to GET /projects list")
+    return cursor_page(project_list_queryset(user, search), PROJECT_ORDERING, cursor, PROJECT_LIST_PROJECTION)
+
+
+def get_project_membership(user: AerpawUser, project: AerpawProject) -> dict:
+    """
+    Membership flags of the user in project (answered by the membership index)
+    """
+    membership_index = get_membership_index(user)
+    return {
+        'is_project_creator': membership_index.is_project_creator(project),
+        'is_project_member': membership_index.is_project_member(project),
+        'is_project_owner': membership_index.is_project_owner(project)
+    }
+
+
+def membership_rows(project_membership: list) -> dict:
+    """
+    project_members and project_owners as {granted_by, granted_date, user_id} rows
+    - project_membership: serialized project_membership of ProjectSerializerDetail
+    """
+    rows = {'project_members': [], 'project_owners': []}
+    for p in project_membership:
+        person = {
+            'granted_by': p.get('granted_by'),
+            'granted_date': str(p.get('granted_date')),
+            'user_id': p.get('user_id')
+        }
+        if p.get('project_role') == UserProject.RoleType.PROJECT_MEMBER:
+            rows['project_members'].append(person)
+        if p.get('project_role') == UserProject.RoleType.PROJECT_OWNER:
+            rows['project_owners'].append(person)
+    return rows
+
+
+def get_project(user: AerpawUser, pk) -> dict:
+    """
+    Project as single result
+    - created_date           - UTC timestamp
+    - description            - string
+    - is_public              - bool
+    - last_modified_by (fk)  - user_ID
+    - membership             - {is_project_creator, is_project_member, is_project_owner}
+    - modified_date          - UTC timestamp
+    - name                   - string
+    - project_creator (fk)   - user_ID
+    - project_id (pk)        - integer
+    - project_members (fk)   - array of integer
+    - project_owners (fk)    - array of integer
+
+    Permission:
+    - user is_creator OR
+    - user is_project_member OR
+    - user is_project_owner OR
+    - user is_operator
+    - user is_active: public fields of public projects only
+    """
+    if not str(pk).isdigit():
+        raise Http404
+
+    def build():
+        project = get_object_or_404(AerpawProject.objects.all(), pk=pk)
+        du = dict(ProjectSerializerDetail(project).data)
+        project_data = {
+            'created_date': str(du.get('created_date')),
+            'description': du.get('description'),
+            'is_public': du.get('is_public'),
+            'last_modified_by': du.get('last_modified_by'),
+            'membership': None,
+            'modified_date': str(du.get('modified_date')),
+            'name': du.get('name'),
+            'project_creator': du.get('project_creator'),
+            'project_id': du.get('project_id'),
+            **membership_rows(du.get('project_membership'))
+        }
+        if project.is_deleted:
+            project_data['is_deleted'] = du.get('is_deleted')
+        return project_data
+
+    # the project detail is cached, the caller's membership is added to it per call
+    # - users appear as ids only (resolved per request): user changes do not invalidate it
+    du = cached_data(user, ('project', int(pk)), (project_cache_namespace(int(pk)),), build)
+    project = AerpawProject(id=du.get('project_id'), project_creator_id=du.get('project_creator'))
+    membership = get_project_membership(user, project)
+    if get_membership_index(user).can_view_project(project):
+        return dict(du, membership=membership)
+    elif user.is_active:
+        if not du.get('is_public'):
+            return {}
+        project_data = {
+            'created_date': du.get('created_date'),
+            'description': du.get('description'),
+            'is_public': du.get('is_public'),
+            'membership': membership,
+            'name': du.get('name'),
+            'project_creator': du.get('project_creator'),
+            'project_id': du.get('project_id')
+        }
+        if 'is_deleted' in du:
+            project_data['is_deleted'] = du.get('is_deleted')
+        return project_data
+    else:
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to GET /projects/{0} details".format(pk))
+
+
+def create_project(user: AerpawUser, data) -> AerpawProject:
+    """
+    Create a project, the creator becomes its first project_owner
+    - description, is_public, name
+
+    Permission:
+    - user is_pi
+    """
+    if not user.is_pi():
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to POST /projects")
+    # validate description
+    description = data.get('description', None)
+    if not description or len(description) < PROJECT_MIN_DESC_LEN:
+        raise ValidationError(
+            detail="description:  must be at least {0} chars long".format(PROJECT_MIN_DESC_LEN))
+    # validate is_pubic
+    is_public = str(data.get('is_public')).casefold() == 'true'
+    # validate name
+    name = data.get('name', None)
+    if not name or len(name) < PROJECT_MIN_NAME_LEN:
+        raise ValidationError(
+            detail="name: must be at least {0} chars long".format(PROJECT_MIN_NAME_LEN))
+    # create project
+    project = AerpawProject()
+    project.created_by = user
+    project.project_creator = user
+    project.description = description
+    project.is_public = is_public
+    project.modified_by = user
+    project.name = name
+    project.uuid = uuid4()
+    project.save()
+    # set creator as project_owner
+    membership = UserProject()
+    membership.granted_by = user
+    membership.project = project
+    membership.project_role = UserProject.RoleType.PROJECT_OWNER
+    membership.user = user
+    membership.save()
+    reset_membership_index(user)
+    return project
+
+
+def update_project(user: AerpawUser, pk, data) -> AerpawProject:
+    """
+    Update an existing project (only the fields present in data)
+    - description, is_public, name
+
+    Permission:
+    - user is_project_creator OR
+    - user is_project_owner
+    """
+    project = get_object_or_404(AerpawProject.objects.all(), pk=pk)
+    membership_index = get_membership_index(user)
+    if project.is_deleted or not \
+            (membership_index.is_project_creator(project) or membership_index.is_project_owner(project)):
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to PUT/PATCH /projects/{0} details".format(pk))
+    modified = False
+    # check for description
+    if data.get('description', None):
+        if len(data.get('description')) < PROJECT_MIN_DESC_LEN:
+            raise ValidationError(
+                detail="description:  must be at least {0} chars long".format(PROJECT_MIN_DESC_LEN))
+        project.description = data.get('description')
+        modified = True
+    # check for is_public
+    if str(data.get('is_public')).casefold() in ['true', 'false']:
+        is_public = str(data.get('is_public')).casefold() == 'true'
+        project.is_public = is_public
+        modified = True
+    # check for name
+    if data.get('name', None):
+        if len(data.get('name')) < PROJECT_MIN_NAME_LEN:
+            raise ValidationError(
+                detail="name: must be at least {0} chars long".format(PROJECT_MIN_NAME_LEN))
+        project.name = data.get('name')
+        modified = True
+    # save if modified
+    if modified:
+        project.modified_by = user
+        project.save()
+    return project
+
+
+def delete_project(user: AerpawUser, pk) -> None:
+    """
+    Soft delete an existing project
+
+    Permission:
+    - user is_project_creator
+    """
+    project = get_object_or_404(AerpawProject.objects.all(), pk=pk)
+    if not get_membership_index(user).is_project_creator(project):
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to DELETE /projects/{0}".format(pk))
+    project.is_deleted = True
+    project.modified_by = user
+    project.save()
+
+
+def get_project_experiments(user: AerpawUser, pk) -> list:
+    """
+    Experiments of the project
+    - canonical_number       - int
+    - created_date           - string
+    - description            - string
+    - experiment_creator     - user_ID
+    - experiment_id          - int
+    - experiment_uuid        - string
+    - is_canonical           - boolean
+    - is_retired             - boolean
+    - name                   - string
+
+    Permission:
+    - user is_project_creator OR
+    - user is_project_member OR
+    - user is_project_owner OR
+    - user is_operator
+    """
+    project = get_object_or_404(AerpawProject.objects.all(), pk=pk)
+    if not get_membership_index(user).can_view_project(project):
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to GET /projects/{0}/experiments".format(pk))
+    experiments = AerpawExperiment.objects.filter(
+        project__id=project.id
+    ).select_related('canonical_number').prefetch_related(
+        'resources', 'userexperiment_set').order_by('name').distinct()
+    experiment_rows = []
+    for u in ExperimentSerializerDetail(experiments, many=True).data:
+        du = dict(u)
+        experiment_rows.append(
+            {
+                'canonical_number': du.get('canonical_number'),
+                'created_date': du.get('created_date'),
+                'description': du.get('description'),
+                'experiment_creator': du.get('experiment_creator'),
+                'experiment_id': du.get('experiment_id'),
+                'experiment_uuid': du.get('experiment_uuid'),
+                'is_canonical': du.get('is_canonical'),
+                'is_retired': du.get('is_retired'),
+                'name': du.get('name')
+            }
+        )
+    return experiment_rows
+
+
+def project_membership(user: AerpawUser, pk, data=None) -> dict:
+    """
+    Members and owners of the project, data (when given) replaces them first
+    - project_members        - array of user ids
+    - project_owners         - array of user ids
+
+    Permission:
+    - user is_project_creator OR
+    - user is_project_owner
+    """
+    project = get_object_or_404(project_queryset(user), pk=pk)
+    membership_index = get_membership_index(user)
+    if not (membership_index.is_project_creator(project) or membership_index.is_project_owner(project)):
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to GET,PUT,PATCH /projects/{0}/membership".format(pk))
+    if data is not None:
+        changes = []
+        for key, project_role in PROJECT_ROLES:
+            if data.get(key) or isinstance(data.get(key), list):
+                user_ids = data.get(key)
+                if isinstance(user_ids, list) and all([isinstance(item, int) for item in user_ids]):
+                    changes.append((project, project_role, user_ids))
+        update_project_memberships(changes, granted_by=user)
+        reset_membership_index(user)
+    return membership_rows(ProjectSerializerDetail(project).data.get('project_membership'))
+
+
+def batch_project_membership(user: AerpawUser, batch) -> list:
+    """
+    Update the members / owners of many projects in one atomic call
+    - batch: array of {project_id, project_members, project_owners}, missing keys are left unchanged
+    - returns [{project_id, project_members, project_owners}] with the resulting user ids
+
+    Permission:
+    - user is_project_creator OR
+    - user is_project_owner (of every project in the batch)
+    """
+    if not isinstance(batch, list) or not all([isinstance(item, dict) for item in batch]):
+        raise ValidationError(
+            detail="projects: must provide an array of {project_id, project_members, project_owners}")
+    try:
+        project_ids = [int(item.get('project_id')) for item in batch]
+    except Exception as exc:
+        raise ValidationError(
+            detail="project_id: {0}".format(exc))
+    projects = project_queryset(user).in_bulk(project_ids)
+    membership_index = get_membership_index(user)
+    changes = []
+    for item, project_id in zip(batch, project_ids):
+        project = projects.get(project_id)
+        if not project or not (
+                membership_index.is_project_creator(project) or membership_index.is_project_owner(project)):
+            raise PermissionDenied(
+                detail="PermissionDenied: unable to POST /projects/membership for project {0}".format(project_id))
+        for key, project_role in PROJECT_ROLES:
+            if key in item:
+                user_ids = item.get(key)
+                if not isinstance(user_ids, list) or not all([isinstance(pk, int) for pk in user_ids]):
+                    raise ValidationError(
+                        detail="{0}: must be an array of user ids for project {1}".format(key, project_id))
+                changes.append((project, project_role, user_ids))
+    results = update_project_memberships(changes, granted_by=user)
+    reset_membership_index(user)
+    project_rows = []
+    for project_id in dict.fromkeys(project_ids):
+        project_data = {'project_id': project_id}
+        for key, project_role in PROJECT_ROLES:
+            if (project_id, project_role) in results:
+                project_data[key] = results[(project_id, project_role)]
+        project_rows.append(project_data)
+    return project_rows
@@ -0,0 +1,39 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from portal.apps.mixins.cache import invalidate, invalidate_all
+from portal.apps.projects.models import AerpawProject, UserProject
+
+
+def project_cache_namespace(project_id: int) -> str:
+    """
+    Response cache namespace of one project (project detail and its membership)
+    """
+    return 'project:{0}'.format(project_id)
+
+
+def invalidate_projects(project_ids) -> None:
+    invalidate(*[project_cache_namespace(project_id) for project_id in sorted(set(project_ids))])
+
+
+@receiver([post_save, post_delete], sender=AerpawProject)
+def invalidate_project(sender, instance, **kwargs):
+    invalidate_projects([instance.id])
+
+
+@receiver([post_save, post_delete], sender=UserProject)
+def invalidate_user_project(sender, instance, **kwargs):
+    invalidate_projects([instance.project_id])
+
+
+@receiver(m2m_changed, sender=AerpawProject.project_membership.through)
+def invalidate_project_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+    if not reverse:
+        invalidate_projects([instance.id])
+    elif pk_set:
+        invalidate_projects(pk_set)
+    else:
+        # a user's projects were cleared: the project ids are no longer known
+        invalidate_all()
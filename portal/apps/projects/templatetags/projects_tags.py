@@ -1,5 +1,6 @@
 from django import template
 
+from portal.apps.mixins.identity import identity_map
 from portal.apps.projects.models import AerpawProject
 
 register = template.Library()
@@ -8,8 +9,8 @@ register = template.Library()
 @register.filter
 def id_to_project_name(project_id):
     try:
-        project = AerpawProject.objects.get(pk=int(project_id))
-        return project.name
+        project = identity_map().get(AerpawProject, project_id)
+        return project.name if project else 'not found'
     except Exception as exc:
         print(exc)
         return 'not found'
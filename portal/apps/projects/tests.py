@@ -1 +1,273 @@
-# Create your tests here.
+from uuid import uuid4
+
+from django.contrib.auth.models import Group
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from portal.apps.experiments.membership import get_membership_index
+from portal.apps.experiments.models import AerpawExperiment, UserExperiment
+from portal.apps.mixins.testing import IndexScanTestCase, QueryBudgetTestCase, audit_fields, create_user
+from portal.apps.operations.models import CanonicalNumber
+from portal.apps.projects.models import AerpawProject, UserProject
+from portal.apps.users.models import AerpawRolesEnum, AerpawUser
+
+
+class MembershipIndexTestCase(TestCase):
+    """
+    Membership checks cost a fixed number of queries per request
+    """
+    fixtures = ['aerpaw_roles']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = AerpawUser.objects.create_user(username='pi@example.org', email='pi@example.org')
+        cls.user.groups.add(Group.objects.get(name=AerpawRolesEnum.PI.value))
+        other = AerpawUser.objects.create_user(username='other@example.org', email='other@example.org')
+        cls.projects = AerpawProject.objects.bulk_create([
+            AerpawProject(
+                name='project-{0:02d}'.format(i), description='project', uuid=str(uuid4()),
+                project_creator=cls.user if i % 4 == 0 else other,
+                created_by=other, modified_by=other)
+            for i in range(20)
+        ])
+        UserProject.objects.bulk_create(
+            [UserProject(project=p, user=cls.user, granted_by=other,
+                         project_role=UserProject.RoleType.PROJECT_MEMBER) for p in cls.projects[1::4]] +
+            [UserProject(project=p, user=cls.user, granted_by=other,
+                         project_role=UserProject.RoleType.PROJECT_OWNER) for p in cls.projects[2::4]]
+        )
+
+    def test_index_answers_from_memory(self):
+        user = AerpawUser.objects.get(pk=self.user.id)
+        membership_index = get_membership_index(user)
+        with self.assertNumQueries(2):
+            for i, project in enumerate(self.projects):
+                self.assertEqual(membership_index.is_project_creator(project), i % 4 == 0)
+                self.assertEqual(membership_index.is_project_member(project), i % 4 == 1)
+                self.assertEqual(membership_index.is_project_owner(project), i % 4 == 2)
+                self.assertEqual(membership_index.can_view_project(project), i % 4 != 3)
+        self.assertIs(get_membership_index(user), membership_index)
+
+    def test_retrieve_query_count(self):
+        client = APIClient()
+        client.force_authenticate(user=AerpawUser.objects.get(pk=self.user.id))
+        with self.assertNumQueries(5):
+            response = client.get('/api/projects/{0}'.format(self.projects[2].id))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['membership']['is_project_owner'])
+        # cached project detail: ETag, the caller's roles and membership index only
+        client.force_authenticate(user=AerpawUser.objects.get(pk=self.user.id))
+        with self.assertNumQueries(3):
+            self.assertEqual(client.get('/api/projects/{0}'.format(self.projects[2].id)).data, response.data)
+        response = client.get('/api/projects/{0}'.format(self.projects[3].id))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {})
+
+
+class ProjectEndpointBudgetTestCase(QueryBudgetTestCase):
+    """
+    Query and wall-clock budgets for /projects and /user-project
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pi = create_user('pi@example.org', AerpawRolesEnum.EXPERIMENTER.value, AerpawRolesEnum.PI.value)
+        cls.operator = create_user('operator@example.org', AerpawRolesEnum.OPERATOR.value)
+        cls.members = [create_user('member{0}@example.org'.format(i), AerpawRolesEnum.EXPERIMENTER.value)
+                       for i in range(10)]
+        cls.projects = [cls.create_project(i) for i in range(3)]
+        cls.project = cls.projects[0]
+
+    @classmethod
+    def create_project(cls, i: int) -> AerpawProject:
+        project = AerpawProject.objects.create(
+            name='project-{0:02d}'.format(i), description='project', project_creator=cls.pi, **audit_fields(cls.pi))
+        UserProject.objects.create(
+            project=project, user=cls.pi, granted_by=cls.pi, project_role=UserProject.RoleType.PROJECT_OWNER)
+        cls.create_experiment(project, i)
+        return project
+
+    @classmethod
+    def create_experiment(cls, project: AerpawProject, i: int) -> AerpawExperiment:
+        canonical_number = CanonicalNumber.objects.create(canonical_number=100 + i)
+        experiment = AerpawExperiment.objects.create(
+            name='experiment-{0:02d}'.format(i), description='experiment', project=project,
+            canonical_number=canonical_number, experiment_creator=cls.pi, **audit_fields(cls.pi))
+        UserExperiment.objects.create(experiment=experiment, user=cls.pi, granted_by=cls.pi)
+        return experiment
+
+    def grow_projects(self):
+        for i in range(3, 10):
+            self.create_project(i)
+
+    def grow_project(self):
+        member_ids = set(self.project.userproject_set.values_list('user_id', flat=True))
+        UserProject.objects.bulk_create([
+            UserProject(project=self.project, user=u, granted_by=self.pi,
+                        project_role=UserProject.RoleType.PROJECT_MEMBER)
+            for u in self.members if u.id not in member_ids
+        ])
+        for i in range(3, 10):
+            self.create_experiment(self.project, i)
+
+    def test_projects(self):
+        path = '/api/projects/{0}'.format(self.project.id)
+        self.assertQueryBudget(self.pi, 'get', '/api/projects', max_queries=4, max_ms=250)
+        self.assertQueryBudget(self.pi, 'get', path, max_queries=5, max_ms=250)
+        self.assertQueryBudget(self.pi, 'get', path, max_queries=3, max_ms=250)
+        self.assertQueryBudget(self.pi, 'put', path, data={'description': 'updated project'},
+                               max_queries=7, max_ms=500)
+        self.assertNoNPlusOne(self.pi, '/api/projects', self.grow_projects)
+        self.assertNoNPlusOne(self.pi, path, self.grow_project)
+
+    def test_project_experiments(self):
+        path = '/api/projects/{0}/experiments'.format(self.project.id)
+        self.assertQueryBudget(self.pi, 'get', path, max_queries=4, max_ms=250)
+        self.assertNoNPlusOne(self.pi, path, self.grow_project)
+
+    def test_project_membership(self):
+        path = '/api/projects/{0}/membership'.format(self.project.id)
+        self.assertQueryBudget(self.pi, 'get', path, max_queries=3, max_ms=250)
+        self.assertQueryBudget(self.pi, 'put', path, data={'project_members': [u.id for u in self.members[:5]]},
+                               max_queries=8, max_ms=500)
+        self.assertNoNPlusOne(self.pi, path, self.grow_project)
+
+    def test_user_project(self):
+        membership = UserProject.objects.filter(project=self.project).first()
+        self.assertQueryBudget(self.operator, 'get', '/api/user-project', max_queries=3, max_ms=250)
+        self.assertQueryBudget(self.operator, 'get', '/api/user-project/{0}'.format(membership.id),
+                               max_queries=2, max_ms=250)
+        self.assertNoNPlusOne(self.operator, '/api/user-project', self.grow_projects)
+
+    def test_project_pages(self):
+        path = '/projects/{0}'.format(self.project.id)
+        self.assertPageBudget(self.pi, path, max_queries=12, max_ms=500)
+        self.grow_project()
+        self.assertPageBudget(self.pi, path, max_queries=12, max_ms=500)
+
+
+class BulkMembershipTestCase(QueryBudgetTestCase):
+    """
+    Set based membership updates: onboarding a 300 student class takes a fixed number of queries
+    """
+    class_size = 300
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pi = create_user('pi@example.org', AerpawRolesEnum.EXPERIMENTER.value, AerpawRolesEnum.PI.value)
+        cls.other_pi = create_user('other@example.org', AerpawRolesEnum.EXPERIMENTER.value, AerpawRolesEnum.PI.value)
+        cls.no_role = create_user('norole@example.org')
+        cls.students = AerpawUser.objects.bulk_create([
+            AerpawUser(username='student{0}@example.org'.format(i), email='student{0}@example.org'.format(i),
+                       display_name='student {0}'.format(i), uuid=str(uuid4()))
+            for i in range(cls.class_size)
+        ])
+        experimenter = Group.objects.get(name=AerpawRolesEnum.EXPERIMENTER.value)
+        AerpawUser.groups.through.objects.bulk_create([
+            AerpawUser.groups.through(aerpawuser_id=u.id, group_id=experimenter.id) for u in cls.students
+        ])
+        cls.projects = [cls.create_project('class-{0}'.format(i), cls.pi) for i in range(3)]
+        cls.other_project = cls.create_project('other', cls.other_pi)
+
+    @classmethod
+    def create_project(cls, name: str, owner: AerpawUser) -> AerpawProject:
+        project = AerpawProject.objects.create(
+            name=name, description='project', project_creator=owner, **audit_fields(owner))
+        UserProject.objects.create(
+            project=project, user=owner, granted_by=owner, project_role=UserProject.RoleType.PROJECT_OWNER)
+        return project
+
+    def members(self, project: AerpawProject, project_role: str) -> set:
+        return set(UserProject.objects.filter(
+            project=project, project_role=project_role).values_list('user_id', flat=True))
+
+    def test_onboard_class(self):
+        path = '/api/projects/{0}/membership'.format(self.projects[0].id)
+        student_ids = [u.id for u in self.students]
+        self.assertQueryBudget(self.pi, 'put', path, data={'project_members': student_ids + [self.no_role.id, 0]},
+                               max_queries=8, max_ms=1000)
+        self.assertEqual(self.members(self.projects[0], UserProject.RoleType.PROJECT_MEMBER), set(student_ids))
+        # removed rows are selected for their post_delete (response cache) signals before the delete
+        self.assertQueryBudget(self.pi, 'put', path, data={'project_members': student_ids[:100]},
+                               max_queries=9, max_ms=1000)
+        self.assertEqual(self.members(self.projects[0], UserProject.RoleType.PROJECT_MEMBER), set(student_ids[:100]))
+
+    def test_membership_invalidates_cached_project(self):
+        path = '/api/projects/{0}'.format(self.projects[0].id)
+        client = self.api_client(self.pi)
+        self.assertEqual(client.get(path).data['project_members'], [])
+        client.put(path + '/membership', {'project_members': [self.students[0].id]}, format='json')
+        self.assertEqual([m['user_id'] for m in client.get(path).data['project_members']], [self.students[0].id])
+        client.post('/api/projects/membership', {'projects': [
+            {'project_id': self.projects[0].id, 'project_members': []}]}, format='json')
+        self.assertEqual(client.get(path).data['project_members'], [])
+
+    def test_renamed_member_is_not_cached(self):
+        student = self.students[0]
+        self.api_client(self.pi).put('/api/projects/{0}/membership'.format(self.projects[0].id),
+                                     {'project_members': [student.id]}, format='json')
+        self.client.force_login(self.pi)
+        path = '/projects/{0}'.format(self.projects[0].id)
+        self.assertContains(self.client.get(path), student.username)
+        AerpawUser.objects.filter(pk=student.pk).update(username='renamed@example.org')
+        response = self.client.get(path)
+        self.assertContains(response, 'renamed@example.org')
+        self.assertNotContains(response, student.username)
+
+    def test_membership_changes_etag(self):
+        path = '/api/projects/{0}'.format(self.projects[0].id)
+        client = self.api_client(self.pi)
+        etag = client.get(path)['ETag']
+        self.assertEqual(client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # the response of another caller has its own ETag
+        self.assertNotEqual(self.api_client(self.other_pi).get(path).get('ETag'), etag)
+        client.put(path + '/membership', {'project_members': [self.students[0].id]}, format='json')
+        response = client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_batch_membership(self):
+        student_ids = [u.id for u in self.students]
+        data = {'projects': [
+            {'project_id': project.id, 'project_members': student_ids[i * 100:(i + 1) * 100]}
+            for i, project in enumerate(self.projects)
+        ]}
+        data['projects'][0]['project_owners'] = [self.pi.id, self.other_pi.id]
+        response = self.assertQueryBudget(self.pi, 'post', '/api/projects/membership', data=data,
+                                          max_queries=7, max_ms=1000)
+        for i, project in enumerate(self.projects):
+            class_ids = student_ids[i * 100:(i + 1) * 100]
+            self.assertEqual(self.members(project, UserProject.RoleType.PROJECT_MEMBER), set(class_ids))
+            self.assertEqual(response.data['projects'][i]['project_members'], sorted(class_ids))
+        self.assertEqual(self.members(self.projects[0], UserProject.RoleType.PROJECT_OWNER),
+                         {self.pi.id, self.other_pi.id})
+        self.assertEqual(self.members(self.projects[1], UserProject.RoleType.PROJECT_OWNER), {self.pi.id})
+
+    def test_batch_membership_is_all_or_nothing(self):
+        data = {'projects': [
+            {'project_id': self.projects[0].id, 'project_members': [self.students[0].id]},
+            {'project_id': self.other_project.id, 'project_members': [self.students[0].id]}
+        ]}
+        response = self.api_client(self.pi).post('/api/projects/membership', data, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.members(self.projects[0], UserProject.RoleType.PROJECT_MEMBER), set())
+        data = {'projects': [{'project_id': self.projects[0].id, 'project_members': ['a']}]}
+        response = self.api_client(self.pi).post('/api/projects/membership', data, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class UserProjectIndexTestCase(IndexScanTestCase):
+
+    def test_membership_lookup(self):
+        membership = UserProject.objects.order_by('id').last()
+        self.assertIndexScan(
+            UserProject.objects.filter(user_id=membership.user_id, project_id=membership.project_id,
+                                       project_role=membership.project_role), 'unique_user_project_role')
+
+    def test_project_role_lookup(self):
+        # a project has few memberships: the project_id foreign key index is sufficient
+        membership = UserProject.objects.order_by('id').last()
+        self.assertIndexScan(
+            UserProject.objects.filter(project_id=membership.project_id,
+                                       project_role=UserProject.RoleType.PROJECT_OWNER),
+            'projects_userproject_project_id')
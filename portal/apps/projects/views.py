@@ -1,15 +1,14 @@
-from urllib.parse import parse_qs, urlparse
-
 from django.contrib.auth.decorators import login_required
-from django.http import HttpRequest, QueryDict
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views.decorators.csrf import csrf_exempt
-from rest_framework.request import Request
 
-from portal.apps.projects.api.viewsets import ProjectViewSet
+from portal.apps.experiments.membership import get_membership_index
+from portal.apps.mixins.identity import identity_map, load_ids
+from portal.apps.projects import services
 from portal.apps.projects.forms import ProjectCreateForm, ProjectMembershipForm
 from portal.apps.projects.models import AerpawProject
-from portal.server.settings import DEBUG, REST_FRAMEWORK
+from portal.apps.users.models import AerpawUser
+from portal.server.settings import DEBUG
 
 
 @csrf_exempt
@@ -18,74 +17,36 @@ def project_list(request):
     message = None
     # TODO: request to join project
     try:
-        # check for query parameters
-        current_page = 1
-        search_term = None
-        data_dict = {}
-
-        api_request = Request(request=HttpRequest())
-        api_request.user = request.user
-        api_request.method = 'PUT'
-
-        if request.GET.get('search'):
-            api_request.query_params.update({'search': request.GET.get('search')})
-            search_term = request.GET.get('search')
-        if request.GET.get('page'):
-            api_request.query_params.update({'page': request.GET.get('page')})
-            current_page = int(request.GET.get('page'))
-        request.query_params = QueryDict('', mutable=True)
-        request.query_params.update(data_dict)
-        p = ProjectViewSet(request=api_request)
-        projects = p.list(request=api_request)
-        # get prev, next and item range
-        next_page = None
-        prev_page = None
-        count = 0
-        min_range = 0
-        max_range = 0
-        if projects.data:
-            projects = dict(projects.data)
-            prev_url = projects.get('previous', None)
-            if prev_url:
-                prev_dict = parse_qs(urlparse(prev_url).query)
-                try:
-                    prev_page = prev_dict['page'][0]
-                except Exception as exc:
-                    print(exc)
-                    prev_page = 1
-            next_url = projects.get('next', None)
-            if next_url:
-                next_dict = parse_qs(urlparse(next_url).query)
-                try:
-                    next_page = next_dict['page'][0]
-                except Exception as exc:
-                    print(exc)
-                    next_page = 1
-            count = int(projects.get('count'))
-            min_range = int(current_page - 1) * int(REST_FRAMEWORK['PAGE_SIZE']) + 1
-            max_range = int(current_page - 1) * int(REST_FRAMEWORK['PAGE_SIZE']) + int(REST_FRAMEWORK['PAGE_SIZE'])
-            if max_range > count:
-                max_range = count
-        item_range = '{0} - {1}'.format(str(min_range), str(max_range))
+        # cursor pagination with an approximate count
+        search_term = request.GET.get('search') or None
+        projects = services.list_projects(request.user, search=search_term, cursor=request.GET.get('cursor'))
+        next_cursor = projects.next_cursor
+        prev_cursor = projects.previous_cursor
+        count = projects.count or 0
+        count_is_approximate = projects.count_is_approximate
+        item_count = len(projects)
+        load_ids(AerpawUser, projects.results, 'project_creator')
     except Exception as exc:
         message = exc
         projects = None
-        item_range = None
-        next_page = None
-        prev_page = None
+        item_count = 0
+        next_cursor = None
+        prev_cursor = None
         search_term = None
         count = 0
+        count_is_approximate = False
     return render(request,
                   'project_list.html',
                   {
                       'user': request.user,
                       'projects': projects,
-                      'item_range': item_range,
+                      'item_count': item_count,
                       'message': message,
-                      'next_page': next_page,
-                      'prev_page': prev_page,
+                      'next_cursor': next_cursor,
+                      'prev_cursor': prev_cursor,
                       'search': search_term,
                       'count': count,
+                      'count_is_approximate': count_is_approximate,
                       'debug': DEBUG
                   })
 
@@ -93,19 +54,21 @@ def project_list(request):
 @csrf_exempt
 @login_required
 def project_detail(request, project_id):
-    p = ProjectViewSet(request=request)
     message = None
     try:
         if request.method == "POST":
             if request.POST.get('delete-project') == "true":
-                project = p.destroy(request=request, pk=project_id).data
+                services.delete_project(request.user, project_id)
                 return redirect('project_list')
-        project = p.retrieve(request=request, pk=project_id).data
+        project = services.get_project(request.user, project_id)
         if project.get('membership').get('is_project_creator') or project.get('membership').get('is_project_owner') or \
                 project.get('membership').get('is_project_member'):
-            experiments = p.experiments(request=request, pk=project_id).data
+            experiments = services.get_project_experiments(request.user, project_id)
         else:
             experiments = None
+        load_ids(AerpawUser, [project] + project.get('project_owners') + project.get('project_members') +
+                 (experiments or []), 'project_creator', 'last_modified_by', 'user_id', 'granted_by',
+                 'experiment_creator')
     except Exception as exc:
         message = exc
         project = None
@@ -129,17 +92,10 @@ def project_create(request):
         form = ProjectCreateForm(request.POST)
         if form.is_valid():
             try:
-                request.data = QueryDict('', mutable=True)
                 data_dict = form.data.dict()
-                if data_dict.get('is_public', '') == 'on':
-                    data_dict.update({'is_public': 'true'})
-                else:
-                    data_dict.update({'is_public': 'false'})
-                request.data.update(data_dict)
-                p = ProjectViewSet(request=request)
-                request.data.update(data_dict)
-                project = p.create(request=request).data
-                return redirect('project_detail', project_id=project.get('project_id', 9999))
+                data_dict.update({'is_public': 'true' if data_dict.get('is_public', '') == 'on' else 'false'})
+                project = services.create_project(request.user, data_dict)
+                return redirect('project_detail', project_id=project.id)
             except Exception as exc:
                 message = exc
     else:
@@ -160,23 +116,17 @@ def project_edit(request, project_id):
         form = ProjectCreateForm(request.POST)
         if form.is_valid():
             try:
-                request.data = QueryDict('', mutable=True)
                 data_dict = form.data.dict()
-                if data_dict.get('is_active', '') == 'on':
-                    data_dict.update({'is_active': 'true'})
-                else:
-                    data_dict.update({'is_active': 'false'})
-                request.data.update(data_dict)
-                p = ProjectViewSet(request=request)
-                request.data.update(data_dict)
-                project = p.partial_update(request=request, pk=project_id)
+                data_dict.update({'is_active': 'true' if data_dict.get('is_active', '') == 'on' else 'false'})
+                services.update_project(request.user, project_id, data_dict)
                 return redirect('project_detail', project_id=project_id)
             except Exception as exc:
                 message = exc
     else:
         project = get_object_or_404(AerpawProject, id=project_id)
-        is_project_creator = project.is_creator(request.user)
-        is_project_owner = project.is_owner(request.user)
+        membership_index = get_membership_index(request.user)
+        is_project_creator = membership_index.is_project_creator(project)
+        is_project_owner = membership_index.is_project_owner(project)
         form = ProjectCreateForm(instance=project)
     return render(request,
                   'project_edit.html',
@@ -194,18 +144,16 @@ def project_edit(request, project_id):
 def project_members(request, project_id):
     message = None
     project = get_object_or_404(AerpawProject, id=project_id)
-    is_project_creator = project.is_creator(request.user)
-    is_project_owner = project.is_owner(request.user)
+    membership_index = get_membership_index(request.user)
+    is_project_creator = membership_index.is_project_creator(project)
+    is_project_owner = membership_index.is_project_owner(project)
+    identity_map().add(project)
     if request.method == "POST":
         form = ProjectMembershipForm(request.POST, instance=project)
         if form.is_valid():
             try:
-                api_request = Request(request=HttpRequest())
-                api_request.data.update({'project_members': [int(i) for i in request.POST.getlist('project_members')]})
-                api_request.user = request.user
-                api_request.method = 'PUT'
-                p = ProjectViewSet(request=api_request)
-                project = p.membership(request=api_request, pk=project_id)
+                services.project_membership(
+                    request.user, project_id, {'project_members': [int(i) for i in request.POST.getlist('project_members')]})
                 return redirect('project_detail', project_id=project_id)
             except Exception as exc:
                 message = exc
@@ -230,18 +178,16 @@ def project_members(request, project_id):
 def project_owners(request, project_id):
     message = None
     project = get_object_or_404(AerpawProject, id=project_id)
-    is_project_creator = project.is_creator(request.user)
-    is_project_owner = project.is_owner(request.user)
+    membership_index = get_membership_index(request.user)
+    is_project_creator = membership_index.is_project_creator(project)
+    is_project_owner = membership_index.is_project_owner(project)
+    identity_map().add(project)
     if request.method == "POST":
         form = ProjectMembershipForm(request.POST, instance=project)
         if form.is_valid():
             try:
-                api_request = Request(request=HttpRequest())
-                api_request.data.update({'project_owners': [int(i) for i in request.POST.getlist('project_owners')]})
-                api_request.user = request.user
-                api_request.method = 'PUT'
-                p = ProjectViewSet(request=api_request)
-                project = p.membership(request=api_request, pk=project_id)
+                services.project_membership(
+                    request.user, project_id, {'project_owners': [int(i) for i in request.POST.getlist('project_owners')]})
                 return redirect('project_detail', project_id=project_id)
             except Exception as exc:
                 message = exc
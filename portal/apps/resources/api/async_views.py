@@ -0,0 +1,26 @@
+from rest_framework.exceptions import PermissionDenied
+
+from portal.apps.mixins.async_views import async_api_view, cursor_page_data
+from portal.apps.mixins.cache import acached_response_data
+from portal.apps.resources import services
+from portal.apps.resources.api.serializers import RESOURCE_LIST_PROJECTION
+from portal.apps.resources.signals import RESOURCES_CACHE_NAMESPACE
+
+
+@async_api_view
+async def resource_list(request):
+    """
+    GET: list resources as a cursor page (same rows as GET /resources)
+    - count: approximate (default) | exact, read concurrently with the page
+
+    Permission:
+    - user is_active
+    """
+    if not request.user.is_active:
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to GET /resources list")
+    return await acached_response_data(
+        request, (RESOURCES_CACHE_NAMESPACE,),
+        lambda: cursor_page_data(
+            request, services.resource_queryset(request.query_params.get('search', None)),
+            services.RESOURCE_ORDERING, RESOURCE_LIST_PROJECTION))
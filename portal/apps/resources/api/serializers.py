@@ -1,5 +1,6 @@
 from rest_framework import serializers
 
+from portal.apps.mixins.projection import Projection
 from portal.apps.resources.models import AerpawResource
 
 
@@ -14,9 +15,9 @@ class ResourceSerializerList(serializers.ModelSerializer):
 
 class ResourceSerializerDetail(serializers.ModelSerializer):
     created_date = serializers.DateTimeField(source='created')
-    last_modified_by = serializers.CharField(source='modified_by')
+    last_modified_by = serializers.PrimaryKeyRelatedField(source='modified_by', read_only=True)
     modified_date = serializers.DateTimeField(source='modified')
-    resource_creator = serializers.CharField(source='created_by')
+    resource_creator = serializers.PrimaryKeyRelatedField(source='created_by', read_only=True)
     resource_id = serializers.IntegerField(source='id', read_only=True)
 
     class Meta:
@@ -24,3 +25,11 @@ class ResourceSerializerDetail(serializers.ModelSerializer):
         fields = ['created_date', 'description', 'hostname', 'ip_address', 'is_active', 'is_deleted',
                   'last_modified_by', 'location', 'modified_date', 'name', 'ops_notes', 'resource_class',
                   'resource_creator', 'resource_id', 'resource_mode', 'resource_type']
+
+
+# list endpoint projection: response field -> model field (values() rows are the response rows)
+RESOURCE_LIST_PROJECTION = Projection(
+    fields={'description': 'description', 'is_active': 'is_active', 'location': 'location', 'name': 'name',
+            'resource_class': 'resource_class', 'resource_id': 'id', 'resource_mode': 'resource_mode',
+            'resource_type': 'resource_type'}
+)
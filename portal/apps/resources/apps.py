@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ResourcesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'portal.apps.resources'
+
+    def ready(self):
+        # response cache invalidation
+        from portal.apps.resources import signals  # noqa: F401
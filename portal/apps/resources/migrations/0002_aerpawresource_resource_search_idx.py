@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:40
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aerpawresource',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('name', 'description', 'resource_type', config='simple'), name='resource_search_idx'),
+        ),
+    ]
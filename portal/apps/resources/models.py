@@ -3,6 +3,10 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 
 from portal.apps.mixins.models import AuditModelMixin, BaseModel
+from portal.apps.mixins.search import search_index
+
+# full-text search document
+RESOURCE_SEARCH_FIELDS = ['name', 'description', 'resource_type']
 
 
 class AerpawResource(BaseModel, AuditModelMixin, models.Model):
@@ -70,6 +74,9 @@ class AerpawResource(BaseModel, AuditModelMixin, models.Model):
 
     class Meta:
         verbose_name = 'AERPAW Resource'
+        indexes = [
+            search_index('resource_search_idx', *RESOURCE_SEARCH_FIELDS)
+        ]
 
     def __str__(self):
         return self.name
@@ -0,0 +1,286 @@
+from uuid import uuid4
+
+from django.shortcuts import get_object_or_404
+from rest_framework.exceptions import PermissionDenied, ValidationError
+
+from portal.apps.mixins.cache import cached_data
+from portal.apps.mixins.search import search_filter, search_vector
+from portal.apps.mixins.services import Page, cursor_page
+from portal.apps.resources.api.serializers import RESOURCE_LIST_PROJECTION, ResourceSerializerDetail
+from portal.apps.resources.models import AerpawResource, RESOURCE_SEARCH_FIELDS
+from portal.apps.resources.signals import RESOURCES_CACHE_NAMESPACE
+from portal.apps.users.models import AerpawUser
+
+# constants
+RESOURCE_MIN_NAME_LEN = 3
+RESOURCE_MIN_DESC_LEN = 5
+RESOURCE_MIN_HOSTNAME_LEN = 5
+RESOURCE_MIN_LOCATION_LEN = 3
+RESOURCE_ORDERING = ('name', 'id')
+
+
+def resource_queryset(search: str = None):
+    """
+    Resources that are not deleted (optional search)
+    """
+    queryset = AerpawResource.objects.filter(is_deleted=False)
+    if search:
+        queryset = search_filter(queryset, search_vector(*RESOURCE_SEARCH_FIELDS), search)
+    return queryset.order_by('name')
+
+
+def list_resources(user: AerpawUser, search: str = None, cursor: str = None) -> Page:
+    """
+    Cursor page of resource rows (see RESOURCE_LIST_PROJECTION) with an approximate count
+
+    Permission:
+    - user is_active
+    """
+    if not user.is_active:
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to GET /resources list")
+    return cached_data(
+        user, ('resources', search, cursor), (RESOURCES_CACHE_NAMESPACE,),
+        lambda: cursor_page(resource_queryset(search), RESOURCE_ORDERING, cursor, RESOURCE_LIST_PROJECTION))
+
+
+def get_resource(user: AerpawUser, pk) -> dict:
+    """
+    Resource as detailed result
+    - created_date           - string
+    - description            - string
+    - hostname               - string
+    - ip_address             - string
+    - is_active              - boolean
+    - location               - string
+    - last_modified_by (fk)  - user_ID
+    - modified_date          - string
+    - name                   - string
+    - ops_notes              - string
+    - resource_class         - string
+    - resource_creator (fk)  - user_ID
+    - resource_id            - int
+    - resource_mode          - string
+    - resource_type          - string
+
+    Permission:
+    - user is_active
+    """
+    if not user.is_active:
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to GET /resources/{0} details".format(pk))
+
+    def build():
+        resource = get_object_or_404(AerpawResource.objects.all(), pk=pk)
+        serializer = ResourceSerializerDetail(resource)
+        du = dict(serializer.data)
+        resource_data = {
+            'created_date': str(du.get('created_date')),
+            'description': du.get('description'),
+            'hostname': du.get('hostname'),
+            'ip_address': du.get('ip_address'),
+            'is_active': du.get('is_active'),
+            'last_modified_by': du.get('last_modified_by'),
+            'location': du.get('location'),
+            'modified_date': du.get('modified_date'),
+            'name': du.get('name'),
+            'ops_notes': du.get('ops_notes'),
+            'resource_class': du.get('resource_class'),
+            'resource_creator': du.get('resource_creator'),
+            'resource_id': du.get('resource_id'),
+            'resource_mode': du.get('resource_mode'),
+            'resource_type': du.get('resource_type')
+        }
+        if resource.is_deleted:
+            resource_data['is_deleted'] = du.get('is_deleted')
+        return resource_data
+
+    return cached_data(user, ('resource', pk), (RESOURCES_CACHE_NAMESPACE,), build)
+
+
+def create_resource(user: AerpawUser, data) -> AerpawResource:
+    """
+    Create a resource
+    - description, hostname, ip_address, is_active, location, name, ops_notes, resource_class, resource_mode,
+      resource_type
+
+    Permission:
+    - user is_operator
+    """
+    if not user.is_operator():
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to POST /resources")
+    # validate description
+    description = data.get('description', None)
+    if not description or len(description) < RESOURCE_MIN_DESC_LEN:
+        raise ValidationError(
+            detail="description:  must be at least {0} chars long".format(RESOURCE_MIN_DESC_LEN))
+    # validate hostname
+    hostname = data.get('hostname', None)
+    if hostname and len(hostname) < RESOURCE_MIN_HOSTNAME_LEN:
+        raise ValidationError(
+            detail="hostname:  must be at least {0} chars long".format(RESOURCE_MIN_HOSTNAME_LEN))
+    # validate ip_address
+    ip_address = data.get('ip_address', None)
+    # validate is_active
+    is_active = str(data.get('is_active')).casefold() == 'true'
+    # validate location
+    location = data.get('location', None)
+    if location and len(location) < RESOURCE_MIN_LOCATION_LEN:
+        raise ValidationError(
+            detail="location:  must be at least {0} chars long".format(RESOURCE_MIN_LOCATION_LEN))
+    # validate name
+    name = data.get('name', None)
+    if name and len(name) < RESOURCE_MIN_NAME_LEN:
+        raise ValidationError(
+            detail="name: must be at least {0} chars long".format(RESOURCE_MIN_NAME_LEN))
+    # validate ops_notes
+    ops_notes = data.get('ops_notes', None)
+    # validate resource_class
+    resource_class = data.get('resource_class', None)
+    if resource_class not in [c[0] for c in AerpawResource.ResourceClass.choices]:
+        raise ValidationError(
+            detail="resource_class: must be a valid Resource Class value")
+    # validate resource_mode
+    resource_mode = data.get('resource_mode', None)
+    if resource_mode not in [c[0] for c in AerpawResource.ResourceMode.choices]:
+        raise ValidationError(
+            detail="resource_mode: must be a valid Resource Mode value")
+    # validate resource_type
+    resource_type = data.get('resource_type', None)
+    if resource_type not in [c[0] for c in AerpawResource.ResourceType.choices]:
+        raise ValidationError(
+            detail="resource_type: must be a valid Resource Type value")
+    # check if allow_canonical is of type AFRN or APRN
+    if resource_class == AerpawResource.ResourceClass.ALLOW_CANONICAL and \
+            resource_type not in [AerpawResource.ResourceType.AFRN, AerpawResource.ResourceType.APRN]:
+        raise ValidationError(
+            detail="resource_class: ALLOW_CANONICAL must be type AFRN or APRN")
+    # check if UAV or UGV that resource_mode == testbed
+    if resource_type in [AerpawResource.ResourceType.UAV, AerpawResource.ResourceType.UGV] and \
+            resource_mode != AerpawResource.ResourceMode.TESTBED:
+        raise ValidationError(
+            detail="resource_type: UAV/UGV must be mode TESTBED")
+
+    # create resource
+    resource = AerpawResource()
+    resource.created_by = user
+    resource.description = description
+    resource.hostname = hostname
+    resource.ip_address = ip_address
+    resource.is_active = is_active
+    resource.location = location
+    resource.modified_by = user
+    resource.name = name
+    resource.ops_notes = ops_notes
+    resource.resource_class = resource_class
+    resource.resource_mode = resource_mode
+    resource.resource_type = resource_type
+    resource.uuid = uuid4()
+    resource.save()
+    return resource
+
+
+def update_resource(user: AerpawUser, pk, data) -> AerpawResource:
+    """
+    Update an existing resource (only the fields present in data)
+    - description, hostname, ip_address, is_active, location, name, ops_notes, resource_class, resource_mode,
+      resource_type
+
+    Permission:
+    - user is_operator
+    """
+    resource = get_object_or_404(AerpawResource.objects.all(), pk=pk)
+    if resource.is_deleted or not user.is_operator():
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to PUT/PATCH /resources/{0} details".format(pk))
+    modified = False
+    # check for description
+    if data.get('description', None):
+        if len(data.get('description')) < RESOURCE_MIN_DESC_LEN:
+            raise ValidationError(
+                detail="description:  must be at least {0} chars long".format(RESOURCE_MIN_DESC_LEN))
+        resource.description = data.get('description')
+        modified = True
+    # check for hostname
+    if data.get('hostname', None):
+        if len(data.get('hostname')) < RESOURCE_MIN_HOSTNAME_LEN:
+            raise ValidationError(
+                detail="hostname:  must be at least {0} chars long".format(RESOURCE_MIN_HOSTNAME_LEN))
+        resource.hostname = data.get('hostname')
+        modified = True
+    # check for ip_address
+    if data.get('ip_address', None):
+        resource.ip_address = data.get('ip_address')
+        modified = True
+    # check for is_active
+    if str(data.get('is_active')).casefold() in ['true', 'false']:
+        is_active = str(data.get('is_active')).casefold() == 'true'
+        resource.is_active = is_active
+        modified = True
+    # check for location
+    if data.get('location', None):
+        if len(data.get('location')) < RESOURCE_MIN_LOCATION_LEN:
+            raise ValidationError(
+                detail="location:  must be at least {0} chars long".format(RESOURCE_MIN_LOCATION_LEN))
+        resource.location = data.get('location')
+        modified = True
+    # check for name
+    if data.get('name', None):
+        if len(data.get('name')) < RESOURCE_MIN_NAME_LEN:
+            raise ValidationError(
+                detail="name:  must be at least {0} chars long".format(RESOURCE_MIN_NAME_LEN))
+        resource.name = data.get('name')
+        modified = True
+    # check for ops_notes
+    if data.get('ops_notes', None):
+        resource.ops_notes = data.get('ops_notes')
+        modified = True
+    # validate resource_class
+    if data.get('resource_class', None):
+        if data.get('resource_class') not in [c[0] for c in AerpawResource.ResourceClass.choices]:
+            raise ValidationError(
+                detail="resource_class: must be a valid Resource Class value")
+        resource.resource_class = data.get('resource_class')
+        modified = True
+    # check for resource_mode
+    if data.get('resource_mode', None):
+        if data.get('resource_mode') not in [c[0] for c in AerpawResource.ResourceMode.choices]:
+            raise ValidationError(
+                detail="resource_mode: must be a valid Resource Mode value")
+        resource.resource_mode = data.get('resource_mode')
+        modified = True
+    # check for resource_type
+    if data.get('resource_type', None):
+        if data.get('resource_type') not in [c[0] for c in AerpawResource.ResourceType.choices]:
+            raise ValidationError(
+                detail="resource_class: must be a valid Resource Type value")
+        resource.resource_type = data.get('resource_type', None)
+        modified = True
+    # check if UAV or UGV that resource_mode == testbed
+    if resource.resource_type in [AerpawResource.ResourceType.UAV, AerpawResource.ResourceType.UGV] and \
+            resource.resource_mode != AerpawResource.ResourceMode.TESTBED:
+        raise ValidationError(
+            detail="resource_type: UAV/UGV must be mode TESTBED")
+    # save if modified
+    if modified:
+        resource.modified_by = user
+        resource.save()
+    return resource
+
+
+def delete_resource(user: AerpawUser, pk) -> None:
+    """
+    Soft delete an existing resource
+
+    Permission:
+    - user is_resource_creator
+    """
+    resource = get_object_or_404(AerpawResource.objects.all(), pk=pk)
+    if resource.created_by_id != user.id:
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to DELETE /resources/{0}".format(pk))
+    resource.is_active = False
+    resource.is_deleted = True
+    resource.modified_by = user
+    resource.save()
@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from portal.apps.mixins.cache import invalidate
+from portal.apps.resources.models import AerpawResource
+
+# response cache namespace of the resource list and detail endpoints
+RESOURCES_CACHE_NAMESPACE = 'resources'
+
+
+@receiver([post_save, post_delete], sender=AerpawResource)
+def invalidate_resources(sender, instance, **kwargs):
+    invalidate(RESOURCES_CACHE_NAMESPACE)
@@ -1,5 +1,6 @@
 from django import template
 
+from portal.apps.mixins.identity import identity_map
 from portal.apps.resources.models import AerpawResource
 
 register = template.Library()
@@ -8,8 +9,8 @@ register = template.Library()
 @register.filter
 def id_to_resource_name(resource_id):
     try:
-        resource = AerpawResource.objects.get(pk=int(resource_id))
-        return resource.name
+        resource = identity_map().get(AerpawResource, resource_id)
+        return resource.name if resource else 'not found'
     except Exception as exc:
         print(exc)
         return 'not found'
@@ -1 +1,230 @@
-# Create your tests here.
+import threading
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+
+from portal.apps.mixins.cache import cache_stats, reset_cache_stats, response_cache
+from portal.apps.mixins.testing import AsyncReadPathTestCase, QueryBudgetTestCase, audit_fields, create_user
+from portal.apps.resources.models import AerpawResource
+from portal.apps.users.models import AerpawRolesEnum, AerpawUser
+
+
+class ResourceEndpointBudgetTestCase(QueryBudgetTestCase):
+    """
+    Query and wall-clock budgets for /resources
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = create_user('operator@example.org', AerpawRolesEnum.OPERATOR.value)
+        cls.experimenter = create_user('experimenter@example.org', AerpawRolesEnum.EXPERIMENTER.value)
+        cls.create_resources(0, 3)
+        cls.resource = AerpawResource.objects.order_by('name').first()
+
+    @classmethod
+    def create_resources(cls, start: int, stop: int):
+        AerpawResource.objects.bulk_create([
+            AerpawResource(name='resource-{0:02d}'.format(i), description='resource',
+                           resource_type=AerpawResource.ResourceType.AFRN, **audit_fields(cls.operator))
+            for i in range(start, stop)
+        ])
+
+    def grow_resources(self):
+        self.create_resources(3, 10)
+
+    def test_resources(self):
+        path = '/api/resources/{0}'.format(self.resource.id)
+        self.assertQueryBudget(self.experimenter, 'get', '/api/resources', max_queries=3, max_ms=250)
+        self.assertQueryBudget(self.experimenter, 'get', path, max_queries=3, max_ms=250)
+        # cached: only the caller's roles (and the ETag of the detail) are read
+        self.assertQueryBudget(self.experimenter, 'get', '/api/resources', max_queries=1, max_ms=250)
+        self.assertQueryBudget(self.experimenter, 'get', path, max_queries=2, max_ms=250)
+        self.assertQueryBudget(self.operator, 'put', path, data={'description': 'updated resource'},
+                               max_queries=5, max_ms=500)
+        self.assertNoNPlusOne(self.experimenter, '/api/resources', self.grow_resources)
+
+    def test_resource_actions(self):
+        for action in ['experiments', 'projects']:
+            self.assertQueryBudget(self.operator, 'get', '/api/resources/{0}/{1}'.format(self.resource.id, action),
+                                   max_queries=2, max_ms=250)
+
+
+    def test_conditional_requests(self):
+        path = '/api/resources/{0}'.format(self.resource.id)
+        client = self.api_client(self.operator)
+        etag = client.get(path)['ETag']
+        self.assertEqual(client.get(path)['ETag'], etag)
+        # If-None-Match: 304 without a body, weak validators match
+        for header in [etag, 'W/' + etag, '"other", ' + etag, '*']:
+            self.assertEqual(client.get(path, HTTP_IF_NONE_MATCH=header).status_code, 304)
+        self.assertEqual(client.get(path, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+        # If-Match: the update only applies to the version the client read
+        response = client.put(path, {'description': 'first update'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        response = client.put(path, {'description': 'lost update'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(AerpawResource.objects.get(pk=self.resource.id).description, 'first update')
+        self.assertNotEqual(client.get(path)['ETag'], etag)
+        self.assertEqual(client.get('/api/resources/0', HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+class CursorPaginationTestCase(QueryBudgetTestCase):
+    """
+    Keyset pagination on (name, id): ?pagination=cursor, ?cursor=, ?page_size=, ?count=approximate
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.operator = create_user('operator@example.org', AerpawRolesEnum.OPERATOR.value)
+        # duplicate names so the id tie-breaker is exercised
+        AerpawResource.objects.bulk_create([
+            AerpawResource(name='resource-{0:02d}'.format(i // 2), description='resource',
+                           resource_type=AerpawResource.ResourceType.AFRN, **audit_fields(cls.operator))
+            for i in range(23)
+        ])
+        cls.expected = list(AerpawResource.objects.order_by('name', 'id').values_list('id', flat=True))
+
+    def get(self, url: str, **params):
+        response = self.api_client(self.operator).get(url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_forward_and_backward(self):
+        data = self.get('/api/resources', pagination='cursor', page_size=10)
+        self.assertNotIn('count', data)
+        self.assertIsNone(data['previous'])
+        pages = [[r['resource_id'] for r in data['results']]]
+        while data['next']:
+            data = self.get(data['next'])
+            pages.append([r['resource_id'] for r in data['results']])
+        self.assertEqual([len(p) for p in pages], [10, 10, 3])
+        self.assertEqual(sum(pages, []), self.expected)
+        data = self.get(data['previous'])
+        self.assertEqual([r['resource_id'] for r in data['results']], pages[1])
+        data = self.get(data['previous'])
+        self.assertEqual([r['resource_id'] for r in data['results']], pages[0])
+        self.assertIsNone(data['previous'])
+
+    def test_page_size_is_limited(self):
+        data = self.get('/api/resources', page_size=1000)
+        self.assertEqual(len(data['results']), 23)
+        self.assertEqual(data['count'], 23)
+        with mock.patch('portal.server.drf_settings.AerpawPagination.max_page_size', 5):
+            self.assertEqual(len(self.get('/api/resources', pagination='cursor', page_size=1000)['results']), 5)
+
+    def test_count_modes(self):
+        self.assertEqual(self.get('/api/resources', pagination='cursor', count='exact')['count'], 23)
+        self.assertEqual(self.get('/api/resources', count='approximate')['count'], 23)
+        response_cache().clear()
+        with mock.patch('portal.server.drf_settings.APPROXIMATE_COUNT_THRESHOLD', 1):
+            with mock.patch('portal.server.drf_settings.approximate_count', return_value=12345):
+                self.assertEqual(self.get('/api/resources', pagination='cursor', count='approximate')['count'], 12345)
+                self.assertEqual(self.get('/api/resources', count='approximate')['count'], 12345)
+        response = self.api_client(self.operator).get('/api/resources', {'count': 'sometimes'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_cursor(self):
+        response = self.api_client(self.operator).get('/api/resources', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_pages_skip_count(self):
+        data = self.get('/api/resources', pagination='cursor')
+        path = data['next'][data['next'].index('/api/resources'):]
+        # roles of the caller (response cache key) and the page: no count query
+        self.assertQueryBudget(self.operator, 'get', path, max_queries=2, max_ms=250)
+
+    def test_html_list_uses_cursor_links(self):
+        self.client.force_login(self.operator)
+        response = self.client.get('/resources/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['item_count'], 5)
+        self.assertEqual(response.context['count'], 23)
+        response = self.client.get('/resources/', {'cursor': response.context['next_cursor']})
+        self.assertEqual([r['resource_id'] for r in response.context['resources'].results], self.expected[5:10])
+        self.assertIsNotNone(response.context['prev_cursor'])
+
+
+class ResponseCacheTestCase(TransactionTestCase):
+    """
+    Resource responses are cached until a write invalidates them: a write is never followed by a stale read
+    """
+
+    def setUp(self):
+        call_command('loaddata', 'aerpaw_roles', verbosity=0)
+        response_cache().clear()
+        reset_cache_stats()
+        self.operator = create_user('operator@example.org', AerpawRolesEnum.OPERATOR.value)
+        self.resource = AerpawResource.objects.create(
+            name='resource-00', description='resource', resource_type=AerpawResource.ResourceType.AFRN,
+            **audit_fields(self.operator))
+
+    def get(self, path: str) -> dict:
+        client = APIClient()
+        client.force_authenticate(user=AerpawUser.objects.get(pk=self.operator.id))
+        response = client.get(path)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def descriptions(self) -> list:
+        return [r['description'] for r in self.get('/api/resources')['results']]
+
+    def test_write_invalidates(self):
+        path = '/api/resources/{0}'.format(self.resource.id)
+        self.assertEqual(self.descriptions(), ['resource'])
+        self.assertEqual(self.get(path)['description'], 'resource')
+        self.assertEqual(self.descriptions(), ['resource'])
+        self.assertEqual(cache_stats()['resources'], {'hits': 1, 'misses': 2})
+        self.resource.description = 'updated'
+        self.resource.save()
+        self.assertEqual(self.descriptions(), ['updated'])
+        self.assertEqual(self.get(path)['description'], 'updated')
+        self.resource.delete()
+        self.assertEqual(self.descriptions(), [])
+
+    def test_read_during_write_transaction(self):
+        self.assertEqual(self.descriptions(), ['resource'])
+        with transaction.atomic():
+            self.resource.description = 'updated'
+            self.resource.save()
+            # a concurrent reader still sees the committed row and caches it under the new version
+            seen = []
+            reader = threading.Thread(target=lambda: (seen.append(self.descriptions()), connection.close()))
+            reader.start()
+            reader.join()
+            self.assertEqual(seen, [['resource']])
+        # the version moves again on commit
+        self.assertEqual(self.descriptions(), ['updated'])
+
+
+class ResourceAsyncReadPathTestCase(AsyncReadPathTestCase):
+    """
+    /api/async/resources returns the same data as /api/resources and shares its cache invalidation
+    """
+
+    def setUp(self):
+        super().setUp()
+        reset_cache_stats()
+        self.operator = create_user('operator@example.org', AerpawRolesEnum.OPERATOR.value)
+        self.experimenter = create_user('experimenter@example.org', AerpawRolesEnum.EXPERIMENTER.value)
+        AerpawResource.objects.bulk_create([
+            AerpawResource(name='resource-{0:02d}'.format(i), description='resource',
+                           resource_type=AerpawResource.ResourceType.AFRN, **audit_fields(self.operator))
+            for i in range(7)
+        ])
+
+    def test_resource_list(self):
+        path = '/api/resources?pagination=cursor&count=exact&page_size=3'
+        async_path = '/api/async/resources?count=exact&page_size=3'
+        for user in [self.operator, self.experimenter]:
+            data = self.assertSameResponse(user, path, async_path)
+        self.assertEqual((data['count'], len(data['results'])), (7, 3))
+        # the second async read is a cache hit, a write moves both paths to the new version
+        self.assertSameResponse(self.experimenter, path, async_path)
+        self.assertEqual(cache_stats()['resources'], {'hits': 2, 'misses': 4})
+        resource = AerpawResource.objects.get(name='resource-00')
+        resource.description = 'updated'
+        resource.save()
+        data = self.assertSameResponse(self.experimenter, path, async_path)
+        self.assertEqual(data['results'][0]['description'], 'updated')
@@ -1,14 +1,13 @@
-from urllib.parse import parse_qs, urlparse
-
 from django.contrib.auth.decorators import login_required
-from django.http import QueryDict
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views.decorators.csrf import csrf_exempt
 
-from portal.apps.resources.api.viewsets import ResourceViewSet
+from portal.apps.mixins.identity import load_ids
+from portal.apps.resources import services
 from portal.apps.resources.forms import ResourceCreateForm
 from portal.apps.resources.models import AerpawResource
-from portal.server.settings import DEBUG, REST_FRAMEWORK
+from portal.apps.users.models import AerpawUser
+from portal.server.settings import DEBUG
 
 
 @csrf_exempt
@@ -16,70 +15,35 @@ from portal.server.settings import DEBUG, REST_FRAMEWORK
 def resource_list(request):
     message = None
     try:
-        # check for query parameters
-        current_page = 1
-        search_term = None
-        data_dict = {}
-        if request.GET.get('search'):
-            data_dict['search'] = request.GET.get('search')
-            search_term = request.GET.get('search')
-        if request.GET.get('page'):
-            data_dict['page'] = request.GET.get('page')
-            current_page = int(request.GET.get('page'))
-        request.query_params = QueryDict('', mutable=True)
-        request.query_params.update(data_dict)
-        r = ResourceViewSet(request=request)
-        resources = r.list(request=request)
-        # get prev, next and item range
-        next_page = None
-        prev_page = None
-        count = 0
-        min_range = 0
-        max_range = 0
-        if resources.data:
-            resources = dict(resources.data)
-            prev_url = resources.get('previous', None)
-            if prev_url:
-                prev_dict = parse_qs(urlparse(prev_url).query)
-                try:
-                    prev_page = prev_dict['page'][0]
-                except Exception as exc:
-                    print(exc)
-                    prev_page = 1
-            next_url = resources.get('next', None)
-            if next_url:
-                next_dict = parse_qs(urlparse(next_url).query)
-                try:
-                    next_page = next_dict['page'][0]
-                except Exception as exc:
-                    print(exc)
-                    next_page = 1
-            count = int(resources.get('count'))
-            min_range = int(current_page - 1) * int(REST_FRAMEWORK['PAGE_SIZE']) + 1
-            max_range = int(current_page - 1) * int(REST_FRAMEWORK['PAGE_SIZE']) + int(REST_FRAMEWORK['PAGE_SIZE'])
-            if max_range > count:
-                max_range = count
-
-        item_range = '{0} - {1}'.format(str(min_range), str(max_range))
+        # cursor pagination with an approximate count
+        search_term = request.GET.get('search') or None
+        resources = services.list_resources(request.user, search=search_term, cursor=request.GET.get('cursor'))
+        next_cursor = resources.next_cursor
+        prev_cursor = resources.previous_cursor
+        count = resources.count or 0
+        count_is_approximate = resources.count_is_approximate
+        item_count = len(resources)
     except Exception as exc:
         message = exc
         resources = None
-        item_range = None
-        next_page = None
-        prev_page = None
+        item_count = 0
+        next_cursor = None
+        prev_cursor = None
         search_term = None
         count = 0
+        count_is_approximate = False
     return render(request,
                   'resource_list.html',
                   {
                       'user': request.user,
                       'resources': resources,
-                      'item_range': item_range,
+                      'item_count': item_count,
                       'message': message,
-                      'next_page': next_page,
-                      'prev_page': prev_page,
+                      'next_cursor': next_cursor,
+                      'prev_cursor': prev_cursor,
                       'search': search_term,
                       'count': count,
+                      'count_is_approximate': count_is_approximate,
                       'debug': DEBUG
                   })
 
@@ -87,14 +51,14 @@ def resource_list(request):
 @csrf_exempt
 @login_required
 def resource_detail(request, resource_id):
-    r = ResourceViewSet(request=request)
     message = None
     try:
         if request.method == "POST":
             if request.POST.get('delete-resource') == "true":
-                resource = r.destroy(request=request, pk=resource_id).data
+                services.delete_resource(request.user, resource_id)
                 return redirect('resource_list')
-        resource = r.retrieve(request=request, pk=resource_id).data
+        resource = services.get_resource(request.user, resource_id)
+        load_ids(AerpawUser, [resource], 'resource_creator', 'last_modified_by')
     except Exception as exc:
         message = exc
         resource = None
@@ -116,17 +80,10 @@ def resource_create(request):
         form = ResourceCreateForm(request.POST)
         if form.is_valid():
             try:
-                request.data = QueryDict('', mutable=True)
                 data_dict = form.data.dict()
-                if data_dict.get('is_active', '') == 'on':
-                    data_dict.update({'is_active': 'true'})
-                else:
-                    data_dict.update({'is_active': 'false'})
-                request.data.update(data_dict)
-                r = ResourceViewSet(request=request)
-                request.data.update(data_dict)
-                resource = r.create(request=request).data
-                return redirect('resource_detail', resource_id=resource.get('resource_id', 9999))
+                data_dict.update({'is_active': 'true' if data_dict.get('is_active', '') == 'on' else 'false'})
+                resource = services.create_resource(request.user, data_dict)
+                return redirect('resource_detail', resource_id=resource.id)
             except Exception as exc:
                 message = exc
     else:
@@ -147,16 +104,9 @@ def resource_edit(request, resource_id):
         form = ResourceCreateForm(request.POST)
         if form.is_valid():
             try:
-                request.data = QueryDict('', mutable=True)
                 data_dict = form.data.dict()
-                if data_dict.get('is_active', '') == 'on':
-                    data_dict.update({'is_active': 'true'})
-                else:
-                    data_dict.update({'is_active': 'false'})
-                request.data.update(data_dict)
-                r = ResourceViewSet(request=request)
-                request.data.update(data_dict)
-                resource = r.partial_update(request=request, pk=resource_id)
+                data_dict.update({'is_active': 'true' if data_dict.get('is_active', '') == 'on' else 'false'})
+                services.update_resource(request.user, resource_id, data_dict)
                 return redirect('resource_detail', resource_id=resource_id)
             except Exception as exc:
                 message = exc
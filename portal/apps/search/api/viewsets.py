@@ -0,0 +1,91 @@
+from django.contrib.postgres.search import SearchRank
+from django.db.models import CharField, F, Value
+from rest_framework import permissions
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.response import Response
+from rest_framework.viewsets import GenericViewSet
+
+from portal.apps.experiments.api.viewsets import ExperimentViewSet
+from portal.apps.experiments.models import EXPERIMENT_SEARCH_FIELDS
+from portal.apps.mixins.search import search_query, search_vector
+from portal.apps.projects.api.viewsets import ProjectViewSet
+from portal.apps.projects.models import PROJECT_SEARCH_FIELDS
+from portal.apps.resources.api.viewsets import ResourceViewSet
+from portal.apps.resources.models import RESOURCE_SEARCH_FIELDS
+from portal.apps.users.api.viewsets import UserViewSet
+from portal.apps.users.models import USER_SEARCH_FIELDS
+
+# type: (viewset providing the permission filtered queryset, search document, display field)
+SEARCH_TYPES = {
+    'experiments': (ExperimentViewSet, EXPERIMENT_SEARCH_FIELDS, 'name'),
+    'projects': (ProjectViewSet, PROJECT_SEARCH_FIELDS, 'name'),
+    'resources': (ResourceViewSet, RESOURCE_SEARCH_FIELDS, 'name'),
+    'users': (UserViewSet, USER_SEARCH_FIELDS, 'display_name'),
+}
+
+
+class SearchViewSet(GenericViewSet):
+    """
+    Full-text search
+    - paginated list of ranked hits across experiments, projects, resources and users
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        """
+        Required parameter: search
+        Optional parameter: type (comma separated subset of experiments, projects, resources, users)
+        """
+        query = search_query(self.request.query_params.get('search', None))
+        if query is None:
+            raise ValidationError(
+                detail="search: must provide at least one search term")
+        types = self.request.query_params.get('type', None)
+        types = [t.strip() for t in types.split(',')] if types else sorted(SEARCH_TYPES.keys())
+        if not all(t in SEARCH_TYPES for t in types):
+            raise ValidationError(
+                detail="type: valid choices are {0}".format(sorted(SEARCH_TYPES.keys())))
+        queryset = None
+        for search_type in types:
+            viewset, search_fields, display_field = SEARCH_TYPES[search_type]
+            # each type is searched through its own viewset so the same permission filters apply
+            hits = viewset(request=self.request, format_kwarg=None).get_queryset().order_by().annotate(
+                hit_type=Value(search_type, output_field=CharField()),
+                hit_name=F(display_field),
+                rank=SearchRank(search_vector(*search_fields), query)
+            ).values('id', 'hit_type', 'hit_name', 'rank')
+            queryset = hits if queryset is None else queryset.union(hits, all=True)
+        return queryset.order_by('-rank', 'hit_name', 'id')
+
+    def list(self, request, *args, **kwargs):
+        """
+        GET: list search hits as paginated results ordered by rank
+        - id                     - int
+        - name                   - string
+        - rank                   - float
+        - type                   - string
+
+        Permission:
+        - user is_active (hits are limited to what the user may list)
+        """
+        if request.user.is_active:
+            queryset = self.get_queryset()
+            page = self.paginate_queryset(queryset)
+            hits = page if page is not None else queryset
+            response_data = []
+            for hit in hits:
+                response_data.append(
+                    {
+                        'id': hit.get('id'),
+                        'name': hit.get('hit_name'),
+                        'rank': hit.get('rank'),
+                        'type': hit.get('hit_type')
+                    }
+                )
+            if page is not None:
+                return self.get_paginated_response(response_data)
+            else:
+                return Response(response_data)
+        else:
+            raise PermissionDenied(
+                detail="PermissionDenied: unable to GET /search list")
@@ -0,0 +1,90 @@
+from portal.apps.experiments.models import AerpawExperiment, EXPERIMENT_SEARCH_FIELDS
+from portal.apps.mixins.search import search_filter, search_vector
+from portal.apps.mixins.testing import IndexScanTestCase, QueryBudgetTestCase, audit_fields, create_user
+from portal.apps.operations.models import CanonicalNumber
+from portal.apps.projects.models import AerpawProject, PROJECT_SEARCH_FIELDS, UserProject
+from portal.apps.resources.models import AerpawResource, RESOURCE_SEARCH_FIELDS
+from portal.apps.users.models import AerpawRolesEnum, AerpawUser, USER_SEARCH_FIELDS
+
+
+class SearchEndpointTestCase(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pi = create_user('pi@example.org', AerpawRolesEnum.EXPERIMENTER.value, AerpawRolesEnum.PI.value)
+        cls.other = create_user('other@example.org', AerpawRolesEnum.EXPERIMENTER.value, AerpawRolesEnum.PI.value)
+        cls.drone_pilot = create_user('pilot@aerpaw.org', AerpawRolesEnum.EXPERIMENTER.value)
+        cls.drone_pilot.display_name = 'Drone Pilot'
+        cls.drone_pilot.save()
+        cls.member_project = cls.create_project('Drone mapping', 'drone survey of the lake', cls.pi)
+        cls.public_project = cls.create_project('Public drones', 'open drone data', cls.other, is_public=True)
+        cls.private_project = cls.create_project('Drone racing', 'private project', cls.other)
+        cls.member_experiment = cls.create_experiment('Drone flight one', cls.member_project, cls.pi)
+        cls.private_experiment = cls.create_experiment('Drone flight two', cls.private_project, cls.other)
+        cls.resource = AerpawResource.objects.create(
+            name='drone-uav-01', description='portable node', resource_type=AerpawResource.ResourceType.UAV,
+            **audit_fields(cls.other))
+
+    @classmethod
+    def create_project(cls, name, description, creator, is_public=False) -> AerpawProject:
+        project = AerpawProject.objects.create(
+            name=name, description=description, project_creator=creator, is_public=is_public,
+            **audit_fields(creator))
+        UserProject.objects.create(
+            project=project, user=creator, granted_by=creator, project_role=UserProject.RoleType.PROJECT_OWNER)
+        return project
+
+    @classmethod
+    def create_experiment(cls, name, project, creator) -> AerpawExperiment:
+        return AerpawExperiment.objects.create(
+            name=name, description='experiment', project=project, experiment_creator=creator,
+            canonical_number=CanonicalNumber.objects.create(canonical_number=AerpawExperiment.objects.count() + 1),
+            **audit_fields(creator))
+
+    def search(self, **params) -> list:
+        response = self.api_client(self.pi).get('/api/search', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['results'] if 'results' in response.data else response.data
+
+    def test_hits_are_permission_filtered(self):
+        hits = {(h['type'], h['id']) for h in self.search(search='dron')}
+        self.assertEqual(hits, {
+            ('experiments', self.member_experiment.id),
+            ('projects', self.member_project.id),
+            ('projects', self.public_project.id),
+            ('resources', self.resource.id),
+            ('users', self.drone_pilot.id)
+        })
+
+    def test_hits_are_ranked(self):
+        hits = self.search(search='drone', type='projects')
+        self.assertEqual([h['type'] for h in hits], ['projects', 'projects'])
+        self.assertEqual([h['rank'] for h in hits], sorted([h['rank'] for h in hits], reverse=True))
+        self.assertEqual(self.search(search='lake survey', type='projects')[0]['id'], self.member_project.id)
+
+    def test_email_search(self):
+        hits = self.search(search='aerpaw', type='users')
+        self.assertEqual([h['id'] for h in hits], [self.drone_pilot.id])
+
+    def test_invalid_parameters(self):
+        client = self.api_client(self.pi)
+        self.assertEqual(client.get('/api/search', {'search': '  '}).status_code, 400)
+        self.assertEqual(client.get('/api/search', {'search': 'drone', 'type': 'sessions'}).status_code, 400)
+
+    def test_search_budget(self):
+        self.assertQueryBudget(self.pi, 'get', '/api/search?search=drone', max_queries=3, max_ms=250)
+        self.assertQueryBudget(self.pi, 'get', '/api/projects?search=drone', max_queries=4, max_ms=250)
+
+
+class SearchIndexTestCase(IndexScanTestCase):
+    seed_options = dict(IndexScanTestCase.seed_options, projects=2000, experiments=8000, resources=2000)
+
+    def test_search_indexes(self):
+        for model, search_fields, index_name in [
+            (AerpawExperiment, EXPERIMENT_SEARCH_FIELDS, 'experiment_search_idx'),
+            (AerpawProject, PROJECT_SEARCH_FIELDS, 'project_search_idx'),
+            (AerpawResource, RESOURCE_SEARCH_FIELDS, 'resource_search_idx'),
+            (AerpawUser, USER_SEARCH_FIELDS, 'aerpawuser_search_idx'),
+        ]:
+            self.assertIndexScan(
+                search_filter(model.objects.all(), search_vector(*search_fields), '0012'), index_name)
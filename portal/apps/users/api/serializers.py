@@ -1,7 +1,13 @@
 from django.contrib.auth.models import Group
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer, TokenVerifySerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import UntypedToken
 
+from portal.apps.mixins.projection import Projection
 from portal.apps.users.models import AerpawUser
+from portal.apps.users.tokens import is_revoked
 
 
 class GroupSerializer(serializers.ModelSerializer):
@@ -36,3 +42,29 @@ class UserSerializerTokens(serializers.ModelSerializer):
     class Meta:
         model = AerpawUser
         fields = ['access_token', 'refresh_token', ]
+
+
+# list endpoint projection: response field -> model field (values() rows are the response rows)
+USER_LIST_PROJECTION = Projection(
+    fields={'display_name': 'display_name', 'email': 'email', 'user_id': 'id', 'username': 'username'}
+)
+
+
+def validate_not_revoked(token: str) -> None:
+    if is_revoked(UntypedToken(token).get(api_settings.JTI_CLAIM)):
+        raise InvalidToken('Token has been revoked')
+
+
+class AerpawTokenRefreshSerializer(TokenRefreshSerializer):
+    # a revoked refresh token cannot issue access tokens
+
+    def validate(self, attrs):
+        validate_not_revoked(attrs['refresh'])
+        return super(AerpawTokenRefreshSerializer, self).validate(attrs)
+
+
+class AerpawTokenVerifySerializer(TokenVerifySerializer):
+
+    def validate(self, attrs):
+        validate_not_revoked(attrs['token'])
+        return super(AerpawTokenVerifySerializer, self).validate(attrs)
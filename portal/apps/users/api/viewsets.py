@@ -1,18 +1,16 @@
-from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from rest_framework import permissions
 from rest_framework.decorators import action
-from rest_framework.exceptions import MethodNotAllowed, PermissionDenied, ValidationError
+from rest_framework.exceptions import MethodNotAllowed, PermissionDenied
 from rest_framework.mixins import ListModelMixin, RetrieveModelMixin, UpdateModelMixin
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
-from portal.apps.users.api.serializers import UserSerializerDetail, UserSerializerList, UserSerializerTokens
+from portal.apps.mixins.conditional import conditional_retrieve, conditional_update, object_etag, related_version
+from portal.apps.users import services
+from portal.apps.users.api.serializers import USER_LIST_PROJECTION, UserSerializerDetail
 from portal.apps.users.models import AerpawUser
 
-# constants
-USER_MIN_DISPLAY_NAME_LEN = 5
-
 
 class UserViewSet(GenericViewSet, RetrieveModelMixin, ListModelMixin, UpdateModelMixin):
     """
@@ -24,6 +22,7 @@ class UserViewSet(GenericViewSet, RetrieveModelMixin, ListModelMixin, UpdateMode
     - get user tokens
     """
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = services.USER_ORDERING
     queryset = AerpawUser.objects.all().order_by('display_name')
     serializer_class = UserSerializerDetail
 
@@ -31,15 +30,7 @@ class UserViewSet(GenericViewSet, RetrieveModelMixin, ListModelMixin, UpdateMode
         """
         Optional parameter: search
         """
-        search = self.request.query_params.get('search', None)
-        if search:
-            queryset = AerpawUser.objects.filter(
-                Q(display_name__icontains=search) |
-                Q(email__icontains=search)
-            ).order_by('display_name')
-        else:
-            queryset = AerpawUser.objects.all().order_by('display_name')
-        return queryset
+        return services.user_queryset(self.request.query_params.get('search', None))
 
     def list(self, request, *args, **kwargs):
         """
@@ -53,23 +44,10 @@ class UserViewSet(GenericViewSet, RetrieveModelMixin, ListModelMixin, UpdateMode
         - active users
         """
         if request.user.is_active:
-            page = self.paginate_queryset(self.get_queryset())
-            if page:
-                serializer = UserSerializerList(page, many=True)
-            else:
-                serializer = UserSerializerList(self.get_queryset(), many=True)
-            response_data = []
-            for u in serializer.data:
-                du = dict(u)
-                response_data.append(
-                    {
-                        'display_name': du.get('display_name'),
-                        'email': du.get('email'),
-                        'user_id': du.get('user_id'),
-                        'username': du.get('username')
-                    }
-                )
-            if page:
+            queryset = USER_LIST_PROJECTION.values(self.get_queryset())
+            page = self.paginate_queryset(queryset)
+            response_data = USER_LIST_PROJECTION.rows(page if page is not None else queryset)
+            if page is not None:
                 return self.get_paginated_response(response_data)
             else:
                 return Response(response_data)
@@ -83,6 +61,15 @@ class UserViewSet(GenericViewSet, RetrieveModelMixin, ListModelMixin, UpdateMode
         """
         raise MethodNotAllowed(method="POST: /users")
 
+    def get_etag(self, request, pk, lock: bool = False):
+        """
+        ETag of the user detail: user and roles
+        """
+        return object_etag(
+            request, AerpawUser, pk, lock=lock,
+            roles_version=related_version(AerpawUser.groups.through.objects, 'aerpawuser'))
+
+    @conditional_retrieve
     def retrieve(self, request, *args, **kwargs):
         """
         GET: retrieve single result
@@ -98,34 +85,9 @@ class UserViewSet(GenericViewSet, RetrieveModelMixin, ListModelMixin, UpdateMode
         - user is_self
         - user is_operator
         """
-        user = get_object_or_404(self.queryset, pk=kwargs.get('pk'))
-        if request.user.id == user.id or request.user.is_operator():
-            serializer = UserSerializerDetail(user)
-            du = dict(serializer.data)
-            response_data = {
-                'aerpaw_roles': [r.get('role') for r in du.get('aerpaw_roles')],
-                'display_name': du.get('display_name'),
-                'email': du.get('email'),
-                'is_active': du.get('is_active'),
-                'openid_sub': du.get('openid_sub'),
-                'user_id': du.get('user_id'),
-                'username': du.get('username')
-            }
-            return Response(response_data)
-        elif request.user.is_active:
-            serializer = UserSerializerDetail(user)
-            du = dict(serializer.data)
-            response_data = {
-                'display_name': du.get('display_name'),
-                'email': du.get('email'),
-                'user_id': du.get('user_id'),
-                'username': du.get('username')
-            }
-            return Response(response_data)
-        else:
-            raise PermissionDenied(
-                detail="PermissionDenied: unable to GET /users/{0} details".format(kwargs.get('pk')))
+        return Response(services.get_user(request.user, kwargs.get('pk')))
 
+    @conditional_update
     def update(self, request, *args, **kwargs):
         """
         PUT: update user as self
@@ -134,18 +96,8 @@ class UserViewSet(GenericViewSet, RetrieveModelMixin, ListModelMixin, UpdateMode
         Permission:
         - user is_self
         """
-        user = get_object_or_404(self.queryset, pk=kwargs.get('pk'))
-        if request.user.id == user.id:
-            if request.data.get('display_name', None):
-                if len(request.data.get('display_name')) < USER_MIN_DISPLAY_NAME_LEN:
-                    raise ValidationError(
-                        detail="display_name: must be at least {0} chars long".format(USER_MIN_DISPLAY_NAME_LEN))
-                user.display_name = request.data.get('display_name')
-                user.save()
-            return self.retrieve(request, pk=user.id)
-        else:
-            raise PermissionDenied(
-                detail="PermissionDenied: unable to PUT/PATCH /users/{0} details".format(kwargs.get('pk')))
+        user = services.update_user(request.user, kwargs.get('pk'), request.data)
+        return self.retrieve(request, pk=user.id)
 
     def partial_update(self, request, *args, **kwargs):
         """
@@ -188,20 +140,11 @@ class UserViewSet(GenericViewSet, RetrieveModelMixin, ListModelMixin, UpdateMode
         """
         GET: tokens
         - access_token           - string
+        - access_token_expires_at - datetime
         - refresh_token          - string
+        - refresh_token_expires_at - datetime
 
         Permission:
         - user is_self
         """
-        user = get_object_or_404(self.queryset, pk=kwargs.get('pk'))
-        if request.user.id == user.id:
-            serializer = UserSerializerTokens(user)
-            du = dict(serializer.data)
-            response_data = {
-                'access_token': du.get('access_token'),
-                'refresh_token': du.get('refresh_token')
-            }
-            return Response(response_data)
-        else:
-            raise PermissionDenied(
-                detail="PermissionDenied: unable to GET /users/{0}/tokens".format(kwargs.get('pk')))
+        return Response(services.get_user_tokens(request.user, kwargs.get('pk')))
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'portal.apps.users'
+
+    def ready(self):
+        # role-claim token invalidation
+        from portal.apps.users import signals  # noqa: F401
@@ -0,0 +1,211 @@
+import base64
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import SuspiciousOperation
+from django.db.models import prefetch_related_objects
+from mozilla_django_oidc.contrib.drf import OIDCAuthentication
+from mozilla_django_oidc.utils import parse_www_authenticate_header
+from requests.exceptions import HTTPError
+from rest_framework import exceptions
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from portal.apps.users.tokens import ROLE_VERSION_CLAIM, ROLES_CLAIM, current_role_version, is_revoked, token_user
+
+logger = logging.getLogger(__name__)
+
+# cache alias of the verified OIDC token cache (see CACHES in settings)
+TOKEN_CACHE_ALIAS = 'tokens'
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+class AerpawJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that loads the user's AERPAW roles (groups) at authentication time
+    so that role predicates are answered from memory for the rest of the request
+    - revoked tokens (RevokedToken, checked in memory: see users.tokens.RevocationList) are rejected
+    - role-claim tokens (see users.tokens) are authorized from their claims without loading the user, they are
+      rejected once the user's stored role version has moved on
+    - bearer tokens that are not portal JWTs (signed with SIMPLE_JWT['ALGORITHM']) are left to OIDC authentication
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        raw_token = self.get_raw_token(header) if header is not None else None
+        if raw_token is not None and jwt_algorithm(raw_token) != settings.SIMPLE_JWT['ALGORITHM']:
+            return None
+        return super(AerpawJWTAuthentication, self).authenticate(request)
+
+    def get_validated_token(self, raw_token):
+        validated_token = super(AerpawJWTAuthentication, self).get_validated_token(raw_token)
+        if is_revoked(validated_token.get(api_settings.JTI_CLAIM)):
+            raise exceptions.AuthenticationFailed('Token has been revoked', code='token_not_valid')
+        return validated_token
+
+    def get_user(self, validated_token):
+        if ROLES_CLAIM in validated_token:
+            user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+            role_version = current_role_version(user_id)
+            if role_version is None:
+                raise exceptions.AuthenticationFailed('User not found or inactive', code='user_not_found')
+            if validated_token.get(ROLE_VERSION_CLAIM) != role_version:
+                raise exceptions.AuthenticationFailed('Token roles are out of date', code='token_not_valid')
+            return token_user(validated_token)
+        user = super(AerpawJWTAuthentication, self).get_user(validated_token)
+        prefetch_related_objects([user], 'groups')
+        return user
+
+
+class AerpawOIDCAuthentication(OIDCAuthentication):
+    """
+    OIDC bearer authentication (CILogon access tokens) with a verified-token cache
+    - tokens are cached under their sha256 hash: the user id for OIDC_TOKEN_CACHE_TTL seconds (capped at the exp
+      claim of JWT access tokens), rejections for OIDC_TOKEN_NEGATIVE_CACHE_TTL seconds
+    - concurrent requests with the same uncached token wait for a single userinfo call (per process)
+    - upstream errors other than a rejection (401) are not cached
+    - token_cache_stats(): upstream calls made and saved
+    """
+
+    def authenticate(self, request):
+        access_token = self.get_access_token(request)
+        if not access_token:
+            return None
+        key = token_cache_key(access_token)
+        entry = token_cache().get(key)
+        if entry is not None:
+            count_token_lookup('negative_hits' if 'error' in entry else 'hits')
+            user = None
+        else:
+            entry, user = single_flight(key, lambda: self.verify(access_token, key))
+        if 'error' in entry:
+            raise exceptions.AuthenticationFailed(entry['error'])
+        if user is None:
+            user = self.backend.get_user(entry['user_id'])
+        if user is None:
+            token_cache().delete(key)
+            raise exceptions.AuthenticationFailed('Login failed: No user found for the given access token.')
+        return user, access_token
+
+    def verify(self, access_token: str, key: str) -> tuple:
+        """
+        (cache entry, user) of access_token from the provider's userinfo endpoint
+        """
+        count_token_lookup('upstream_calls')
+        try:
+            user = self.backend.get_or_create_user(access_token, None, None)
+        except HTTPError as exc:
+            if exc.response is None or exc.response.status_code != 401:
+                raise
+            # rejected by the provider: the reason is in the www-authenticate header
+            data = parse_www_authenticate_header(exc.response.headers.get('www-authenticate', ''))
+            return reject_token(key, data.get('error_description', 'no error description in www-authenticate')), None
+        except SuspiciousOperation as exc:
+            logger.info('Login failed: %s', exc)
+            return reject_token(key, 'Login failed'), None
+        if not user:
+            return reject_token(key, 'Login failed: No user found for the given access token.'), None
+        entry = {'user_id': user.id}
+        ttl = token_ttl(access_token, settings.OIDC_TOKEN_CACHE_TTL)
+        if ttl > 0:
+            token_cache().set(key, entry, timeout=ttl)
+        return entry, user
+
+
+def jwt_algorithm(raw_token: bytes):
+    """
+    alg of the (unverified) header of a JWT, None when raw_token is not a JWT
+    """
+    try:
+        header = raw_token.split(b'.')[0]
+        return json.loads(base64.urlsafe_b64decode(header + b'=' * (-len(header) % 4))).get('alg')
+    except Exception:
+        return None
+
+
+def token_ttl(access_token: str, ttl: int) -> int:
+    """
+    ttl capped at the seconds left until the exp claim of a JWT access token (opaque tokens: ttl)
+    - the claim is read without verification: the token itself was verified by the provider
+    """
+    try:
+        payload = access_token.split('.')[1]
+        exp = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))['exp']
+    except Exception:
+        return ttl
+    return min(ttl, int(exp - time.time()))
+
+
+def token_cache():
+    return caches[TOKEN_CACHE_ALIAS]
+
+
+def token_cache_key(access_token: str) -> str:
+    return 'oidc-token:{0}'.format(hashlib.sha256(access_token.encode('utf-8')).hexdigest())
+
+
+def reject_token(key: str, error: str) -> dict:
+    entry = {'error': error}
+    token_cache().set(key, entry, timeout=settings.OIDC_TOKEN_NEGATIVE_CACHE_TTL)
+    return entry
+
+
+def single_flight(key: str, verify) -> tuple:
+    """
+    verify() once per key at a time: concurrent callers wait for the running call and share its result
+    """
+    with _in_flight_lock:
+        call = _in_flight.get(key)
+        leader = call is None
+        if leader:
+            call = _in_flight[key] = {'done': threading.Event(), 'result': None, 'error': None}
+    if not leader:
+        call['done'].wait()
+        count_token_lookup('coalesced')
+        if call['error'] is not None:
+            raise call['error']
+        return call['result'][0], None
+    try:
+        call['result'] = verify()
+        return call['result']
+    except Exception as exc:
+        call['error'] = exc
+        raise
+    finally:
+        with _in_flight_lock:
+            del _in_flight[key]
+        call['done'].set()
+
+
+def count_token_lookup(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def token_cache_stats() -> dict:
+    """
+    Verified-token cache counters of this process
+    - upstream_calls: userinfo calls made
+    - hits / negative_hits: tokens answered from the cache (verified / rejected)
+    - coalesced: requests that waited for the userinfo call of a concurrent request with the same token
+    - saved: upstream calls saved (hits + negative_hits + coalesced)
+    """
+    with _stats_lock:
+        stats = {name: _stats[name] for name in ['upstream_calls', 'hits', 'negative_hits', 'coalesced']}
+    stats['saved'] = stats['hits'] + stats['negative_hits'] + stats['coalesced']
+    return stats
+
+
+def reset_token_cache_stats() -> None:
+    with _stats_lock:
+        _stats.clear()
@@ -0,0 +1,220 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter
+
+import requests
+from django.conf import settings
+from django.core.cache import caches
+from mozilla_django_oidc.utils import import_from_settings
+
+logger = logging.getLogger(__name__)
+
+# documents are shared through the cache of the verified OIDC tokens (see CACHES in settings)
+JWKS_CACHE_ALIAS = 'tokens'
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class JWKSStore:
+    """
+    Signing keys of the OIDC provider indexed by kid
+    - in process: the keys of the last JWKS document, used for OIDC_JWKS_CACHE_TTL seconds
+    - shared: the document is kept in the 'tokens' cache, so a process (or a restarted one) reads what another
+      process fetched instead of asking the provider
+    - a kid that is not in the keys (the provider rotated its keys) refreshes the document once: concurrent
+      callbacks wait for the same fetch, and unknown kids refresh at most once per OIDC_JWKS_MIN_REFRESH_INTERVAL
+      seconds (tokens with made-up kids cannot make the portal hammer the provider)
+    - a background thread refreshes the document every OIDC_JWKS_ROTATION_INTERVAL seconds (0: no thread), so
+      callbacks do not wait for a fetch when the cached document expires
+    """
+
+    def __init__(self, jwks_endpoint: str = None, discovery_endpoint: str = None):
+        self.jwks_endpoint = jwks_endpoint
+        self.discovery_endpoint = discovery_endpoint
+        self.keys = {}
+        self.fetched = 0
+        self.unknown_kid_refreshed = 0
+        self.lock = threading.Lock()
+        self.refreshing = None
+        self.rotation = None
+        self.stopped = threading.Event()
+
+    def cache_key(self) -> str:
+        url = self.discovery_endpoint or self.jwks_endpoint
+        return 'oidc-jwks:{0}'.format(hashlib.sha256(url.encode('utf-8')).hexdigest())
+
+    def get_key(self, kid: str, alg: str, verify_kid: bool = True):
+        """
+        JWK of kid (and alg) from memory, the shared cache or (unknown kid or expired document) the provider
+        - None: no such key, also after a refresh
+        """
+        self.start_rotation()
+        if time.time() - self.fetched > settings.OIDC_JWKS_CACHE_TTL:
+            try:
+                self.refresh(self.fetched)
+            except Exception as exc:
+                # provider unavailable: keep verifying with the expired keys, if any
+                if not self.keys:
+                    raise
+                logger.warning('JWKS refresh failed, using expired keys: %s', exc)
+        key = self.match(kid, alg, verify_kid)
+        if key is None:
+            # key rotation at the provider
+            self.refresh(self.fetched, unknown_kid=True)
+            key = self.match(kid, alg, verify_kid)
+        count_jwks_lookup('hits' if key is not None else 'unknown_kid')
+        return key
+
+    def match(self, kid: str, alg: str, verify_kid: bool):
+        keys = self.keys.get(kid, []) if verify_kid else [k for kid_keys in self.keys.values() for k in kid_keys]
+        for jwk in reversed(keys):
+            if 'alg' not in jwk or jwk['alg'] == alg:
+                return jwk
+        return None
+
+    def use(self, document: dict) -> None:
+        keys = {}
+        for jwk in document['jwks'].get('keys', []):
+            keys.setdefault(jwk.get('kid'), []).append(jwk)
+        self.keys, self.fetched = keys, document['fetched']
+
+    def load_shared(self, newer_than: float = 0) -> bool:
+        """
+        Use the shared document when it is newer than newer_than (and not expired)
+        """
+        document = caches[JWKS_CACHE_ALIAS].get(self.cache_key())
+        if document is None or document['fetched'] <= newer_than:
+            return False
+        if time.time() - document['fetched'] > settings.OIDC_JWKS_CACHE_TTL:
+            return False
+        count_jwks_lookup('shared_hits')
+        self.use(document)
+        return True
+
+    def refresh(self, fetched: float, unknown_kid: bool = False) -> None:
+        """
+        Replace the document fetched at fetched: by a newer one in the shared cache (another process fetched it)
+        or from the provider
+        - concurrent callers wait for the refresh of the first one
+        - unknown_kid: skipped when the last unknown kid refresh was less than OIDC_JWKS_MIN_REFRESH_INTERVAL ago
+        """
+        with self.lock:
+            if self.fetched > fetched:
+                count_jwks_lookup('coalesced')
+                return
+            call = self.refreshing
+            leader = call is None
+            if leader:
+                if unknown_kid:
+                    if time.time() - self.unknown_kid_refreshed <= settings.OIDC_JWKS_MIN_REFRESH_INTERVAL:
+                        return
+                    self.unknown_kid_refreshed = time.time()
+                call = self.refreshing = {'done': threading.Event(), 'error': None}
+        if not leader:
+            call['done'].wait()
+            count_jwks_lookup('coalesced')
+            if call['error'] is not None:
+                raise call['error']
+            return
+        try:
+            if not self.load_shared(newer_than=fetched):
+                document = {'jwks': self.fetch_jwks(), 'fetched': time.time()}
+                caches[JWKS_CACHE_ALIAS].set(self.cache_key(), document, timeout=settings.OIDC_JWKS_CACHE_TTL)
+                self.use(document)
+        except Exception as exc:
+            call['error'] = exc
+            raise
+        finally:
+            with self.lock:
+                self.refreshing = None
+            call['done'].set()
+
+    def fetch_jwks(self) -> dict:
+        jwks_endpoint = self.jwks_endpoint
+        if self.discovery_endpoint:
+            jwks_endpoint = self.get(self.discovery_endpoint)['jwks_uri']
+        count_jwks_lookup('fetches')
+        return self.get(jwks_endpoint)
+
+    @staticmethod
+    def get(url: str) -> dict:
+        response = requests.get(
+            url,
+            verify=import_from_settings('OIDC_VERIFY_SSL', True),
+            timeout=import_from_settings('OIDC_TIMEOUT', None),
+            proxies=import_from_settings('OIDC_PROXY', None))
+        response.raise_for_status()
+        return response.json()
+
+    def start_rotation(self) -> None:
+        interval = settings.OIDC_JWKS_ROTATION_INTERVAL
+        if interval <= 0 or self.rotation is not None:
+            return
+        with self.lock:
+            if self.rotation is None:
+                self.rotation = threading.Thread(target=self.rotate, args=(interval,), name='jwks-rotation',
+                                                 daemon=True)
+                self.rotation.start()
+
+    def rotate(self, interval: int) -> None:
+        while not self.stopped.wait(interval):
+            try:
+                # a document another process fetched during the last interval is as good as a fetch
+                if not self.load_shared(newer_than=time.time() - interval):
+                    self.refresh(self.fetched)
+                count_jwks_lookup('rotations')
+            except Exception as exc:
+                logger.warning('JWKS rotation failed: %s', exc)
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+
+def jwks_store() -> JWKSStore:
+    """
+    JWKS store of the configured provider (one per process and JWKS / discovery endpoint)
+    """
+    jwks_endpoint = import_from_settings('OIDC_OP_JWKS_ENDPOINT', None)
+    discovery_endpoint = import_from_settings('OIDC_OP_DISCOVERY_ENDPOINT', None)
+    key = (jwks_endpoint, discovery_endpoint)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.setdefault(key, JWKSStore(jwks_endpoint, discovery_endpoint))
+    return store
+
+
+def reset_jwks_stores() -> None:
+    with _stores_lock:
+        for store in _stores.values():
+            store.stop()
+        _stores.clear()
+
+
+def count_jwks_lookup(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def jwks_stats() -> dict:
+    """
+    JWKS store counters of this process
+    - fetches: JWKS documents fetched from the provider
+    - hits / unknown_kid: key lookups that found / did not find a matching key
+    - shared_hits: documents read from the shared cache instead of the provider
+    - coalesced: refreshes that waited for (or came after) the fetch of a concurrent callback
+    - rotations: background refreshes
+    """
+    with _stats_lock:
+        return {name: _stats[name] for name in
+                ['fetches', 'hits', 'unknown_kid', 'shared_hits', 'coalesced', 'rotations']}
+
+
+def reset_jwks_stats() -> None:
+    with _stats_lock:
+        _stats.clear()
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aerpawuser',
+            index=models.Index(fields=['email'], name='aerpawuser_email_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:40
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_aerpawuser_aerpawuser_email_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aerpawuser',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('display_name', django.db.models.functions.text.Replace('email', models.Value('@'), models.Value(' ')), config='simple'), name='aerpawuser_search_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_audit_user_fk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aerpawuser',
+            name='role_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
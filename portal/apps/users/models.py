@@ -2,10 +2,16 @@ from enum import Enum
 
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
+from django.utils.functional import cached_property
 
 from portal.apps.mixins.models import AuditModelMixin, BaseModel
+from portal.apps.mixins.search import email_words, search_index
 from portal.apps.profiles.models import AerpawUserProfile
 
+# full-text search document
+USER_SEARCH_FIELDS = ['display_name', email_words('email')]
+
 
 class AerpawRolesEnum(Enum):
     EXPERIMENTER = 'experimenter'
@@ -40,6 +46,7 @@ class AerpawUser(BaseModel, AuditModelMixin, AbstractUser):
     - openid_sub
     - password (from AbstractUser)
     - profile
+    - role_version
     - user_permissions (from AbstractUser)
     - username (from AbstractUser)
     - uuid
@@ -53,22 +60,58 @@ class AerpawUser(BaseModel, AuditModelMixin, AbstractUser):
         on_delete=models.CASCADE,
         null=True
     )
+    # bumped when the user's roles change or the user is deactivated: invalidates role-claim tokens (users.tokens)
+    role_version = models.PositiveIntegerField(default=0)
     uuid = models.CharField(max_length=255, primary_key=False, editable=False)
 
     class Meta:
         ordering = ['display_name']
+        indexes = [
+            models.Index(fields=['email'], name='aerpawuser_email_idx'),
+            search_index('aerpawuser_search_idx', *USER_SEARCH_FIELDS)
+        ]
 
     def __str__(self):
         return self.username
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(AerpawUser, cls).from_db(db, field_names, values)
+        # is_active as loaded: deactivating the user bumps role_version (see users.signals)
+        instance.loaded_is_active = values[field_names.index('is_active')] if 'is_active' in field_names else None
+        return instance
+
+    @cached_property
+    def aerpaw_roles(self) -> frozenset:
+        """
+        Immutable set of role names held by the user, loaded once per user instance (one instance per request).
+        Uses prefetched groups when the authentication backend provided them.
+        """
+        return frozenset(g.name for g in self.groups.all())
+
     def is_experimenter(self):
-        return self.groups.filter(name=AerpawRolesEnum.EXPERIMENTER.value).exists()
+        return AerpawRolesEnum.EXPERIMENTER.value in self.aerpaw_roles
 
     def is_pi(self):
-        return self.groups.filter(name=AerpawRolesEnum.PI.value).exists()
+        return AerpawRolesEnum.PI.value in self.aerpaw_roles
 
     def is_operator(self):
-        return self.groups.filter(name=AerpawRolesEnum.OPERATOR.value).exists()
+        return AerpawRolesEnum.OPERATOR.value in self.aerpaw_roles
 
     def is_site_admin(self):
-        return self.groups.filter(name=AerpawRolesEnum.SITE_ADMIN.value).exists()
+        return AerpawRolesEnum.SITE_ADMIN.value in self.aerpaw_roles
+
+
+class RevokedToken(models.Model):
+    """
+    Revoked portal JWT (access or refresh), kept until the token expires (see purge_revoked_tokens)
+    - expires_at
+    - jti
+    - revoked_at
+    """
+    jti = models.CharField(max_length=64, primary_key=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return self.jti
@@ -1,28 +1,36 @@
 import unicodedata
 from uuid import uuid4
 
+import jwt
 from django.contrib.auth.models import update_last_login
+from django.core.exceptions import SuspiciousOperation
+from django.utils.encoding import smart_str
 from mozilla_django_oidc.auth import OIDCAuthenticationBackend
-from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
 from portal.apps.profiles.models import AerpawUserProfile
+from portal.apps.users.jwks import jwks_store
+from portal.apps.users.tokens import access_token_class, refresh_token_class, revoke_profile_tokens, token_fields
 
 
 def get_tokens_for_user(user) -> None:
     profile = AerpawUserProfile.objects.get(pk=user.profile_id)
-    refresh = RefreshToken.for_user(user)
-    profile.refresh_token = str(refresh)
-    profile.access_token = str(refresh.access_token)
-    profile.modified_by = user.email
+    # the new tokens replace the stored ones: those are revoked
+    revoke_profile_tokens(profile)
+    refresh = refresh_token_class().for_user(user)
+    for name, value in {**token_fields('refresh_token', refresh),
+                        **token_fields('access_token', refresh.access_token)}.items():
+        setattr(profile, name, value)
+    profile.modified_by = user
     profile.save()
 
 
 def refresh_access_token_for_user(user) -> None:
     profile = AerpawUserProfile.objects.get(pk=user.profile_id)
-    access = AccessToken.for_user(user)
-    profile.access_token = str(access)
+    revoke_profile_tokens(profile, prefixes=['access_token'])
+    access = access_token_class().for_user(user)
+    for name, value in token_fields('access_token', access).items():
+        setattr(profile, name, value)
     profile.save()
-    print(access)
 
 
 def generate_username(email):
@@ -35,15 +43,15 @@ def generate_username(email):
 class MyOIDCAB(OIDCAuthenticationBackend):
     def create_user(self, claims):
         user = super(MyOIDCAB, self).create_user(claims)
-        user.created_by = claims.get('email', '')
+        user.created_by = user
         user.display_name = claims.get('given_name', '') + ' ' + claims.get('family_name', '')
         user.first_name = claims.get('given_name', '')
         user.last_name = claims.get('family_name', '')
-        user.modified_by = claims.get('email', '')
+        user.modified_by = user
         user.openid_sub = claims.get('sub', '')
         user.profile = AerpawUserProfile.objects.create(
-            created_by=claims.get('email', ''),
-            modified_by=claims.get('email', ''),
+            created_by=user,
+            modified_by=user,
             uuid=str(uuid4())
         )
         user.uuid = str(uuid4())
@@ -51,6 +59,25 @@ class MyOIDCAB(OIDCAuthenticationBackend):
 
         return user
 
+    def filter_users_by_claims(self, claims):
+        # load AERPAW roles together with the user at authentication time
+        return super(MyOIDCAB, self).filter_users_by_claims(claims).prefetch_related('groups')
+
+    def get_user(self, user_id):
+        try:
+            return self.UserModel.objects.prefetch_related('groups').get(pk=user_id)
+        except self.UserModel.DoesNotExist:
+            return None
+
+    def retrieve_matching_jwk(self, token):
+        # signing keys from the JWKS store (kid index, shared cache) instead of a JWKS fetch per callback
+        header = jwt.get_unverified_header(token)
+        key = jwks_store().get_key(smart_str(header.get('kid')), smart_str(header.get('alg')),
+                                   verify_kid=self.get_settings('OIDC_VERIFY_KID', True))
+        if key is None:
+            raise SuspiciousOperation('Could not find a valid JWKS.')
+        return jwt.PyJWK(key)
+
     def update_user(self, user, claims):
         user.first_name = claims.get('given_name', '')
         user.last_name = claims.get('family_name', '')
@@ -0,0 +1,106 @@
+from django.shortcuts import get_object_or_404
+from rest_framework.exceptions import PermissionDenied, ValidationError
+
+from portal.apps.mixins.search import search_filter, search_vector
+from portal.apps.users.api.serializers import UserSerializerDetail, UserSerializerTokens
+from portal.apps.users.models import AerpawUser, USER_SEARCH_FIELDS
+
+# constants
+USER_MIN_DISPLAY_NAME_LEN = 5
+USER_ORDERING = ('display_name', 'id')
+
+
+def user_queryset(search: str = None):
+    """
+    All users (optional search)
+    """
+    queryset = AerpawUser.objects.all()
+    if search:
+        queryset = search_filter(queryset, search_vector(*USER_SEARCH_FIELDS), search)
+    return queryset.order_by('display_name')
+
+
+def get_user(user: AerpawUser, pk) -> dict:
+    """
+    User as detailed result
+    - aerpaw_roles           - array of roles (self / operator only)
+    - display_name           - string
+    - email                  - string
+    - is_active              - boolean (self / operator only)
+    - openid_sub             - string (self / operator only)
+    - user_id                - int
+    - username               - string
+
+    Permission:
+    - user is_self OR
+    - user is_operator OR
+    - user is_active (public fields)
+    """
+    aerpaw_user = get_object_or_404(AerpawUser.objects.prefetch_related('groups'), pk=pk)
+    if user.id == aerpaw_user.id or user.is_operator():
+        du = dict(UserSerializerDetail(aerpaw_user).data)
+        return {
+            'aerpaw_roles': [r.get('role') for r in du.get('aerpaw_roles')],
+            'display_name': du.get('display_name'),
+            'email': du.get('email'),
+            'is_active': du.get('is_active'),
+            'openid_sub': du.get('openid_sub'),
+            'user_id': du.get('user_id'),
+            'username': du.get('username')
+        }
+    elif user.is_active:
+        return {
+            'display_name': aerpaw_user.display_name,
+            'email': aerpaw_user.email,
+            'user_id': aerpaw_user.id,
+            'username': aerpaw_user.username
+        }
+    else:
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to GET /users/{0} details".format(pk))
+
+
+def update_user(user: AerpawUser, pk, data) -> AerpawUser:
+    """
+    Update user as self
+    - display_name           - string
+
+    Permission:
+    - user is_self
+    """
+    aerpaw_user = get_object_or_404(AerpawUser.objects.all(), pk=pk)
+    if user.id != aerpaw_user.id:
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to PUT/PATCH /users/{0} details".format(pk))
+    if data.get('display_name', None):
+        if len(data.get('display_name')) < USER_MIN_DISPLAY_NAME_LEN:
+            raise ValidationError(
+                detail="display_name: must be at least {0} chars long".format(USER_MIN_DISPLAY_NAME_LEN))
+        aerpaw_user.display_name = data.get('display_name')
+        aerpaw_user.save()
+    return aerpaw_user
+
+
+def get_user_tokens(user: AerpawUser, pk) -> dict:
+    """
+    Tokens of the user
+    - access_token           - string
+    - access_token_expires_at - datetime
+    - refresh_token          - string
+    - refresh_token_expires_at - datetime
+
+    Permission:
+    - user is_self
+    """
+    aerpaw_user = get_object_or_404(AerpawUser.objects.select_related('profile'), pk=pk)
+    if user.id != aerpaw_user.id:
+        raise PermissionDenied(
+            detail="PermissionDenied: unable to GET /users/{0}/tokens".format(pk))
+    du = dict(UserSerializerTokens(aerpaw_user).data)
+    profile = aerpaw_user.profile
+    return {
+        'access_token': du.get('access_token'),
+        'access_token_expires_at': profile.access_token_expires_at if profile else None,
+        'refresh_token': du.get('refresh_token'),
+        'refresh_token_expires_at': profile.refresh_token_expires_at if profile else None
+    }
@@ -0,0 +1,24 @@
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+
+from portal.apps.users.models import AerpawUser
+from portal.apps.users.tokens import bump_role_version
+
+
+@receiver(post_save, sender=AerpawUser)
+def deactivate_user_tokens(sender, instance, created, **kwargs):
+    if not created and getattr(instance, 'loaded_is_active', None) and not instance.is_active:
+        bump_role_version([instance.id])
+    instance.loaded_is_active = instance.is_active
+
+
+@receiver(m2m_changed, sender=AerpawUser.groups.through)
+def change_user_roles(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ['post_add', 'post_remove'] and (reverse or pk_set):
+        bump_role_version(pk_set if reverse else [instance.id])
+        if not reverse:
+            # tokens issued from this instance carry the new version
+            instance.refresh_from_db(fields=['role_version'])
+    elif action == 'pre_clear':
+        # the users of a cleared group are only known before the clear
+        bump_role_version(instance.user_set.values_list('id', flat=True) if reverse else [instance.id])
@@ -2,6 +2,7 @@ from datetime import datetime
 
 from django import template
 
+from portal.apps.mixins.identity import identity_map
 from portal.apps.users.models import AerpawUser
 
 register = template.Library()
@@ -10,8 +11,8 @@ register = template.Library()
 @register.filter
 def id_to_display_name(user_id):
     try:
-        user = AerpawUser.objects.get(pk=int(user_id))
-        return user.display_name
+        user = identity_map().get(AerpawUser, user_id)
+        return user.display_name if user else 'not found'
     except Exception as exc:
         print(exc)
         return 'not found'
@@ -20,8 +21,8 @@ def id_to_display_name(user_id):
 @register.filter
 def id_to_username(user_id):
     try:
-        user = AerpawUser.objects.get(pk=int(user_id))
-        return user.username
+        user = identity_map().get(AerpawUser, user_id)
+        return user.username if user else 'not found'
     except Exception as exc:
         print(exc)
         return 'not found'
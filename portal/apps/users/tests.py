@@ -1 +1,513 @@
-# Create your tests here.
+import base64
+import json
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.db import connections
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, UntypedToken
+
+from portal.apps.mixins.identity import IdentityMap, IdentityMapMiddleware, identity_fallbacks, identity_map, \
+    reset_identity_fallbacks
+from portal.apps.mixins.testing import IndexScanTestCase, QueryBudgetTestCase, create_user
+from portal.apps.operations.management.commands.benchmark_oidc_login import MockOIDCProvider, login_callback
+from portal.apps.profiles.models import AerpawUserProfile
+from portal.apps.profiles.templatetags.profiles_tags import token_expiry
+from portal.apps.users.authentication import AerpawJWTAuthentication, AerpawOIDCAuthentication, \
+    reset_token_cache_stats, token_cache, token_cache_stats, token_ttl
+from portal.apps.users.jwks import jwks_stats, jwks_store, reset_jwks_stats, reset_jwks_stores
+from portal.apps.users.models import AerpawRolesEnum, AerpawUser, RevokedToken
+from portal.apps.users.oidc_users import MyOIDCAB, get_tokens_for_user, refresh_access_token_for_user
+from portal.apps.users.templatetags.users_tags import id_to_display_name, id_to_username
+from portal.apps.users.tokens import AerpawAccessToken, revocation_list, role_version_cache
+
+
+class AerpawRolesTestCase(TestCase):
+    fixtures = ['aerpaw_roles']
+
+    def setUp(self):
+        self.user = AerpawUser.objects.create_user(username='operator@example.org', email='operator@example.org')
+        self.user.groups.add(
+            Group.objects.get(name=AerpawRolesEnum.EXPERIMENTER.value),
+            Group.objects.get(name=AerpawRolesEnum.OPERATOR.value)
+        )
+
+    def test_role_predicates_share_one_query(self):
+        user = AerpawUser.objects.get(pk=self.user.id)
+        with self.assertNumQueries(1):
+            self.assertTrue(user.is_experimenter())
+            self.assertFalse(user.is_pi())
+            self.assertTrue(user.is_operator())
+            self.assertFalse(user.is_site_admin())
+            self.assertTrue(user.is_operator())
+        self.assertEqual(user.aerpaw_roles, frozenset(['experimenter', 'operator']))
+
+    def test_session_backend_loads_roles(self):
+        user = MyOIDCAB().get_user(self.user.id)
+        with self.assertNumQueries(0):
+            self.assertTrue(user.is_operator())
+            self.assertFalse(user.is_site_admin())
+
+    def test_jwt_authentication_loads_roles(self):
+        token = AccessToken.for_user(self.user)
+        user = AerpawJWTAuthentication().get_user(token)
+        with self.assertNumQueries(0):
+            self.assertTrue(user.is_experimenter())
+            self.assertFalse(user.is_pi())
+
+
+class IdentityMapTestCase(TestCase):
+    """
+    ID-to-name filters resolve from the request identity map filled in one in_bulk query
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [create_user('member{0:03d}@example.org'.format(i)) for i in range(200)]
+
+    def setUp(self):
+        reset_identity_fallbacks()
+
+    def render_members(self, load: bool) -> list:
+        names = []
+
+        def view(request):
+            if load:
+                identity_map().load(AerpawUser, [u.id for u in self.users] + [0])
+            names.extend((id_to_username(u.id), id_to_display_name(u.id)) for u in self.users)
+            names.append(id_to_username(0))
+
+        IdentityMapMiddleware(view)(RequestFactory().get('/experiments/1'))
+        return names
+
+    def test_filters_resolve_from_map(self):
+        with self.assertNumQueries(1):
+            names = self.render_members(load=True)
+        self.assertEqual(names[:-1], [(u.username, u.display_name) for u in self.users])
+        self.assertEqual(names[-1], 'not found')
+        self.assertEqual(identity_fallbacks(), {})
+
+    def test_fallbacks_are_counted(self):
+        with self.assertLogs('portal.apps.mixins.identity', level='WARNING'):
+            with self.assertNumQueries(201):
+                self.render_members(load=False)
+        self.assertEqual(identity_fallbacks(), {'users.AerpawUser': 201})
+
+    def test_map_is_request_scoped(self):
+        self.render_members(load=True)
+        self.assertIsNot(identity_map(), identity_map())
+        self.assertEqual(IdentityMap().instances, {})
+
+
+class UserEndpointBudgetTestCase(QueryBudgetTestCase):
+    """
+    Query and wall-clock budgets for /users
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('experimenter@example.org', AerpawRolesEnum.EXPERIMENTER.value)
+        cls.user.profile = AerpawUserProfile.objects.create(access_token='access', refresh_token='refresh')
+        cls.user.save()
+        cls.operator = create_user('operator@example.org', AerpawRolesEnum.OPERATOR.value)
+        cls.create_users(0, 3)
+
+    @staticmethod
+    def create_users(start: int, stop: int):
+        for i in range(start, stop):
+            create_user('user{0:02d}@example.org'.format(i), AerpawRolesEnum.EXPERIMENTER.value)
+
+    def grow_users(self):
+        self.create_users(3, 10)
+
+    def test_users(self):
+        path = '/api/users/{0}'.format(self.user.id)
+        self.assertQueryBudget(self.user, 'get', '/api/users', max_queries=2, max_ms=250)
+        self.assertQueryBudget(self.user, 'get', path, max_queries=3, max_ms=250)
+        self.assertQueryBudget(self.operator, 'get', path, max_queries=4, max_ms=250)
+        self.assertQueryBudget(self.user, 'put', path, data={'display_name': 'updated user'},
+                               max_queries=5, max_ms=500)
+        self.assertNoNPlusOne(self.user, '/api/users', self.grow_users)
+
+    def test_user_actions(self):
+        self.assertQueryBudget(self.user, 'get', '/api/users/{0}/credentials'.format(self.user.id),
+                               max_queries=1, max_ms=250)
+        self.assertQueryBudget(self.user, 'get', '/api/users/{0}/tokens'.format(self.user.id),
+                               max_queries=2, max_ms=250)
+
+
+class AerpawUserIndexTestCase(IndexScanTestCase):
+
+    def test_username_lookup(self):
+        # AbstractUser.username is unique: login and identity lookups read its index
+        self.assertIndexScan(AerpawUser.objects.filter(username='load-01234@example.org'), 'users_aerpawuser_username')
+
+    def test_email_lookup(self):
+        self.assertIndexScan(AerpawUser.objects.filter(email='load-01234@example.org'), 'aerpawuser_email_idx')
+
+
+class StubUserinfoHandler(BaseHTTPRequestHandler):
+    """
+    userinfo endpoint of a stub OIDC provider: 'good-*' tokens are valid, any other token is rejected
+    """
+
+    def do_GET(self):
+        self.server.calls += 1
+        time.sleep(self.server.delay)
+        token = self.headers.get('Authorization', '').split(' ')[-1]
+        if token.startswith('good-'):
+            body = json.dumps({'email': 'oidc-user@example.org', 'sub': 'oidc-user', 'given_name': 'OIDC',
+                               'family_name': 'User'}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+        else:
+            body = b''
+            self.send_response(401)
+            self.send_header('WWW-Authenticate', 'Bearer error="invalid_token", error_description="token revoked"')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class OIDCTokenCacheTestCase(TransactionTestCase):
+    """
+    Verified-token cache of OIDC bearer authentication against a stub provider
+    - TransactionTestCase: concurrent requests authenticate on connections of their own
+    """
+    fixtures = ['aerpaw_roles']
+
+    def setUp(self):
+        self.provider = ThreadingHTTPServer(('127.0.0.1', 0), StubUserinfoHandler)
+        self.provider.calls = 0
+        self.provider.delay = 0.2
+        threading.Thread(target=self.provider.serve_forever, daemon=True).start()
+        self.addCleanup(self.provider.server_close)
+        self.addCleanup(self.provider.shutdown)
+        settings = override_settings(
+            OIDC_OP_USER_ENDPOINT='http://127.0.0.1:{0}/userinfo'.format(self.provider.server_address[1]))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        token_cache().clear()
+        reset_token_cache_stats()
+
+    @staticmethod
+    def authenticate(token: str):
+        request = RequestFactory().get('/api/users', HTTP_AUTHORIZATION='Bearer {0}'.format(token))
+        return AerpawOIDCAuthentication().authenticate(request)
+
+    def test_verified_token_is_cached(self):
+        user, _ = self.authenticate('good-token')
+        self.assertEqual(user.username, 'oidc-user@example.org')
+        with self.assertNumQueries(2):
+            cached_user, _ = self.authenticate('good-token')
+        self.assertEqual(cached_user, user)
+        self.assertTrue(cached_user.is_active)
+        self.assertEqual(self.provider.calls, 1)
+        stats = token_cache_stats()
+        self.assertEqual((stats['upstream_calls'], stats['hits'], stats['saved']), (1, 1, 1))
+
+    def test_rejected_token_is_cached(self):
+        client = APIClient()
+        for _ in range(2):
+            response = client.get('/api/users', headers={'Authorization': 'Bearer bad-token'})
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(response.json(), {'detail': 'token revoked'})
+        with self.assertRaisesMessage(AuthenticationFailed, 'token revoked'):
+            self.authenticate('bad-token')
+        self.assertEqual(self.provider.calls, 1)
+        stats = token_cache_stats()
+        self.assertEqual((stats['upstream_calls'], stats['negative_hits'], stats['saved']), (1, 2, 2))
+
+    def test_concurrent_requests_share_one_upstream_call(self):
+        barrier = threading.Barrier(8)
+        users, errors = [], []
+
+        def request():
+            barrier.wait()
+            try:
+                users.append(self.authenticate('good-burst')[0].id)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=request) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(set(users)), 1)
+        self.assertEqual(self.provider.calls, 1)
+        self.assertEqual(token_cache_stats()['coalesced'], 7)
+
+    def test_ttl_is_capped_at_exp(self):
+        def jwt(exp: float) -> str:
+            payload = base64.urlsafe_b64encode(json.dumps({'exp': int(exp)}).encode('utf-8')).rstrip(b'=')
+            return 'good-header.{0}.signature'.format(payload.decode('utf-8'))
+
+        self.assertEqual(token_ttl('good-opaque', 300), 300)
+        self.assertAlmostEqual(token_ttl(jwt(time.time() + 60), 300), 60, delta=1)
+        expired = jwt(time.time() - 60)
+        self.assertLess(token_ttl(expired, 300), 0)
+        self.authenticate(expired)
+        self.authenticate(expired)
+        self.assertEqual(self.provider.calls, 2)
+
+    def test_portal_jwt_is_not_sent_upstream(self):
+        user = create_user('experimenter@example.org', AerpawRolesEnum.EXPERIMENTER.value)
+        response = APIClient().get('/api/users', headers={'Authorization': 'Bearer {0}'.format(
+            AccessToken.for_user(user))})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(self.authenticate_jwt('good-token'))
+        self.assertEqual(self.provider.calls, 0)
+
+    @staticmethod
+    def authenticate_jwt(token: str):
+        request = RequestFactory().get('/api/users', HTTP_AUTHORIZATION='Bearer {0}'.format(token))
+        return AerpawJWTAuthentication().authenticate(request)
+
+
+@override_settings(TOKEN_REVOCATION_REFRESH_INTERVAL=3600)
+class RoleClaimTokenTestCase(TestCase):
+    """
+    Role-claim access tokens: authorized without loading the user, rejected once the role version moves on
+    """
+    fixtures = ['aerpaw_roles']
+
+    def setUp(self):
+        role_version_cache().clear()
+        revocation_list.reset()
+        self.user = create_user('experimenter@example.org', AerpawRolesEnum.EXPERIMENTER.value)
+        self.client = APIClient()
+
+    def get(self, token, path: str = '/api/resources'):
+        return self.client.get(path, headers={'Authorization': 'Bearer {0}'.format(token)})
+
+    def test_profile_tokens_carry_roles(self):
+        self.user.profile = AerpawUserProfile.objects.create(access_token='access', refresh_token='refresh')
+        self.user.save()
+        with override_settings(JWT_ROLE_CLAIMS=True):
+            get_tokens_for_user(self.user)
+        token = AccessToken(AerpawUserProfile.objects.get(pk=self.user.profile_id).access_token)
+        self.assertEqual((token['aerpaw_roles'], token['role_version'], token['username']),
+                         (['experimenter'], 1, 'experimenter@example.org'))
+
+    def test_read_endpoint_without_queries(self):
+        token = AerpawAccessToken.for_user(self.user)
+        self.assertEqual(self.get(token).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(token).status_code, 200)
+        user = AerpawJWTAuthentication().get_user(token)
+        self.assertTrue(user.is_experimenter())
+        with self.assertNumQueries(1):
+            # fields that are not claims are loaded on access
+            self.assertEqual(user.email, 'experimenter@example.org')
+
+    def test_role_change_rejects_token(self):
+        token = AerpawAccessToken.for_user(self.user)
+        self.assertEqual(self.get(token).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.add(Group.objects.get(name=AerpawRolesEnum.PI.value))
+        response = self.get(token)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['detail'], 'Token roles are out of date')
+        user = AerpawUser.objects.get(pk=self.user.id)
+        token = AerpawAccessToken.for_user(user)
+        self.assertEqual(token['aerpaw_roles'], ['experimenter', 'pi'])
+        self.assertEqual(self.get(token).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            Group.objects.get(name=AerpawRolesEnum.PI.value).user_set.remove(user)
+        self.assertEqual(self.get(token).status_code, 401)
+
+    def test_deactivation_rejects_token(self):
+        token = AerpawAccessToken.for_user(self.user)
+        self.assertEqual(self.get(token).status_code, 200)
+        user = AerpawUser.objects.get(pk=self.user.id)
+        user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertEqual(self.get(token).status_code, 401)
+
+    def test_plain_tokens_load_the_user(self):
+        token = AccessToken.for_user(self.user)
+        self.assertNotIn('aerpaw_roles', token)
+        self.get(token)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.get(token).status_code, 200)
+
+
+class JWKSStoreTestCase(TransactionTestCase):
+    """
+    ID token signing keys from the JWKS store during logins against a mock provider
+    - TransactionTestCase: concurrent logins create users on connections of their own
+    """
+    fixtures = ['aerpaw_roles']
+
+    def setUp(self):
+        self.provider = MockOIDCProvider(latency=0.05).serve()
+        self.addCleanup(self.provider.server_close)
+        self.addCleanup(self.provider.shutdown)
+        self.override(**self.provider.settings(), OIDC_JWKS_ROTATION_INTERVAL=0)
+        reset_jwks_stores()
+        self.addCleanup(reset_jwks_stores)
+        reset_jwks_stats()
+        token_cache().clear()
+
+    def override(self, **kwargs):
+        settings = override_settings(**kwargs)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def login(self, i: int):
+        user = login_callback(MyOIDCAB, self.provider, 'student{0:02d}@example.org'.format(i), 'nonce')
+        self.assertEqual(user.username, 'student{0:02d}@example.org'.format(i))
+
+    def test_keys_are_fetched_once(self):
+        for i in range(3):
+            self.login(i)
+        self.assertEqual(self.provider.calls['jwks'], 1)
+        self.assertEqual(jwks_stats()['hits'], 3)
+        # another process reads the document from the shared cache
+        reset_jwks_stores()
+        self.login(3)
+        self.assertEqual(self.provider.calls['jwks'], 1)
+        self.assertEqual(jwks_stats()['shared_hits'], 1)
+
+    def test_unknown_kid_refreshes_once(self):
+        self.login(0)
+        self.provider.rotate()
+        errors = []
+
+        def login(i: int):
+            try:
+                self.login(i)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=login, args=(i,)) for i in range(1, 9)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.provider.calls['jwks'], 2)
+        self.assertGreaterEqual(jwks_stats()['coalesced'], 1)
+
+    def test_made_up_kid_is_rate_limited(self):
+        store = jwks_store()
+        self.assertIsNone(store.get_key('made-up', 'RS256'))
+        self.assertIsNone(store.get_key('made-up', 'RS256'))
+        # the initial fetch and one unknown kid refresh
+        self.assertEqual(self.provider.calls['jwks'], 2)
+        self.assertEqual(jwks_stats()['unknown_kid'], 2)
+        self.assertIsNotNone(store.get_key('key-1', 'RS256'))
+        self.assertIsNone(store.get_key('key-1', 'ES256'))
+
+    def test_background_rotation(self):
+        self.override(OIDC_JWKS_ROTATION_INTERVAL=1)
+        store = jwks_store()
+        self.assertIsNotNone(store.get_key('key-1', 'RS256'))
+        kid = self.provider.rotate()
+        deadline = time.time() + 10
+        while kid not in store.keys and time.time() < deadline:
+            time.sleep(0.1)
+        self.assertIn(kid, store.keys)
+        self.assertGreaterEqual(jwks_stats()['rotations'], 1)
+
+    def test_discovery(self):
+        self.override(OIDC_OP_DISCOVERY_ENDPOINT=self.provider.url + '/.well-known/openid-configuration')
+        self.login(0)
+        self.login(1)
+        self.assertEqual((self.provider.calls['discovery'], self.provider.calls['jwks']), (1, 1))
+
+    def test_benchmark_oidc_login(self):
+        out = StringIO()
+        call_command('benchmark_oidc_login', users=4, workers=2, latency=0, rotate=True, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split()[:3] for line in lines[2:]], [['uncached', '4', '0'], ['cached', '4', '0']])
+        self.assertFalse(AerpawUser.objects.filter(username__startswith='oidc-storm-').exists())
+
+
+@override_settings(TOKEN_REVOCATION_REFRESH_INTERVAL=3600)
+class TokenRevocationTestCase(TestCase):
+    """
+    Token metadata columns and the revocation list
+    """
+    fixtures = ['aerpaw_roles']
+
+    def setUp(self):
+        revocation_list.reset()
+        self.user = create_user('experimenter@example.org', AerpawRolesEnum.EXPERIMENTER.value)
+        self.user.profile = AerpawUserProfile.objects.create()
+        self.user.save()
+        self.client = APIClient()
+
+    def issue_tokens(self) -> AerpawUserProfile:
+        with self.captureOnCommitCallbacks(execute=True):
+            get_tokens_for_user(self.user)
+        return AerpawUserProfile.objects.get(pk=self.user.profile_id)
+
+    def get(self, token: str):
+        return self.client.get('/api/resources', headers={'Authorization': 'Bearer {0}'.format(token)})
+
+    def test_issued_tokens_record_claims(self):
+        profile = self.issue_tokens()
+        for prefix, lifetime in [('access_token', timedelta(minutes=720)), ('refresh_token', timedelta(days=7))]:
+            token = UntypedToken(getattr(profile, prefix))
+            self.assertEqual(getattr(profile, prefix + '_jti'), token['jti'])
+            self.assertEqual(int(getattr(profile, prefix + '_issued_at').timestamp()), token['iat'])
+            self.assertEqual(getattr(profile, prefix + '_expires_at') - getattr(profile, prefix + '_issued_at'),
+                             lifetime)
+        self.assertEqual(token_expiry('not a token', profile.access_token_expires_at), profile.access_token_expires_at)
+        self.assertEqual(token_expiry(profile.access_token), profile.access_token_expires_at)
+
+    def test_new_tokens_revoke_stored_tokens(self):
+        old = self.issue_tokens()
+        self.assertEqual(self.get(old.access_token).status_code, 200)
+        new = self.issue_tokens()
+        self.assertEqual(RevokedToken.objects.count(), 2)
+        with self.assertNumQueries(0):
+            response = self.get(old.access_token)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['detail'], 'Token has been revoked')
+        self.assertEqual(self.get(new.access_token).status_code, 200)
+        response = self.client.post('/api/token/refresh/', {'refresh': old.refresh_token})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.client.post('/api/token/refresh/', {'refresh': new.refresh_token}).status_code, 200)
+        self.assertEqual(self.client.post('/api/token/verify/', {'token': old.access_token}).status_code, 401)
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_access_token_for_user(self.user)
+        self.assertEqual(self.get(new.access_token).status_code, 401)
+
+    def test_revocations_of_other_processes(self):
+        profile = self.issue_tokens()
+        self.assertEqual(self.get(profile.access_token).status_code, 200)
+        RevokedToken.objects.create(jti=profile.access_token_jti, expires_at=profile.access_token_expires_at)
+        # seen at the next refresh of the list (one query for the rows revoked since the last one)
+        self.assertEqual(self.get(profile.access_token).status_code, 200)
+        with override_settings(TOKEN_REVOCATION_REFRESH_INTERVAL=0):
+            self.assertEqual(self.get(profile.access_token).status_code, 401)
+
+    def test_purge_revoked_tokens(self):
+        now = timezone.now()
+        RevokedToken.objects.bulk_create(
+            [RevokedToken(jti='expired-{0}'.format(i), expires_at=now - timedelta(minutes=i + 1)) for i in range(5)] +
+            [RevokedToken(jti='valid', expires_at=now + timedelta(minutes=5))])
+        out = StringIO()
+        call_command('purge_revoked_tokens', '--batch-size=2', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'purged 5 expired revoked tokens in 3 batches')
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['valid'])
@@ -0,0 +1,193 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from portal.apps.users.models import AerpawRolesEnum, AerpawUser, RevokedToken
+
+# claims of role-claim tokens (JWT_ROLE_CLAIMS)
+ROLES_CLAIM = 'aerpaw_roles'
+ROLE_VERSION_CLAIM = 'role_version'
+USERNAME_CLAIM = 'username'
+
+# role versions are cached next to the verified OIDC tokens (see CACHES in settings)
+ROLE_VERSION_CACHE_ALIAS = 'tokens'
+
+# incremental revocation list refreshes re-read this much before the last refresh: rows committed late are not missed
+REVOCATION_REFRESH_OVERLAP = timedelta(seconds=60)
+
+
+class RoleClaimsMixin:
+    """
+    Token with the user's AERPAW roles, their version and the username as claims
+    - the API authorizes with the claims instead of loading the user (see AerpawJWTAuthentication)
+    - tokens of an older role version are rejected: changing the user's roles or deactivating the user bumps it
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[ROLES_CLAIM] = sorted(role.value for role in AerpawRolesEnum if role.value in user.aerpaw_roles)
+        token[ROLE_VERSION_CLAIM] = user.role_version
+        token[USERNAME_CLAIM] = user.username
+        return token
+
+
+class AerpawAccessToken(RoleClaimsMixin, AccessToken):
+    pass
+
+
+class AerpawRefreshToken(RoleClaimsMixin, RefreshToken):
+    access_token_class = AerpawAccessToken
+
+
+def access_token_class():
+    return AerpawAccessToken if settings.JWT_ROLE_CLAIMS else AccessToken
+
+
+def refresh_token_class():
+    return AerpawRefreshToken if settings.JWT_ROLE_CLAIMS else RefreshToken
+
+
+def role_version_cache():
+    return caches[ROLE_VERSION_CACHE_ALIAS]
+
+
+def role_version_cache_key(user_id) -> str:
+    return 'role-version:{0}'.format(user_id)
+
+
+def current_role_version(user_id):
+    """
+    Stored role version of an active user (None: no such active user)
+    - read from the cache, the database is queried once per JWT_ROLE_VERSION_CACHE_TTL seconds and user
+    """
+    key = role_version_cache_key(user_id)
+    version = role_version_cache().get(key)
+    if version is None:
+        row = AerpawUser.objects.filter(pk=user_id).values_list('is_active', 'role_version').first()
+        # -1: no such active user, cached like a version so that rejected tokens do not query either
+        version = row[1] if row is not None and row[0] else -1
+        role_version_cache().set(key, version, timeout=settings.JWT_ROLE_VERSION_CACHE_TTL)
+    return version if version >= 0 else None
+
+
+def bump_role_version(user_ids) -> None:
+    """
+    Invalidate the role-claim tokens of users: their role version moves on and the cached versions are dropped
+    once the change is committed
+    """
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    AerpawUser.objects.filter(pk__in=user_ids).update(role_version=F('role_version') + 1)
+    keys = [role_version_cache_key(user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: role_version_cache().delete_many(keys))
+
+
+def token_user(validated_token) -> AerpawUser:
+    """
+    User of a role-claim token without a query: id, username and roles come from the claims, the other fields
+    are deferred (loaded on first access)
+    """
+    claims = {
+        'id': int(validated_token[api_settings.USER_ID_CLAIM]),
+        'is_active': True,
+        'role_version': validated_token[ROLE_VERSION_CLAIM],
+        'username': validated_token[USERNAME_CLAIM]
+    }
+    # from_db() expects the values in the order of the model's fields
+    field_names = [f.attname for f in AerpawUser._meta.concrete_fields if f.attname in claims]
+    user = AerpawUser.from_db('default', field_names, [claims[name] for name in field_names])
+    user.aerpaw_roles = frozenset(validated_token[ROLES_CLAIM])
+    return user
+
+
+def token_fields(prefix: str, token) -> dict:
+    """
+    AerpawUserProfile fields of an issued token: the token and its jti, issued_at and expires_at claims
+    - prefix: access_token | refresh_token
+    """
+    return {
+        prefix: str(token),
+        prefix + '_jti': token[api_settings.JTI_CLAIM],
+        prefix + '_issued_at': datetime_from_epoch(token['iat']),
+        prefix + '_expires_at': datetime_from_epoch(token['exp']),
+    }
+
+
+class RevocationList:
+    """
+    jti of the revoked portal JWTs that have not expired yet, in memory
+    - a set: the list only holds unexpired tokens (12 hours for access, 7 days for refresh tokens), so an exact set
+      stays small and has no false positives
+    - refreshed from RevokedToken at most once per TOKEN_REVOCATION_REFRESH_INTERVAL seconds, reading only the rows
+      revoked since the last refresh: checks in between do not query
+    - revocations in this process are added at once, other processes see them after their next refresh
+    """
+
+    def __init__(self):
+        self.jtis = {}
+        self.refreshed = None
+        self.checked = 0
+        self.lock = threading.Lock()
+
+    def contains(self, jti: str) -> bool:
+        if time.monotonic() - self.checked > settings.TOKEN_REVOCATION_REFRESH_INTERVAL:
+            # the first load blocks, later refreshes are skipped while another thread runs one
+            if self.lock.acquire(blocking=self.refreshed is None):
+                try:
+                    if time.monotonic() - self.checked > settings.TOKEN_REVOCATION_REFRESH_INTERVAL:
+                        self.refresh()
+                finally:
+                    self.lock.release()
+        return jti in self.jtis
+
+    def refresh(self) -> None:
+        now = timezone.now()
+        rows = RevokedToken.objects.filter(expires_at__gt=now)
+        if self.refreshed is not None:
+            rows = rows.filter(revoked_at__gte=self.refreshed - REVOCATION_REFRESH_OVERLAP)
+        jtis = {jti: expires_at for jti, expires_at in self.jtis.items() if expires_at > now}
+        jtis.update(rows.values_list('jti', 'expires_at'))
+        self.jtis, self.refreshed, self.checked = jtis, now, time.monotonic()
+
+    def add(self, jti: str, expires_at) -> None:
+        self.jtis = {**self.jtis, jti: expires_at}
+
+    def reset(self) -> None:
+        with self.lock:
+            self.jtis, self.refreshed, self.checked = {}, None, 0
+
+
+revocation_list = RevocationList()
+
+
+def is_revoked(jti) -> bool:
+    return jti is not None and revocation_list.contains(jti)
+
+
+def revoke_token(jti: str, expires_at) -> None:
+    """
+    Revoke the portal JWT jti until it expires at expires_at
+    """
+    if not jti or expires_at is None or expires_at <= timezone.now():
+        return
+    RevokedToken.objects.get_or_create(jti=jti, defaults={'expires_at': expires_at})
+    transaction.on_commit(lambda: revocation_list.add(jti, expires_at))
+
+
+def revoke_profile_tokens(profile, prefixes=('access_token', 'refresh_token')) -> None:
+    """
+    Revoke the tokens stored in an AerpawUserProfile (before new ones replace them)
+    """
+    for prefix in prefixes:
+        revoke_token(getattr(profile, prefix + '_jti'), getattr(profile, prefix + '_expires_at'))
@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'portal.server.settings')
+# synchronous views run on a new thread per request under ASGI: close connections at the end of every request
+# unless POSTGRES_CONN_MODE is set explicitly (pool returns them to the pool instead)
+os.environ.setdefault('POSTGRES_CONN_MODE', 'request')
 
 application = get_asgi_application()
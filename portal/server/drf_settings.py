@@ -1,4 +1,25 @@
+import json
+import logging
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.metadata import BaseMetadata
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+logger = logging.getLogger(__name__)
+
+# pagination
+MAX_PAGE_SIZE = 100
+APPROXIMATE_COUNT_THRESHOLD = 10000
 
 
 class MinimalMetadata(BaseMetadata):
@@ -12,3 +33,206 @@ class MinimalMetadata(BaseMetadata):
             'name': view.get_view_name(),
             'description': view.get_view_description()
         }
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Paginator whose count comes from the planner estimate once the estimate reaches APPROXIMATE_COUNT_THRESHOLD
+    - small results are still counted exactly
+    """
+
+    @cached_property
+    def count(self) -> int:
+        count = approximate_count(self.object_list)
+        return count if count >= APPROXIMATE_COUNT_THRESHOLD else super().count
+
+
+def approximate_count(queryset) -> int:
+    """
+    Row estimate of the planner for queryset (EXPLAIN, the query itself is not run)
+    """
+    try:
+        return int(json.loads(queryset.explain(format='json'))[0]['Plan']['Plan Rows'])
+    except Exception as exc:
+        logger.warning('EXPLAIN row estimate failed, counting exactly: %s', exc)
+        return queryset.count()
+
+
+def decode_cursor_datetime(value: str) -> datetime:
+    """
+    Aware datetime of a cursor position written by AerpawPagination.encode_cursor()
+    """
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError('invalid datetime {0}'.format(value))
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+
+def count_rows(queryset, count_mode: str) -> tuple:
+    """
+    (count, count_is_approximate) of queryset for count_mode exact | approximate
+    - approximate: the planner estimate once it reaches APPROXIMATE_COUNT_THRESHOLD, an exact count below
+    """
+    if count_mode == 'approximate':
+        count = approximate_count(queryset)
+        if count >= APPROXIMATE_COUNT_THRESHOLD:
+            return count, True
+    return queryset.count(), False
+
+
+class AerpawPagination(PageNumberPagination):
+    """
+    Default pagination of the list endpoints
+    - page: page number pagination (default)
+    - cursor: keyset pagination on the cursor_ordering of the view (opt in with ?pagination=cursor)
+    - page_size: client selectable page size up to max_page_size
+    - count: exact (default) | approximate (planner estimate on large results); cursor pages only count on request
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
+    cursor_query_param = 'cursor'
+
+    def __init__(self):
+        self.cursor_mode = False
+        self.count = None
+        self.count_is_approximate = False
+        self.next_cursor = None
+        self.previous_cursor = None
+        self.results = []
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        count_mode = request.query_params.get('count', None)
+        if count_mode not in [None, 'exact', 'approximate']:
+            raise ValidationError(
+                detail="count: valid choices are ['approximate', 'exact']")
+        ordering = getattr(view, 'cursor_ordering', None)
+        self.cursor_mode = bool(ordering) and (
+                request.query_params.get('pagination', None) == 'cursor' or
+                bool(request.query_params.get(self.cursor_query_param, None)))
+        if not self.cursor_mode:
+            if count_mode == 'approximate':
+                self.django_paginator_class = ApproximateCountPaginator
+            page = super().paginate_queryset(queryset, request, view)
+            if page is not None:
+                self.count = self.page.paginator.count
+                self.count_is_approximate = \
+                    count_mode == 'approximate' and self.count >= APPROXIMATE_COUNT_THRESHOLD
+            return page
+        return self.paginate_cursor(
+            queryset, ordering, request.query_params.get(self.cursor_query_param, None), self.get_page_size(request),
+            count_mode)
+
+    def paginate_cursor(self, queryset, ordering, cursor, page_size: int, count_mode=None) -> list:
+        """
+        Keyset page of queryset after cursor (None for the first page)
+        - also used without a request by the service layer (see portal.apps.mixins.services.cursor_page)
+        """
+        self.cursor_mode = True
+        if count_mode in ['exact', 'approximate']:
+            self.count, self.count_is_approximate = count_rows(queryset, count_mode)
+        position, reverse = self.decode_cursor(cursor, ordering)
+        if reverse:
+            ordering = [f[1:] if f.startswith('-') else '-' + f for f in ordering]
+        # the cursor position is selected as its own columns so values() projections need not include it
+        queryset = queryset.order_by(*ordering).annotate(
+            **{self.cursor_column(i): F(field.lstrip('-')) for i, field in enumerate(ordering)})
+        if position is not None:
+            queryset = queryset.filter(self.keyset_filter(ordering, position))
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            ordering = [f[1:] if f.startswith('-') else '-' + f for f in ordering]
+            results.reverse()
+        has_next = has_more if not reverse else True
+        has_previous = has_more if reverse else position is not None
+        self.next_cursor = self.encode_cursor(results[-1], ordering, False) if results and has_next else None
+        self.previous_cursor = self.encode_cursor(results[0], ordering, True) if results and has_previous else None
+        if results and isinstance(results[0], dict):
+            for row in results:
+                for i in range(len(ordering)):
+                    del row[self.cursor_column(i)]
+        self.results = results
+        return results
+
+    def get_state(self) -> dict:
+        """
+        Cursor / count attributes of the last page (cached with cached list responses)
+        """
+        return {
+            'cursor_mode': self.cursor_mode, 'count': self.count, 'count_is_approximate': self.count_is_approximate,
+            'next_cursor': self.next_cursor, 'previous_cursor': self.previous_cursor
+        }
+
+    def set_state(self, state: dict) -> None:
+        for attribute, value in state.items():
+            setattr(self, attribute, value)
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        response_data = {
+            'next': self.get_cursor_link(self.next_cursor),
+            'previous': self.get_cursor_link(self.previous_cursor),
+            'results': data
+        }
+        if self.count is not None:
+            response_data = {'count': self.count, **response_data}
+        return Response(response_data)
+
+    def get_cursor_link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), 'pagination')
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    @staticmethod
+    def keyset_filter(ordering, position) -> Q:
+        """
+        Rows after position in ordering: (a > x) OR (a = x AND b > y) ... (< for descending fields)
+        """
+        keyset = Q()
+        for i, field in enumerate(ordering):
+            lookup = '{0}__{1}'.format(field.lstrip('-'), 'lt' if field.startswith('-') else 'gt')
+            clause = Q(**{lookup: position[i]})
+            for prior_field, prior_value in zip(ordering[:i], position[:i]):
+                clause &= Q(**{prior_field.lstrip('-'): prior_value})
+            keyset |= clause
+        return keyset
+
+    @staticmethod
+    def cursor_column(i: int) -> str:
+        return 'cursor_position_{0}'.format(i)
+
+    @classmethod
+    def encode_cursor(cls, instance, ordering, reverse: bool) -> str:
+        """
+        Cursor of a page row: model instance or values() dict carrying the cursor_column() annotations
+        """
+        if isinstance(instance, dict):
+            position = [instance[cls.cursor_column(i)] for i in range(len(ordering))]
+        else:
+            position = [getattr(instance, cls.cursor_column(i)) for i in range(len(ordering))]
+        # datetimes at full precision: DjangoJSONEncoder cuts them to milliseconds, the keyset would skip / repeat rows
+        position = [{'dt': value.isoformat()} if isinstance(value, datetime) else value for value in position]
+        cursor = json.dumps({'p': position, 'r': reverse}, cls=DjangoJSONEncoder)
+        return urlsafe_b64encode(cursor.encode('utf-8')).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor, ordering):
+        """
+        (position, reverse) of a cursor parameter, (None, False) for the first page
+        """
+        if not cursor:
+            return None, False
+        try:
+            cursor = json.loads(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8'))
+            position, reverse = list(cursor['p']), bool(cursor['r'])
+            if len(position) != len(ordering):
+                raise ValueError('cursor does not match ordering {0}'.format(ordering))
+            position = [decode_cursor_datetime(value['dt']) if isinstance(value, dict) else value for value in position]
+        except Exception as exc:
+            raise NotFound(
+                detail="cursor: invalid cursor - {0}".format(exc))
+        return position, reverse
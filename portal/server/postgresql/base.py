@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import Counter
+
+from django.db.backends.postgresql import base
+
+_stats = Counter()
+_max_connect_ms = {}
+_stats_lock = threading.Lock()
+
+
+def connection_stats() -> dict:
+    """
+    Connection counters of this process: {alias: {...}}
+    - checkouts              - requests (or command runs) that used a connection
+    - reuses                 - checkouts served by a connection kept open from an earlier request
+    - connects               - connections opened (taken from the pool in pool mode)
+    - connect_ms / connect_ms_max - total / slowest connect time (includes the pool wait in pool mode)
+    - closes                 - connections closed (returned to the pool in pool mode)
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+        max_connect_ms = dict(_max_connect_ms)
+    aliases = sorted({key.split(':')[0] for key in stats})
+    return {
+        alias: {
+            'checkouts': stats.get('{0}:checkouts'.format(alias), 0),
+            'reuses': stats.get('{0}:reuses'.format(alias), 0),
+            'connects': stats.get('{0}:connects'.format(alias), 0),
+            'connect_ms': round(stats.get('{0}:connect_ms'.format(alias), 0), 3),
+            'connect_ms_max': round(max_connect_ms.get(alias, 0), 3),
+            'closes': stats.get('{0}:closes'.format(alias), 0)
+        } for alias in aliases
+    }
+
+
+def reset_connection_stats() -> None:
+    with _stats_lock:
+        _stats.clear()
+        _max_connect_ms.clear()
+
+
+def _count(alias: str, name: str, value=1) -> None:
+    with _stats_lock:
+        _stats['{0}:{1}'.format(alias, name)] += value
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL backend with connection counters (see connection_stats())
+    - a checkout is the first use of the connection after Django's request boundary check
+      (close_if_unusable_or_obsolete runs at request start and end), later queries of the request are not counted
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checked_out = False
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with _stats_lock:
+            _stats['{0}:connects'.format(self.alias)] += 1
+            _stats['{0}:connect_ms'.format(self.alias)] += elapsed_ms
+            _max_connect_ms[self.alias] = max(_max_connect_ms.get(self.alias, 0), elapsed_ms)
+
+    def ensure_connection(self):
+        if not self.checked_out:
+            self.checked_out = True
+            _count(self.alias, 'checkouts')
+            if self.connection is not None:
+                _count(self.alias, 'reuses')
+        super().ensure_connection()
+
+    def _close(self):
+        if self.connection is not None:
+            _count(self.alias, 'closes')
+        super()._close()
+
+    def close_if_unusable_or_obsolete(self):
+        # the check itself is not a checkout: its get_autocommit() call goes through ensure_connection()
+        self.checked_out = True
+        super().close_if_unusable_or_obsolete()
+        self.checked_out = False
+
+    def pool_stats(self) -> dict:
+        """
+        psycopg pool counters (requests_num, requests_waiting, requests_wait_ms, pool_size, ...), {} without a pool
+        """
+        return self.pool.get_stats() if self.pool else {}
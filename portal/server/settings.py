@@ -14,6 +14,7 @@ import os
 from datetime import timedelta
 from pathlib import Path
 from dotenv import load_dotenv, find_dotenv
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -47,6 +48,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'django_bootstrap5',  # django bootstrap
@@ -58,6 +60,7 @@ INSTALLED_APPS = [
     'portal.apps.projects',  # aerpaw projects
     'portal.apps.experiments',  # aerpaw experiments
     'portal.apps.operations',  # aerpaw operations
+    'portal.apps.search',  # full-text search
 ]
 
 # Add 'mozilla_django_oidc' authentication backend
@@ -72,6 +75,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'portal.apps.mixins.identity.IdentityMapMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -83,17 +87,27 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.DjangoModelPermissionsOrAnonReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-        'mozilla_django_oidc.contrib.drf.OIDCAuthentication',
+        'portal.apps.users.authentication.AerpawJWTAuthentication',
+        'portal.apps.users.authentication.AerpawOIDCAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'portal.server.drf_settings.AerpawPagination',
     # 'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 5,
     # metadata settings
     'DEFAULT_METADATA_CLASS': 'portal.server.drf_settings.MinimalMetadata',
 }
 
+# role-claim access tokens (portal.apps.users.tokens): tokens issued from the profile page carry the user's AERPAW
+# roles and role version, the API authorizes them without loading the user; the role version is cached for up to
+# JWT_ROLE_VERSION_CACHE_TTL seconds (an upper bound on how long a revoked token is still accepted by a process
+# with a local cache, with redis the change is seen at once)
+JWT_ROLE_CLAIMS = os.getenv('JWT_ROLE_CLAIMS', 'False').casefold() == 'true'
+JWT_ROLE_VERSION_CACHE_TTL = int(os.getenv('JWT_ROLE_VERSION_CACHE_TTL', '60'))
+# revoked portal JWTs (portal.apps.users.tokens.RevocationList): each process re-reads the revocations at most once
+# per TOKEN_REVOCATION_REFRESH_INTERVAL seconds, purge expired ones with manage.py purge_revoked_tokens
+TOKEN_REVOCATION_REFRESH_INTERVAL = int(os.getenv('TOKEN_REVOCATION_REFRESH_INTERVAL', '10'))
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=720),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
@@ -121,6 +135,10 @@ SIMPLE_JWT = {
 
     'JTI_CLAIM': 'jti',
 
+    # revoked tokens (portal.apps.users.tokens.RevocationList) cannot be refreshed or verified
+    'TOKEN_REFRESH_SERIALIZER': 'portal.apps.users.api.serializers.AerpawTokenRefreshSerializer',
+    'TOKEN_VERIFY_SERIALIZER': 'portal.apps.users.api.serializers.AerpawTokenVerifySerializer',
+
     'SLIDING_TOKEN_REFRESH_EXP_CLAIM': 'refresh_exp',
     'SLIDING_TOKEN_LIFETIME': timedelta(minutes=5),
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
@@ -157,17 +175,83 @@ WSGI_APPLICATION = 'portal.server.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
+# Database connections (POSTGRES_CONN_MODE)
+# - request: a new connection per request
+# - persistent: connections kept open for POSTGRES_CONN_MAX_AGE seconds and health checked before reuse, only reused
+#   by a threaded WSGI server with long-lived worker threads (e.g. the one of manage.py loadtest_api): runserver
+#   starts a thread per request and ASGI runs synchronous views on a new thread per request (portal.server.asgi
+#   defaults to request)
+# - pool: psycopg 3 connection pool of POSTGRES_POOL_MIN_SIZE..POSTGRES_POOL_MAX_SIZE connections per process
+#   (requires psycopg[pool]), a request waits up to POSTGRES_POOL_TIMEOUT seconds for a free connection
+# the portal.server.postgresql backend counts checkouts, connects and connect time (see /p-db-connections)
+
+POSTGRES_CONN_MODE = os.getenv('POSTGRES_CONN_MODE', 'persistent').casefold()
+if POSTGRES_CONN_MODE not in ('request', 'persistent', 'pool'):
+    raise ImproperlyConfigured(
+        "POSTGRES_CONN_MODE: must be one of request, persistent or pool (got '{0}')".format(POSTGRES_CONN_MODE))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
-        'NAME': 'postgres',
-        'USER': 'postgres',
-        'PASSWORD': 'postgres',
-        'HOST': '127.0.0.1',
-        'PORT': '5432',
+        'ENGINE': 'portal.server.postgresql',
+        'NAME': os.getenv('POSTGRES_DB', 'postgres'),
+        'USER': os.getenv('POSTGRES_USER', 'postgres'),
+        'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'postgres'),
+        'HOST': os.getenv('POSTGRES_HOST', '127.0.0.1'),
+        'PORT': os.getenv('POSTGRES_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.getenv('POSTGRES_CONN_MAX_AGE', '60')) if POSTGRES_CONN_MODE == 'persistent' else 0,
+        'CONN_HEALTH_CHECKS': POSTGRES_CONN_MODE == 'persistent',
+        'OPTIONS': {
+            'pool': {
+                'min_size': int(os.getenv('POSTGRES_POOL_MIN_SIZE', '2')),
+                'max_size': int(os.getenv('POSTGRES_POOL_MAX_SIZE', '20')),
+                'timeout': float(os.getenv('POSTGRES_POOL_TIMEOUT', '10')),
+            }
+        } if POSTGRES_CONN_MODE == 'pool' else {},
+    }
+}
+
+# Caches
+# - responses: read-through response cache (portal.apps.mixins.cache), RESPONSE_CACHE_BACKEND = locmem | file | redis
+#   (redis accepts any Redis protocol server at RESPONSE_CACHE_LOCATION, e.g. redis://127.0.0.1:6379/1)
+# - tokens: verified OIDC bearer tokens (portal.apps.users.authentication) on the backend of the response cache
+
+RESPONSE_CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'portal-responses'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', '/tmp/portal-responses'),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+RESPONSE_CACHE_BACKEND, RESPONSE_CACHE_DEFAULT_LOCATION = \
+    RESPONSE_CACHE_BACKENDS[os.getenv('RESPONSE_CACHE_BACKEND', 'locmem')]
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': RESPONSE_CACHE_BACKEND,
+        'LOCATION': os.getenv('RESPONSE_CACHE_LOCATION', RESPONSE_CACHE_DEFAULT_LOCATION),
+        'TIMEOUT': int(os.getenv('RESPONSE_CACHE_TIMEOUT', '3600')),
+        'OPTIONS': {'MAX_ENTRIES': 10000} if os.getenv('RESPONSE_CACHE_BACKEND', 'locmem') != 'redis' else {},
+    },
+    'tokens': {
+        'BACKEND': RESPONSE_CACHE_BACKEND,
+        # redis: same server, entries apart by KEY_PREFIX; locmem / file: a store of its own
+        'LOCATION': os.getenv('RESPONSE_CACHE_LOCATION', RESPONSE_CACHE_DEFAULT_LOCATION) + (
+            '' if os.getenv('RESPONSE_CACHE_BACKEND', 'locmem') == 'redis' else '-tokens'),
+        'KEY_PREFIX': 'tokens',
+        'OPTIONS': {'MAX_ENTRIES': 10000} if os.getenv('RESPONSE_CACHE_BACKEND', 'locmem') != 'redis' else {},
     }
 }
 
+# local caches (locmem, file) keep the response cache versions of each process apart (file: not atomically
+# incremented): a write would not invalidate the responses cached by the other workers, so more than one worker
+# process (PORTAL_WORKERS, set by run_server.sh to UVICORN_WORKERS) requires RESPONSE_CACHE_BACKEND=redis
+PORTAL_WORKERS = int(os.getenv('PORTAL_WORKERS', '1'))
+if PORTAL_WORKERS > 1 and os.getenv('RESPONSE_CACHE_BACKEND', 'locmem') != 'redis':
+    raise ImproperlyConfigured(
+        "RESPONSE_CACHE_BACKEND: {0} workers require the shared redis backend (got '{1}')".format(
+            PORTAL_WORKERS, os.getenv('RESPONSE_CACHE_BACKEND', 'locmem')))
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -240,7 +324,19 @@ SESSION_COOKIE_SAMESITE = None
 # SessionRefresh expiry
 OIDC_RENEW_ID_TOKEN_EXPIRY_SECONDS = 3600
 
-OIDC_DRF_AUTH_BACKEND = 'mozilla_django_oidc.auth.OIDCAuthenticationBackend'
+OIDC_DRF_AUTH_BACKEND = 'portal.apps.users.oidc_users.MyOIDCAB'
+# verified bearer tokens are cached for up to OIDC_TOKEN_CACHE_TTL seconds (never past their exp claim),
+# tokens rejected by the provider for OIDC_TOKEN_NEGATIVE_CACHE_TTL seconds
+OIDC_TOKEN_CACHE_TTL = int(os.getenv('OIDC_TOKEN_CACHE_TTL', '300'))
+OIDC_TOKEN_NEGATIVE_CACHE_TTL = int(os.getenv('OIDC_TOKEN_NEGATIVE_CACHE_TTL', '30'))
+# ID token signing keys (portal.apps.users.jwks): the JWKS document is kept in process and in the tokens cache for
+# OIDC_JWKS_CACHE_TTL seconds and refreshed in the background every OIDC_JWKS_ROTATION_INTERVAL seconds (0: never),
+# an unknown kid refreshes it at most once per OIDC_JWKS_MIN_REFRESH_INTERVAL seconds
+# - OIDC_OP_DISCOVERY_ENDPOINT (optional): read jwks_uri from the provider's openid-configuration
+OIDC_OP_DISCOVERY_ENDPOINT = os.getenv('OIDC_OP_DISCOVERY_ENDPOINT') or None
+OIDC_JWKS_CACHE_TTL = int(os.getenv('OIDC_JWKS_CACHE_TTL', '3600'))
+OIDC_JWKS_ROTATION_INTERVAL = int(os.getenv('OIDC_JWKS_ROTATION_INTERVAL', '900'))
+OIDC_JWKS_MIN_REFRESH_INTERVAL = int(os.getenv('OIDC_JWKS_MIN_REFRESH_INTERVAL', '30'))
 
 # Default Django logging is WARNINGS+ to console
 # so visible via docker-compose logs django
@@ -20,11 +20,16 @@ from django.views.generic.base import TemplateView
 from rest_framework import routers
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView, TokenVerifyView
 
+from portal.apps.experiments.api import async_views as experiment_async_views
 from portal.apps.experiments.api.viewsets import CanonicalExperimentResourceViewSet, ExperimentSessionViewSet, \
-    ExperimentViewSet, UserExperimentViewSet
-from portal.apps.operations.api.viewsets import CanonicalNumberViewSet
+    ExperimentStateViewSet, ExperimentViewSet, UserExperimentViewSet
+from portal.apps.operations.api import async_views as operation_async_views
+from portal.apps.operations.api.viewsets import CanonicalNumberViewSet, DatabaseConnectionViewSet, \
+    ResponseCacheViewSet, TokenCacheViewSet
 from portal.apps.projects.api.viewsets import ProjectViewSet, UserProjectViewSet
+from portal.apps.resources.api import async_views as resource_async_views
 from portal.apps.resources.api.viewsets import ResourceViewSet
+from portal.apps.search.api.viewsets import SearchViewSet
 from portal.apps.users.api.viewsets import UserViewSet
 
 # Routers provide an easy way of automatically determining the URL conf.
@@ -34,18 +39,33 @@ router.register(r'canonical-experiment-resource', CanonicalExperimentResourceVie
                 basename='canonical-experiment-resource')
 router.register(r'experiments', ExperimentViewSet, basename='experiments')
 router.register(r'p-canonical-experiment-number', CanonicalNumberViewSet, basename='canonical-experiment-number')
+router.register(r'p-response-cache', ResponseCacheViewSet, basename='response-cache')
+router.register(r'p-experiment-states', ExperimentStateViewSet, basename='experiment-states')
+router.register(r'p-db-connections', DatabaseConnectionViewSet, basename='db-connections')
+router.register(r'p-token-cache', TokenCacheViewSet, basename='token-cache')
 router.register(r'projects', ProjectViewSet, basename='projects')
 router.register(r'resources', ResourceViewSet, basename='resources')
+router.register(r'search', SearchViewSet, basename='search')
 router.register(r'sessions', ExperimentSessionViewSet, basename='sessions')
 router.register(r'user-experiment', UserExperimentViewSet, basename='user-experiment')
 router.register(r'user-project', UserProjectViewSet, basename='user-project')
 router.register(r'users', UserViewSet, basename='users')
 
+# Async read path of the hottest endpoints (served concurrently under ASGI, see portal.apps.mixins.async_views)
+async_urlpatterns = [
+    path('experiments', experiment_async_views.experiment_list, name='async-experiments-list'),
+    path('experiments/<int:pk>', experiment_async_views.experiment_retrieve, name='async-experiments-detail'),
+    path('p-canonical-experiment-number/current', operation_async_views.canonical_number_current,
+         name='async-canonical-experiment-number-current'),
+    path('resources', resource_async_views.resource_list, name='async-resources-list'),
+]
+
 # Wire up our API using automatic URL routing.
 # Additionally, we include login URLs for the browsable API.
 urlpatterns = [
     path('', TemplateView.as_view(template_name='home.html'), name='home'),
     path('admin/', admin.site.urls),
+    path('api/async/', include(async_urlpatterns)),
     path('api/', include(router.urls)),
     path('api/auth/', include('rest_framework.urls', namespace='rest_framework')),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
@@ -28,8 +28,21 @@ for fixture in "${FIXTURES_LIST[@]}";do
 done
 python manage.py collectstatic --noinput
 
-# development server
-python manage.py runserver
+# PORTAL_SERVER: runserver (development server, default) | asgi (uvicorn, /api/async endpoints run concurrently)
+if [[ "${PORTAL_SERVER}" == "asgi" ]]; then
+    # synchronous views run on a new thread per request under ASGI: persistent connections are not reused there,
+    # portal.server.asgi defaults POSTGRES_CONN_MODE to request (an explicit value is kept)
+    if [[ "${POSTGRES_CONN_MODE}" == "persistent" ]]; then
+        echo "WARNING: POSTGRES_CONN_MODE=persistent does not reuse connections under ASGI (use request or pool)" >&2
+    fi
+    # more than one worker requires RESPONSE_CACHE_BACKEND=redis (checked in settings)
+    export PORTAL_WORKERS=${UVICORN_WORKERS:-4}
+    uvicorn portal.server.asgi:application --host ${UVICORN_HOST:-0.0.0.0} --port ${UVICORN_PORT:-8000} \
+        --workers ${PORTAL_WORKERS}
+else
+    # development server
+    python manage.py runserver
+fi
 
 # uwsgi server
 #if [[ "${USE_DOT_VENV}" -eq 1 ]]; then